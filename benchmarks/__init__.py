@@ -0,0 +1,6 @@
+"""
+Замеры скорости функций пакета.
+
+Каждый модуль запускается отдельно, например:
+  python -m benchmarks.bench_teams_orgs
+"""
@@ -0,0 +1,60 @@
+"""
+Враждебные входные данные для шагов упрощения текста.
+
+Каждый шаг utils.simplify_rules получает тексты из многократно повторенных
+'неудобных' фрагментов (пробелы, точки, дефисы, 'vs ', 'www.' и т.д.,
+см. benchmarks.texts.adversarial_texts) и должен обработать самый медленный
+из них не дольше своей границы. Регулярные выражения проверяются на текстах
+по 100 КБ: при линейном времени работы это доли секунды, а квадратичное или
+экспоненциальное время (катастрофический возврат) выходит далеко за границу.
+Замена ner'ов (нейронная модель) и дат (парсер yargy) линейны, но медленны
+сами по себе, поэтому проверяются на текстах поменьше и со своими границами.
+Если какой-либо шаг превысил границу, то выход с ненулевым кодом.
+
+Запуск:
+  python -m benchmarks.bench_adversarial
+"""
+
+import sys
+import time
+
+from benchmarks.texts import adversarial_texts
+from khl import utils
+
+DEFAULT_SIZE = 100_000
+DEFAULT_BOUND = 0.5  # секунд на один текст
+
+SIZES = {"replace_ners": 10_000, "replace_dates": 10_000}
+BOUNDS = {"replace_ners": 10.0, "replace_dates": 10.0}
+
+
+def main() -> None:
+    """Замер худшего времени каждого шага упрощения на враждебных текстах."""
+    texts_by_size = {}
+    exceeded = []
+    for name, step in utils.simplify_rules.items():
+        size = SIZES.get(name, DEFAULT_SIZE)
+        bound = BOUNDS.get(name, DEFAULT_BOUND)
+        if size not in texts_by_size:
+            texts_by_size[size] = adversarial_texts(size)
+        worst_seconds, worst_text = 0.0, ""
+        for text in texts_by_size[size]:
+            start = time.perf_counter()
+            step(text)
+            seconds = time.perf_counter() - start
+            if seconds > worst_seconds:
+                worst_seconds, worst_text = seconds, text
+        mark = "" if worst_seconds <= bound else "  ПРЕВЫШЕНА ГРАНИЦА"
+        print(
+            f"{name:<45} {worst_seconds * 1000:8.1f} мс "
+            f"(граница {bound * 1000:.0f} мс, {size} симв., "
+            f"{worst_text[:8]!r}){mark}"
+        )
+        if mark:
+            exceeded.append(name)
+    if exceeded:
+        sys.exit(f"Превышены границы времени: {', '.join(exceeded)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Пакетная обработка смеси заголовков и длинных статей: размеры корзин.
+
+Тексты - синтетический корпус khl.synthetic. Для каждого bucket_size
+выводятся время texts_to_codes и доля настоящих токенов среди обработанных
+нейронными моделями (bucket_size=1 - без сортировки по длине).
+
+Запуск:
+  python -m benchmarks.bench_batching
+"""
+
+import time
+
+from khl import texts_to_codes
+from khl.batching import PaddingStats
+from khl.preprocess import get_coder
+from khl.synthetic import synthetic_corpus
+
+CODER_FILE = "data/frequency_dictionary.json"
+
+
+def main() -> None:
+    """Замер texts_to_codes с разными размерами корзин."""
+    coder = get_coder(CODER_FILE)
+    texts = synthetic_corpus(256)
+    list(texts_to_codes(texts[:16], coder))  # прогрев кэшей
+    for bucket_size in (1, 16, 64, 256):
+        padding_stats = PaddingStats()
+        start = time.perf_counter()
+        for _ in texts_to_codes(
+            texts, coder, bucket_size=bucket_size, padding_stats=padding_stats
+        ):
+            pass
+        seconds = time.perf_counter() - start
+        print(
+            f"bucket_size={bucket_size:<4}: {seconds:.2f} с, "
+            f"эффективность паддинга {padding_stats.efficiency:.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
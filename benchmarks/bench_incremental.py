@@ -0,0 +1,41 @@
+"""
+Преобразование длинной новости в коды с max_len: весь текст против начала.
+
+Запуск:
+  python -m benchmarks.bench_incremental
+"""
+
+import timeit
+
+from benchmarks.texts import news_text
+from khl import text_to_codes
+from khl.preprocess import get_coder
+
+CODER_FILE = "data/frequency_dictionary.json"
+
+
+def main() -> None:
+    """Замер скорости text_to_codes на статье из 3000 слов."""
+    coder = get_coder(CODER_FILE)
+    text = " ".join(news_text(30_000).split()[:3000])
+    for max_len in (20, 100, 300):
+        full = text_to_codes(text, coder, max_len=max_len)
+        assert text_to_codes(text, coder, max_len=max_len, incremental=True) == full
+        for incremental in (False, True):
+            seconds = min(
+                timeit.repeat(
+                    lambda: text_to_codes(
+                        text, coder, max_len=max_len, incremental=incremental
+                    ),
+                    number=3,
+                    repeat=3,
+                )
+            )
+            print(
+                f"max_len={max_len:<4} incremental={incremental!s:<5}: "
+                f"{seconds / 3 * 1000:.1f} мс"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Память процессов-воркеров: собственные копии весов моделей против общих.
+
+Каждый воркер запускается заново (spawn), импортирует khl и обрабатывает
+новость. Для каждого воркера выводятся RSS и PSS до и после импорта.
+PSS делит общие страницы памяти между процессами поровну, поэтому показывает
+реальный вклад воркера в потребление памяти.
+
+Запуск:
+  python -m benchmarks.bench_models_memory
+"""
+
+import multiprocessing
+import os
+import tempfile
+from threading import Barrier
+from typing import Dict, Optional, Tuple
+
+from benchmarks.texts import NEWS
+
+WORKERS = 4
+
+Memory = Dict[str, int]  # pragma: no mutate
+
+
+def memory() -> Memory:
+    """RSS и PSS текущего процесса в мегабайтах (Linux)."""
+    result = {}
+    with open("/proc/self/smaps_rollup") as file:
+        for line in file:
+            name, value, *_ = line.split()
+            if name in ("Rss:", "Pss:"):
+                result[name[:-1]] = int(value) // 1024
+    return result
+
+
+def worker(models_cache: Optional[str], barrier: Barrier) -> Tuple[Memory, Memory]:
+    """Импорт khl и обработка новости с замером памяти до и после."""
+    if models_cache is not None:
+        os.environ["KHL_MODELS_CACHE"] = models_cache
+    before = memory()
+    import khl
+
+    khl.text_to_codes(NEWS, {"": 0, "???": 1}, max_len=10)
+    # Замер после того, как все воркеры загрузили модели
+    barrier.wait()
+    after = memory()
+    barrier.wait()
+    return before, after
+
+
+def run(models_cache: Optional[str]) -> None:
+    """Запуск воркеров и вывод потребления памяти каждым из них."""
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        barrier = manager.Barrier(WORKERS)
+        with context.Pool(WORKERS) as pool:
+            results = pool.starmap(worker, [(models_cache, barrier)] * WORKERS)
+    title = "общие веса" if models_cache else "собственные веса"
+    print(title)
+    for number, (before, after) in enumerate(results):
+        print(
+            f"  воркер {number}: RSS {before['Rss']} -> {after['Rss']} МБ, "
+            f"PSS {before['Pss']} -> {after['Pss']} МБ"
+        )
+
+
+def main() -> None:
+    """Сравнение памяти воркеров без KHL_MODELS_CACHE и с ним."""
+    run(None)
+    with tempfile.TemporaryDirectory() as models_cache:
+        # Первый запуск распаковывает веса в каталог, второй - только отображает
+        run(models_cache)
+        run(models_cache)
+
+
+if __name__ == "__main__":
+    main()
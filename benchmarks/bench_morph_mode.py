@@ -0,0 +1,101 @@
+"""
+Лемматизация: нейронная модель для всех предложений против "gated".
+
+Оценивает согласие режимов morph_mode="gated" и morph_mode="neural"
+конвейера (khl.pipeline.Pipeline) с кодером из настоящего частотного
+словаря (data/frequency_dictionary.json) без отбрасывания неизвестных
+лемм: долю полностью совпавших последовательностей кодов и долю совпавших
+кодов. Согласие считается на синтетических новостях и на текстах, не
+связанных с генератором синтетических новостей (benchmarks.texts и
+tests.test_pipeline). Кроме того, выводятся доля токенов, которые прошли
+через нейронную модель, и ускорение лемматизации.
+
+Запуск:
+  python -m benchmarks.bench_morph_mode
+"""
+
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.texts import HEADLINES, NEWS, news_text
+from khl.pipeline import Pipeline
+from khl.preprocess import (
+    Code,
+    Lemma,
+    LemmaCache,
+    MorphMode,
+    _tokenize_batch,
+    get_coder,
+    lemmatize_chunks_to_codes_batch,
+)
+from khl.stop_words import stop_words
+from khl.synthetic import synthetic_corpus
+from khl.utils import simplify, unify
+from tests.test_pipeline import TEXTS
+
+FREQUENCY_DICTIONARY_FILE = (
+    Path(__file__).parent.parent / "data" / "frequency_dictionary.json"
+)
+TEXTS_COUNT = 150
+MODES: List[MorphMode] = ["neural", "gated"]
+
+
+def print_agreement(name: str, texts: List[str], coder: Dict[Lemma, Code]) -> None:
+    """Согласие режимов лемматизации на текстах texts."""
+    codes = {}
+    for morph_mode in MODES:
+        pipeline = Pipeline(
+            coder,
+            exclude_unknown=False,
+            morph_mode=morph_mode,
+            lemma_cache=LemmaCache(),
+        )
+        codes[morph_mode] = list(pipeline.map(texts))
+    same_texts = 0
+    same_codes = 0
+    all_codes = 0
+    for neural, gated in zip(codes["neural"], codes["gated"]):
+        same_texts += neural == gated
+        matcher = SequenceMatcher(a=neural, b=gated, autojunk=False)
+        same_codes += sum(block.size for block in matcher.get_matching_blocks())
+        all_codes += max(len(neural), len(gated))
+    print(f"{name}:")
+    print(f"  совпавших текстов: {same_texts}/{len(texts)}")
+    print(f"  совпавших кодов:   {same_codes / all_codes:.2%}")
+
+
+def main() -> None:
+    """Оценка согласия и скорости режимов лемматизации."""
+    coder = get_coder(FREQUENCY_DICTIONARY_FILE)
+    texts = synthetic_corpus(TEXTS_COUNT, seed=7) + [news_text(100_000)]
+    print_agreement("Синтетические новости", texts, coder)
+    print_agreement("Другие тексты", [*HEADLINES, NEWS, *TEXTS], coder)
+
+    simplified = [[simplify(unify(text))] for text in texts]
+    tokens = _tokenize_batch(
+        [chunks[0] for chunks in simplified],
+        morph_mode="gated",
+        stop_words_=frozenset(stop_words),
+    )
+    tagged = sum(
+        token.pos is not None for text_tokens in tokens for token in text_tokens
+    )
+    all_tokens = sum(len(text_tokens) for text_tokens in tokens)
+    print(f"Токенов через нейронную модель: {tagged / all_tokens:.1%}")
+    for morph_mode in MODES:
+        start = time.perf_counter()
+        lemmatize_chunks_to_codes_batch(
+            simplified,
+            coder,
+            exclude_unknown=False,
+            lemma_cache=LemmaCache(),
+            morph_mode=morph_mode,
+        )
+        seconds = time.perf_counter() - start
+        print(f"{morph_mode:<6}: {seconds / len(texts) * 1000:.3f} мс на текст")
+
+
+if __name__ == "__main__":
+    main()
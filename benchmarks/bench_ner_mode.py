@@ -0,0 +1,45 @@
+"""
+Замена именованных сущностей: нейронная модель против газеттира и словарей.
+
+Оценивает согласие режимов ner_mode="gazetteer" и ner_mode="neural" функции
+simplify: долю полностью совпавших текстов и долю совпавших слов, а также
+ускорение замены сущностей.
+
+Запуск:
+  python -m benchmarks.bench_ner_mode
+"""
+
+import timeit
+from difflib import SequenceMatcher
+
+from benchmarks.texts import HEADLINES
+from khl.utils import replace_ners, replace_ners_by_gazetteer, simplify, unify
+
+
+def main() -> None:
+    """Оценка согласия и скорости режимов замены сущностей."""
+    texts = [unify(text) for text in HEADLINES]
+    same_texts = 0
+    same_words = 0
+    all_words = 0
+    for text in texts:
+        neural = simplify(text, ner_mode="neural").split()
+        gazetteer = simplify(text, ner_mode="gazetteer").split()
+        same_texts += neural == gazetteer
+        matcher = SequenceMatcher(a=neural, b=gazetteer, autojunk=False)
+        same_words += sum(block.size for block in matcher.get_matching_blocks())
+        all_words += max(len(neural), len(gazetteer))
+    print(f"Совпавших текстов: {same_texts}/{len(texts)}")
+    print(f"Совпавших слов:    {same_words / all_words:.1%}")
+    for name, func in (
+        ("neural", replace_ners),
+        ("gazetteer", replace_ners_by_gazetteer),
+    ):
+        seconds = min(
+            timeit.repeat(lambda: [func(text) for text in texts], number=5, repeat=3)
+        )
+        print(f"{name:<9}: {seconds / 5 / len(texts) * 1000:.3f} мс на текст")
+
+
+if __name__ == "__main__":
+    main()
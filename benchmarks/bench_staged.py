@@ -0,0 +1,51 @@
+"""
+Поэтапная обработка пулами потоков: время и загрузка этапов.
+
+Тексты - синтетический корпус khl.synthetic. Выводится время Pipeline.map
+и StagedExecutor.map с разным числом потоков этапов и загрузка этапов:
+этап с загрузкой около 100% - узкое место.
+
+Запуск:
+  python -m benchmarks.bench_staged
+"""
+
+import time
+
+from khl.pipeline import Pipeline
+from khl.preprocess import get_coder
+from khl.staged import StageConfig, StagedExecutor
+from khl.synthetic import synthetic_corpus
+
+CODER_FILE = "data/frequency_dictionary.json"
+# fmt: off
+CONFIGS = [
+    (StageConfig(1), StageConfig(1), StageConfig(1)),
+    (StageConfig(1), StageConfig(2), StageConfig(1)),
+    (StageConfig(2), StageConfig(2), StageConfig(2)),
+]
+# fmt: on
+
+
+def main() -> None:
+    """Замер Pipeline.map и StagedExecutor.map с разным числом потоков."""
+    pipeline = Pipeline(get_coder(CODER_FILE))
+    texts = synthetic_corpus(256)
+    pipeline.batch(texts[:16])  # прогрев кэшей
+    start = time.perf_counter()
+    pipeline.batch(texts)
+    print(f"Pipeline.map: {time.perf_counter() - start:.2f} с")
+    for prelude, ner, morph in CONFIGS:
+        executor = StagedExecutor(pipeline, prelude, ner, morph)
+        start = time.perf_counter()
+        for _ in executor.map(texts):
+            pass
+        seconds = time.perf_counter() - start
+        utilization = ", ".join(
+            f"{name} {value:.0%}" for name, value in executor.utilization().items()
+        )
+        workers = "/".join(str(config.workers) for config in (prelude, ner, morph))
+        print(f"потоки {workers}: {seconds:.2f} с, загрузка: {utilization}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Поиск названий команд: конечный автомат против регулярного выражения.
+
+Запуск:
+  python -m benchmarks.bench_teams_orgs
+"""
+
+import re
+import timeit
+
+from benchmarks.texts import news_text
+from khl.gazetteer import Gazetteer
+from khl.teams_orgs import org_endings, teams_orgs_entries, teams_orgs_pattern
+
+
+def main() -> None:
+    """Замер скорости замены названий команд на org."""
+    regex = re.compile(teams_orgs_pattern)
+    gazetteer = Gazetteer(teams_orgs_entries, endings=org_endings)
+    for size in (1_000, 10_000, 100_000):
+        text = news_text(size)
+        assert regex.sub("org", text) == gazetteer.sub("org", text)
+        number = 1_000_000 // size
+        for name, sub in (
+            ("regex", lambda: regex.sub("org", text)),
+            ("gazetteer", lambda: gazetteer.sub("org", text)),
+        ):
+            seconds = min(timeit.repeat(sub, number=number, repeat=5)) / number
+            print(f"{size:>7} символов, {name:<9}: {seconds * 1000:.3f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Триггеры шагов упрощения: доли пропусков и выигрыш по времени.
+
+Шаги упрощения применяются к синтетическому корпусу из заголовков и статей
+(khl.synthetic) с триггерами (utils.apply_steps) и без них. Время
+сравнивается на шагах с регулярными выражениями: замена ner'ов и дат
+(нейронная модель и парсер yargy) заметно дольше и шумнее остальных шагов.
+Доля текстов, на которых шаг с триггером был пропущен, выводится для всех
+шагов, кроме замены ner'ов.
+
+Запуск:
+  python -m benchmarks.bench_triggers
+"""
+
+import time
+
+from khl import utils
+from khl.synthetic import synthetic_corpus
+
+
+def main() -> None:
+    """Замер упрощения текстов с триггерами шагов и без них."""
+    texts = [utils.unify(text) for text in synthetic_corpus(512)]
+    steps = utils.compile_simplify_steps(replace_ners_=False, replace_dates_=False)
+    steps_list = steps.before_ners + steps.after_ners
+    for title, skip_triggers in (("без триггеров", False), ("с триггерами", True)):
+        start = time.perf_counter()
+        for text in texts:
+            if skip_triggers:
+                utils.apply_steps(text, steps_list)
+            else:
+                for step in steps_list:
+                    text = step(text)
+        print(f"{title}: {time.perf_counter() - start:.2f} с")
+    steps = utils.compile_simplify_steps(replace_ners_=False)
+    trigger_stats = utils.TriggerStats()
+    for text in texts:
+        utils.apply_steps(text, steps.before_ners + steps.after_ners, trigger_stats)
+    for name, skip_rate in trigger_stats.skip_rates().items():
+        print(f"{name:<45} пропущен на {skip_rate:.0%} текстов")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Унификация длинных статей: текущая реализация против прежней.
+
+Запуск:
+  python -m benchmarks.bench_unify
+"""
+
+import re
+import timeit
+
+from benchmarks.texts import news_text
+from khl.utils import unify
+
+
+def unify_reference(text: str) -> str:
+    """Прежняя реализация unify: замены по одной и схлопывание всех пробелов."""
+    for symbol in ['"', "`", "«", "»", "„", "“", "”"]:
+        text = text.replace(symbol, "'")
+    for symbol in ["—", "–", "−"]:
+        text = text.replace(symbol, "-")
+    text = (
+        text.replace("⅛", "1/8")
+        .replace("¼", "1/4")
+        .replace("½", "1/2")
+        .replace("\u0438\u0306", "й")
+        .replace("\u0435\u0308", "ё")
+        .replace("…", "...")
+    )
+    text = re.sub(r"[^ А-Яа-яЁёA-Za-z0-9',.\[\]{}()/=+%№#@!?;:-]", " ", text)
+    return re.sub(r"\s{2,}", " ", text).strip()
+
+
+def main() -> None:
+    """Замер скорости unify на статьях разной длины."""
+    for size in (1_000, 10_000, 100_000):
+        text = news_text(size).replace(". ", ".\n\t\xa0«Цитата» — … ")
+        assert unify(text) == unify_reference(text)
+        number = 1_000_000 // size
+        for name, func in (("reference", unify_reference), ("unify", unify)):
+            seconds = min(timeit.repeat(lambda: func(text), number=number, repeat=5))
+            print(f"{size:>7} символов, {name:<9}: {seconds / number * 1000:.3f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Тексты для замеров скорости."""
+
+from typing import List
+
+NEWS = (
+    "Сегодня в Москве на арене 'ВТБ' 'Динамо' принимало 'Ак Барс' в рамках "
+    "регулярного чемпионата КХЛ. Хозяева открыли счет уже на 5-й минуте: "
+    "Иван Иванов реализовал большинство после удаления Петрова (2+10). "
+    "Гости сравняли счет во втором периоде, когда Сидоров подправил бросок "
+    "от синей линии. В третьем периоде команды обменялись шайбами, а в овертайме "
+    "победу 'Динамо' принес защитник Кузнецов. Главный тренер казанцев "
+    "на пресс-конференции отметил, что команда провела хороший матч, но "
+    "допустила слишком много ошибок в своей зоне. Следующую игру 'Ак Барс' "
+    "проведет 12 января на выезде против 'Салавата Юлаева', а москвичи "
+    "отправятся в Санкт-Петербург на матч с СКА. "
+)
+
+
+def news_text(size: int) -> str:
+    """Текст новости длиной не менее size символов."""
+    return NEWS * (size // len(NEWS) + 1)
+
+
+HEADLINES = (
+    "Андрей Педан не сыграет против 'Спартака'",
+    "'Ак Барс' отправился в Уфу",
+    "Артем Лукоянов и Данис Зарипов сыграют за сборную",
+    "Кирилл Петров со 'Спартаком' не сыграет",
+    "Минск и Демков пришли к соглашению",
+    "Казанский 'Ак Барс' Олега Знарка сыграет в Омске с командой Ильи Воробьева",
+    "Гол Да Косты с передачи Галимова - лучший по итогам двух недель",
+    "Результаты матчей Хоккейной школы ЦСКА",
+    "Вниманию СМИ! Открытая тренировка 'Ак Барса'",
+    "Шипачев и Зарипов в Москве забили много голов 'Спартаку'",
+    "Владимир Ткачев продлил контракт с 'Авангардом' на два года",
+    "В Санкт-Петербурге СКА обыграл 'Динамо' Москва в овертайме",
+    "Главный тренер 'Трактора' Бенуа Гру доволен игрой в Челябинске",
+    "Вратарь Александр Самонов отразил 40 бросков в Новосибирске",
+    "Голы забили: Иванов, Петров и Сидоров.",
+    "Сергей Мозякин стал лучшим снайпером в истории лиги",
+    "'Локомотив' или Москва?",
+    "Никита Гусев перешел в 'Динамо' из 'Спартака'",
+    "Дальше Казань и Москва",
+    "Капитан 'Металлурга' Сергей Мозякин пропустит матч в Нижнекамске",
+) + tuple(f"{sentence}." for sentence in NEWS.split(". ") if sentence)
+
+# Повторяющиеся фрагменты враждебных текстов: длинные серии пробелов, знаков
+# препинания, цифр и т.п., на которых регулярные выражения с возвратами
+# могут работать квадратичное или экспоненциальное время
+# fmt: off
+ADVERSARIAL_UNITS = (
+    " ", ".", "-", "?", "!", ":", "+", "'", "(", "_", "1", "а", "Я", "A", "c", "С",
+    "1-", "1.", "1 ", "1:", "1/", "1+", " .", " -", " ?", " :", " +", ". ", "- ",
+    "? ", "-.", ".-", "?.", ".?", "?-", " - .", " - ?", "-- ", " --", "- -",
+    "a.", "а.", "Аа-", "-аА", "www.", "http://", "per-", "per ", "perper",
+    "org loc ", "per и ", "г.", "U ", "vs ", "б о ", "Аа ", "covid",
+)
+# fmt: on
+
+
+def adversarial_texts(size: int) -> List[str]:
+    """Враждебные тексты длиной около size символов."""
+    texts = []
+    for unit in ADVERSARIAL_UNITS:
+        repeated = unit * (size // len(unit))
+        for head, tail in (("", ""), ("Я", "x"), (" ", "Я"), ("1", "1")):
+            texts.append(head + repeated + tail)
+    return texts
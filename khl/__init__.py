@@ -2,14 +2,69 @@
 
 __version__ = "2.0.2"
 
-from typing import Dict, List, Optional
+import threading
+from collections import OrderedDict
+from typing import Any, Collection, Dict, Hashable, Iterable, Iterator, List, Optional
 
 from khl import preprocess, utils
+from khl.batching import (
+    DEFAULT_BUCKET_SIZE,
+    DEFAULT_CHUNK_SIZE,
+    PaddingStats,
+)
+from khl.metrics import MetricsRegistry
+from khl.pipeline import Pipeline, Text
 from khl.stop_words import stop_words
 
+PIPELINES_CACHE_SIZE = 32
+
+_pipelines: "OrderedDict[Hashable, Pipeline]" = OrderedDict()
+_pipelines_lock = threading.Lock()
+
+
+def _pipeline(
+    coder: Dict[preprocess.Lemma, preprocess.Code],
+    stop_words_: Optional[Collection[preprocess.Lemma]],
+    *args: Any,
+    **kwargs: Any,
+) -> Pipeline:
+    """
+    Конвейер Pipeline(coder, stop_words_, *args, **kwargs) для функций модуля.
+
+    Конвейеры с одной и той же конфигурацией создаются один раз: последние
+    PIPELINES_CACHE_SIZE конфигураций хранятся в кэше. Конвейер из кэша
+    работает со своей копией кодера и берется, только если кодер равен
+    этой копии: так кодер, измененный на месте (даже без изменения числа
+    лемм), или новый кодер с id удаленного получают новый конвейер.
+    Стоп-слова различаются по содержимому, остальные параметры -
+    по значению или объекту (например, metrics). Один конвейер можно
+    использовать одновременно из нескольких потоков (см. Pipeline).
+    """
+    key = (
+        id(coder),
+        None if stop_words_ is None else frozenset(stop_words_),
+        args,
+        tuple(sorted(kwargs.items())),
+    )
+    with _pipelines_lock:
+        pipeline = _pipelines.get(key)
+        if pipeline is not None and pipeline.coder == coder:
+            _pipelines.move_to_end(key)
+            return pipeline
+    pipeline = Pipeline(dict(coder), stop_words_, *args, **kwargs)
+    with _pipelines_lock:
+        cached_pipeline = _pipelines.get(key)
+        if cached_pipeline is not None and cached_pipeline.coder == coder:
+            pipeline = cached_pipeline
+        _pipelines[key] = pipeline
+        _pipelines.move_to_end(key)
+        while len(_pipelines) > PIPELINES_CACHE_SIZE:
+            _pipelines.popitem(last=False)
+    return pipeline
+
 
 def text_to_codes(
-    text: str,
+    text: Text,
     coder: Dict[preprocess.Lemma, preprocess.Code],
     stop_words_: Optional[List[preprocess.Lemma]] = stop_words,
     replace_ners_: bool = True,
@@ -17,12 +72,21 @@ def text_to_codes(
     replace_penalties_: bool = True,
     exclude_unknown: bool = True,
     max_len: Optional[int] = None,
+    ner_mode: utils.NerMode = "neural",
+    incremental: bool = False,
+    max_text_len: Optional[int] = None,
+    workers: int = 1,
+    hash_buckets: int = 0,
+    budget_ms: Optional[float] = None,
+    morph_mode: preprocess.MorphMode = "neural",
 ) -> List[preprocess.Code]:
     """
     Преобразует текст в последовательность кодов.
 
     args:
-      text: текст новости
+      text: текст новости или текст, уже разбитый на предложения и токены
+        (список предложений, каждое - список токенов): тогда он не разбивается
+        razdel'ем, а каждое предложение упрощается отдельно (см. Pipeline)
       coder: словарь, в котором каждая лемма однозначно
         идентифицируется со своим целочисленным кодом
       stop_words_: стоп-слова для исключения
@@ -36,9 +100,121 @@ def text_to_codes(
         отбрасываются; если False, то слова, которых нет в частотном словаре,
         заменяются на код неизвестного слова
       max_len: длина последовательности на выходе
+      ner_mode: способ замены именованных сущностей: "neural" - нейронной
+        моделью natasha, "gazetteer" - по словарям без нейронной модели
+        (быстрее, но менее точно)
+      incremental: если True и задан max_len, то текст обрабатывается
+        по предложениям и обработка прекращается, как только набрано
+        max_len кодов (см. Pipeline._incremental_codes)
+      max_text_len: тексты длиннее max_text_len символов обрабатываются
+        фрагментами из целых предложений (None - без разбивки): так
+        нейронные модели и регулярные выражения не получают на вход
+        очень длинных строк; 'схлопывание' ner'ов, лемм и кодов работает
+        и на стыках фрагментов, но упрощения начала и конца текста
+        применяются к каждому фрагменту, а нейронная модель не видит
+        контекст соседних фрагментов, поэтому коды могут отличаться
+        от обработки без разбивки
+      workers: в скольких потоках обрабатываются фрагменты текста
+      hash_buckets: если не 0 и exclude_unknown=False, то слова, которых нет
+        в частотном словаре, заменяются не на один код неизвестного слова,
+        а на один из hash_buckets кодов корзин по стабильному хэшу леммы
+        (coder должен быть получен preprocess.get_coder с тем же hash_buckets)
+      budget_ms: время на обработку текста в миллисекундах (None - без
+        ограничения): когда оставшегося времени не хватает на дорогие этапы,
+        сначала пропускается замена дат, затем ner'ы заменяются по словарям
+        вместо нейронной модели (какие упрощения были применены, возвращает
+        Pipeline.encode)
+      morph_mode: способ лемматизации: "neural" - части речи и морфемы всех
+        предложений определяются нейронной моделью natasha, "gated" - только
+        предложений, в которых от них зависит лемма хотя бы одного слова
+        (быстрее, но леммы остальных слов выбираются без учета контекста,
+        см. preprocess.form_lemmas)
+    """
+    return _pipeline(
+        coder,
+        stop_words_,
+        replace_ners_,
+        replace_dates_,
+        replace_penalties_,
+        exclude_unknown,
+        max_len,
+        ner_mode,
+        incremental,
+        max_text_len=max_text_len,
+        workers=workers,
+        hash_buckets=hash_buckets,
+        budget_ms=budget_ms,
+        pretokenized=not isinstance(text, str),
+        morph_mode=morph_mode,
+    )(text)
+
+
+def texts_to_codes(
+    texts: Iterable[Text],
+    coder: Dict[preprocess.Lemma, preprocess.Code],
+    stop_words_: Optional[List[preprocess.Lemma]] = stop_words,
+    replace_ners_: bool = True,
+    replace_dates_: bool = True,
+    replace_penalties_: bool = True,
+    exclude_unknown: bool = True,
+    max_len: Optional[int] = None,
+    ner_mode: utils.NerMode = "neural",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    bucket_size: int = DEFAULT_BUCKET_SIZE,
+    padding_stats: Optional[PaddingStats] = None,
+    max_text_len: Optional[int] = None,
+    workers: int = 1,
+    trigger_stats: Optional[utils.TriggerStats] = None,
+    hash_buckets: int = 0,
+    metrics: Optional[MetricsRegistry] = None,
+    budget_ms: Optional[float] = None,
+    pretokenized: bool = False,
+    morph_mode: preprocess.MorphMode = "neural",
+) -> Iterator[List[preprocess.Code]]:
+    """
+    Преобразует поток текстов в последовательности кодов.
+
+    Аналог (text_to_codes(text, ...) for text in texts), но тексты читаются
+    по chunk_size штук, а их тексты и предложения подаются в нейронные
+    модели батчами из последовательностей близкой длины (см. khl.batching).
+    Результаты возвращаются в исходном порядке текстов.
+
+    args:
+      chunk_size: сколько текстов обрабатывается совместно
+      bucket_size: сколько текстов (и предложений) подряд сортируется
+        по длине; 1 - без сортировки
+      padding_stats: если задана, то в нее записывается статистика
+        паддинга батчей нейронных моделей
+      trigger_stats: если задана, то в нее записывается статистика
+        пропусков шагов упрощения по триггерам (см. utils.TriggerStats)
+      metrics: если задан, то в него записываются метрики обработки:
+        пропускная способность, время этапов, попадания в кэш лемм
+        (см. khl.metrics и Pipeline)
+      budget_ms: время на обработку каждого текста в миллисекундах: учитывается
+        только время, потраченное на сам текст, а не на весь батч
+        (см. text_to_codes и pipeline.TextBudget)
+      pretokenized: если True, то тексты уже разбиты на предложения
+        и токены (см. text_to_codes)
+      остальные - как у text_to_codes
     """
-    text = utils.unify(text)
-    text = utils.simplify(text, replace_ners_, replace_dates_, replace_penalties_)
-    lemmas = preprocess.lemmatize(text, stop_words_)
-    codes = preprocess.lemmas_to_codes(lemmas, coder, exclude_unknown, max_len)
-    return codes
+    return _pipeline(
+        coder,
+        stop_words_,
+        replace_ners_,
+        replace_dates_,
+        replace_penalties_,
+        exclude_unknown,
+        max_len,
+        ner_mode,
+        chunk_size=chunk_size,
+        bucket_size=bucket_size,
+        padding_stats=padding_stats,
+        max_text_len=max_text_len,
+        workers=workers,
+        trigger_stats=trigger_stats,
+        hash_buckets=hash_buckets,
+        metrics=metrics,
+        budget_ms=budget_ms,
+        pretokenized=pretokenized,
+        morph_mode=morph_mode,
+    ).map(texts)
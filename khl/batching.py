@@ -0,0 +1,124 @@
+"""
+Пакетная обработка текстов теггерами natasha.
+
+Теггеры slovnet обрабатывают тексты и предложения батчами и дополняют
+(паддинг) каждое из них до длины самого длинного в батче. Если подряд идут
+заголовок в одну строку и длинное интервью, то почти все вычисления уходят
+на паддинг. Поэтому перед подачей в теггер тексты и предложения
+сортируются по числу токенов внутри корзин (bucket_size штук подряд),
+а результаты возвращаются в исходном порядке.
+Очень длинные тексты разбиваются на фрагменты (см. utils.split_long_text),
+которые можно обрабатывать в нескольких потоках (см. parallel_map).
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, TypeVar
+
+Item = TypeVar("Item")  # pragma: no mutate
+Result = TypeVar("Result")  # pragma: no mutate
+
+DEFAULT_CHUNK_SIZE = 256
+DEFAULT_BUCKET_SIZE = 256
+
+
+class PaddingStats:
+    """
+    Статистика паддинга батчей теггера.
+
+    efficiency - доля настоящих токенов среди всех обработанных теггером,
+    включая паддинг: 1.0 - паддинга нет совсем.
+    Статистику можно пополнять одновременно из нескольких потоков.
+    """
+
+    def __init__(self) -> None:
+        """Создание пустой статистики."""
+        self.tokens = 0
+        self.padded_tokens = 0
+        self._lock = threading.Lock()
+
+    def add(self, lengths: Sequence[int], batch_size: int) -> None:
+        """Учет обработки последовательностей длиной lengths в заданном порядке."""
+        padded_tokens = 0
+        for start in range(0, len(lengths), batch_size):
+            batch = lengths[start : start + batch_size]
+            padded_tokens += max(batch) * len(batch)
+        with self._lock:
+            self.tokens += sum(lengths)
+            self.padded_tokens += padded_tokens
+
+    @property
+    def efficiency(self) -> float:
+        """Доля настоящих токенов среди обработанных."""
+        if not self.padded_tokens:
+            return 1.0
+        return self.tokens / self.padded_tokens
+
+
+def tagger_batch_size(tagger: Any) -> int:
+    """Размер батча, которым теггер slovnet обрабатывает последовательности."""
+    batch_size: int = tagger.infer.encoder.batch_size
+    return batch_size
+
+
+def bucketed_map(
+    tag: Callable[[List[Item]], Iterable[Result]],
+    items: Sequence[Item],
+    lengths: Sequence[int],
+    batch_size: int,
+    bucket_size: int = DEFAULT_BUCKET_SIZE,
+    padding_stats: Optional[PaddingStats] = None,
+) -> List[Result]:
+    """
+    Обработка последовательностей функцией tag с сортировкой по длине.
+
+    Последовательности сортируются по длине внутри корзин из bucket_size
+    штук, обрабатываются и возвращаются в исходном порядке.
+    bucket_size=1 - обработка без сортировки.
+    """
+    order: List[int] = []
+    for start in range(0, len(items), bucket_size):
+        bucket = range(start, min(start + bucket_size, len(items)))
+        order.extend(sorted(bucket, key=lambda index: lengths[index]))
+    if padding_stats is not None:
+        padding_stats.add([lengths[index] for index in order], batch_size)
+    results: List[Optional[Result]] = [None] * len(items)
+    for index, result in zip(order, tag([items[index] for index in order])):
+        results[index] = result
+    return results  # type: ignore
+
+
+def chunked(items: Iterable[Item], size: int) -> Iterator[List[Item]]:
+    """Разбивка потока на списки по size элементов."""
+    chunk: List[Item] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parallel_map(
+    function: Callable[[List[Item]], List[Result]],
+    items: List[Item],
+    workers: int = 1,
+) -> List[Result]:
+    """
+    Обработка списка функцией function в workers потоках.
+
+    Список делится на workers частей подряд, части обрабатываются
+    одновременно, а результаты склеиваются в исходном порядке.
+    workers=1 - обработка в текущем потоке.
+    """
+    if workers == 1 or len(items) < 2:
+        return function(items)
+    part_size = -(-len(items) // workers)
+    parts = [
+        items[start : start + part_size] for start in range(0, len(items), part_size)
+    ]
+    with ThreadPoolExecutor(workers) as executor:
+        return [
+            result for results in executor.map(function, parts) for result in results
+        ]
@@ -0,0 +1,194 @@
+"""
+Хранение закодированных новостей с произвольным доступом.
+
+Последовательности кодов (результаты text_to_codes) записываются в каталог
+шардами по shard_size документов. Шард - два файла .npy:
+  codes-00000.npy   - коды всех документов шарда подряд (uint16, если
+                      все коды кодера в него помещаются, иначе uint32)
+  offsets-00000.npy - начала документов в codes (int64, документов + 1)
+В index.json - тип кодов, размер шарда и число документов.
+DatasetReader отображает шарды в память только для чтения и возвращает
+коды документов как представления (view) массивов numpy, без копирования.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Type,
+    Union,
+    overload,
+)
+
+import numpy as np
+from numpy.typing import NDArray
+
+from khl.preprocess import Code, Lemma
+
+DEFAULT_SHARD_SIZE = 100_000
+INDEX_FILE = "index.json"
+
+
+def codes_dtype(coder: Dict[Lemma, Code]) -> "np.dtype[Any]":
+    """Самый узкий тип, в который помещаются все коды кодера."""
+    if max(coder.values(), default=0) <= np.iinfo(np.uint16).max:
+        return np.dtype(np.uint16)
+    return np.dtype(np.uint32)
+
+
+def _shard_path(directory: Path, kind: str, shard: int) -> Path:
+    """Путь к файлу шарда: kind - codes или offsets."""
+    return directory / f"{kind}-{shard:05d}.npy"
+
+
+def _save(path: Path, array: NDArray[Any]) -> None:
+    """Атомарное сохранение массива в файл .npy (см. models.map_array)."""
+    temporary_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+    np.save(temporary_path, array)
+    os.replace(temporary_path, path)
+
+
+class DatasetWriter:
+    """
+    Запись последовательностей кодов в каталог шардами.
+
+    Пример использования:
+      with DatasetWriter("data/encoded", coder) as writer:
+          writer.extend(texts_to_codes(texts, coder))
+
+    Документы шарда накапливаются в памяти, шард записывается, когда в нем
+    набралось shard_size документов, а последний неполный шард и index.json -
+    при закрытии. Если блок with завершился исключением, index.json не
+    записывается, и недописанный каталог не открывается DatasetReader.
+    Каталог не должен содержать файлов другого набора (шардов или
+    index.json), иначе старые шарды смешались бы с новыми.
+    """
+
+    def __init__(
+        self,
+        directory: Union[Path, str],
+        coder: Dict[Lemma, Code],
+        shard_size: int = DEFAULT_SHARD_SIZE,
+    ) -> None:
+        """Создание записи в каталог directory."""
+        if shard_size < 1:
+            raise ValueError(f"Размер шарда должен быть положительным: {shard_size}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for pattern in (INDEX_FILE, "codes-*.npy", "offsets-*.npy"):
+            if any(self.directory.glob(pattern)):
+                raise FileExistsError(
+                    f"В каталоге {self.directory} уже есть набор данных"
+                )
+        self.dtype = codes_dtype(coder)
+        self.shard_size = shard_size
+        self.documents = 0
+        self._shard_codes: List[NDArray[Any]] = []
+
+    def write(self, codes: Sequence[Code]) -> int:
+        """Запись последовательности кодов документа, возвращает id документа."""
+        self._shard_codes.append(np.asarray(codes, dtype=self.dtype))
+        self.documents += 1
+        if len(self._shard_codes) == self.shard_size:
+            self._flush()
+        return self.documents - 1
+
+    def extend(self, codes_sequences: Iterable[Sequence[Code]]) -> None:
+        """Запись последовательностей кодов нескольких документов."""
+        for codes in codes_sequences:
+            self.write(codes)
+
+    def _flush(self) -> None:
+        """Запись накопленных документов в шард."""
+        shard = (self.documents - 1) // self.shard_size
+        lengths = [len(codes) for codes in self._shard_codes]
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        codes = np.concatenate(self._shard_codes)
+        _save(_shard_path(self.directory, "codes", shard), codes)
+        _save(_shard_path(self.directory, "offsets", shard), offsets)
+        self._shard_codes = []
+
+    def close(self) -> None:
+        """Запись последнего шарда и index.json."""
+        if self._shard_codes:
+            self._flush()
+        index = {
+            "dtype": self.dtype.name,
+            "shard_size": self.shard_size,
+            "documents": self.documents,
+        }
+        with open(self.directory / INDEX_FILE, "w", encoding="utf-8") as fw:
+            json.dump(index, fw)
+
+    def __enter__(self) -> "DatasetWriter":
+        """Начало записи."""
+        return self
+
+    def __exit__(
+        self, exc_type: Optional[Type[BaseException]], *_exc_info: object
+    ) -> None:
+        """Завершение записи (см. close), если не было исключения."""
+        if exc_type is None:
+            self.close()
+
+
+class DatasetReader:
+    """
+    Чтение последовательностей кодов, записанных DatasetWriter.
+
+    reader[document_id] - коды документа, reader[start:stop] - список кодов
+    документов; коды возвращаются как представления отображенных в память
+    шардов (только для чтения), без копирования. Отрицательные id - с конца.
+    """
+
+    def __init__(self, directory: Union[Path, str]) -> None:
+        """Открытие каталога directory, записанного DatasetWriter."""
+        self.directory = Path(directory)
+        with open(self.directory / INDEX_FILE, "r", encoding="utf-8") as fr:
+            index = json.load(fr)
+        self.dtype = np.dtype(index["dtype"])
+        self.shard_size: int = index["shard_size"]
+        self.documents: int = index["documents"]
+        shards = -(-self.documents // self.shard_size)
+        self._codes: List[NDArray[Any]] = []
+        self._offsets: List[NDArray[np.int64]] = []
+        for shard in range(shards):
+            path = _shard_path(self.directory, "codes", shard)
+            self._codes.append(np.load(path, mmap_mode="r"))
+            path = _shard_path(self.directory, "offsets", shard)
+            self._offsets.append(np.load(path, mmap_mode="r"))
+
+    def __len__(self) -> int:
+        """Число документов."""
+        return self.documents
+
+    def _document(self, document_id: int) -> NDArray[Any]:
+        """Коды документа с неотрицательным id."""
+        shard, position = divmod(document_id, self.shard_size)
+        offsets = self._offsets[shard]
+        return self._codes[shard][offsets[position] : offsets[position + 1]]
+
+    @overload
+    def __getitem__(self, key: int) -> NDArray[Any]:  # noqa: D105
+        ...  # pragma: no cover
+
+    @overload
+    def __getitem__(self, key: slice) -> List[NDArray[Any]]:  # noqa: D105
+        ...  # pragma: no cover
+
+    def __getitem__(
+        self, key: Union[int, slice]
+    ) -> Union[NDArray[Any], List[NDArray[Any]]]:
+        """Коды документа по id или список кодов документов по срезу id."""
+        if isinstance(key, slice):
+            return [self._document(index) for index in range(*key.indices(len(self)))]
+        if not -len(self) <= key < len(self):
+            raise IndexError(f"Нет документа с id {key}")
+        return self._document(key % len(self))
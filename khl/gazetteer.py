@@ -0,0 +1,288 @@
+r"""
+Поиск в тексте названий из словаря (газеттира).
+
+Варианты написания названий компилируются в детерминированный конечный
+автомат, поэтому все упоминания находятся за один линейный проход по тексту,
+без возвратов, присущих большой альтернации в регулярном выражении.
+
+Синтаксис вариантов написания:
+  строчная буква  - буква в любом регистре
+  заглавная буква - буква только в верхнем регистре
+  пробел          - любое количество (в том числе ноль) пробельных символов
+  [абв], [а-я]    - один символ из набора
+  (...)           - группа
+  ?, *, +         - квантификаторы после символа, набора или группы
+  \b              - в конце варианта: вариант заканчивается на границе слова
+
+Пример:
+  Gazetteer([["Динамо", r"Динамо мск\b"], [r"ска\b"]]).sub("org", text)
+"""
+
+import re
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+SPACE = " "
+# Все пробельные символы (аналог \s в регулярных выражениях), последний - U+3000
+SPACES = frozenset(chr(code) for code in range(0x3001) if chr(code).isspace())
+
+Span = Tuple[int, int]  # pragma: no mutate
+
+
+def _is_word_char(char: str) -> bool:
+    r"""Является ли символ символом слова (аналог \w в регулярных выражениях)."""
+    return char.isalnum() or char == "_"
+
+
+def _char_keys(char: str) -> Set[str]:
+    """Символы текста, которым соответствует символ варианта написания."""
+    if char.isupper():
+        return {char}
+    return {char, char.upper()}
+
+
+def _class_keys(chars: str) -> Set[str]:
+    """Символы текста, которым соответствует набор '[...]' варианта написания."""
+    keys: Set[str] = set()
+    i = 0
+    while i < len(chars):
+        if i + 2 < len(chars) and chars[i + 1] == "-":
+            for code in range(ord(chars[i]), ord(chars[i + 2]) + 1):
+                keys |= _char_keys(chr(code))
+            i += 3
+        else:
+            keys |= _char_keys(chars[i])
+            i += 1
+    return keys
+
+
+class _Nfa:
+    """Недетерминированный автомат, построенный по вариантам написания."""
+
+    def __init__(self) -> None:
+        """Создание пустого автомата."""
+        self.edges: List[Dict[str, Set[int]]] = []
+        self.epsilons: List[Set[int]] = []
+        self.accepts: Dict[int, Tuple[int, bool]] = {}
+
+    def new_state(self) -> int:
+        """Добавление нового состояния."""
+        self.edges.append({})
+        self.epsilons.append(set())
+        return len(self.edges) - 1
+
+    def add_edge(self, source: int, keys: Set[str], target: int) -> None:
+        """Добавление перехода по символам."""
+        for key in keys:
+            self.edges[source].setdefault(key, set()).add(target)
+
+    def add_variant(self, root: int, variant: str, rank: int) -> None:
+        """Добавление варианта написания названия с заданным приоритетом."""
+        word_boundary = variant.endswith(r"\b")
+        if word_boundary:
+            variant = variant[:-2]
+        end, position = self._parse_sequence(variant, 0, root)
+        if position != len(variant):
+            raise ValueError(f"Некорректный вариант написания: {variant!r}")
+        self.accepts[end] = (rank, word_boundary)
+
+    def _parse_sequence(
+        self, variant: str, position: int, start: int
+    ) -> Tuple[int, int]:
+        """Разбор последовательности элементов до ')' или конца варианта."""
+        current = start
+        while position < len(variant) and variant[position] != ")":
+            is_space = variant[position] == SPACE
+            atom_start, atom_end, position = self._parse_atom(variant, position)
+            if is_space:
+                quantifier = "*"
+            elif position < len(variant) and variant[position] in "?*+":
+                quantifier = variant[position]
+                position += 1
+            else:
+                quantifier = ""
+            if quantifier in ("?", "*"):
+                self.epsilons[atom_start].add(atom_end)
+            if quantifier in ("*", "+"):
+                self.epsilons[atom_end].add(atom_start)
+            self.epsilons[current].add(atom_start)
+            current = atom_end
+        return current, position
+
+    def _parse_atom(self, variant: str, position: int) -> Tuple[int, int, int]:
+        """Разбор одного элемента: символа, набора, группы или пробела."""
+        start = self.new_state()
+        char = variant[position]
+        if char == "(":
+            end, position = self._parse_sequence(variant, position + 1, start)
+            if position == len(variant):
+                raise ValueError(f"Незакрытая группа: {variant!r}")
+            return start, end, position + 1
+        end = self.new_state()
+        if char == "[":
+            closing = variant.index("]", position)
+            self.add_edge(start, _class_keys(variant[position + 1 : closing]), end)
+            return start, end, closing + 1
+        if char == SPACE:
+            self.add_edge(start, set(SPACES), end)
+        else:
+            self.add_edge(start, _char_keys(char), end)
+        return start, end, position + 1
+
+    def closure(self, states: Set[int]) -> FrozenSet[int]:
+        """Эпсилон-замыкание множества состояний."""
+        stack = list(states)
+        closed = set(states)
+        while stack:
+            for target in self.epsilons[stack.pop()]:
+                if target not in closed:
+                    closed.add(target)
+                    stack.append(target)
+        return frozenset(closed)
+
+
+class Gazetteer:
+    """
+    Словарь названий, скомпилированный в конечный автомат.
+
+    entries - названия в порядке приоритета, каждое - список вариантов написания.
+    Если в одной позиции текста подходят несколько названий, то выбирается
+    первое из них, а среди его вариантов - самый длинный (как у альтернации
+    в регулярном выражении с жадными квантификаторами).
+    endings - регулярное выражение для окончания, которое присоединяется
+    к найденному названию (например, падежное окончание слова).
+    """
+
+    def __init__(self, entries: Sequence[Sequence[str]], endings: str = "") -> None:
+        """Компиляция словаря названий."""
+        nfa = _Nfa()
+        root = nfa.new_state()
+        for rank, variants in enumerate(entries):
+            for variant in variants:
+                nfa.add_variant(root, variant, rank)
+        self._transitions: List[Dict[str, int]] = []
+        self._accepts: List[Optional[Tuple[Optional[int], Optional[int]]]] = []
+        self._compile(nfa, root)
+        self._endings = re.compile(endings)
+        self._prefilter = re.compile(r"\b(?=" + self._prefix_pattern(0, 3) + ")")
+
+    def _compile(self, nfa: _Nfa, root: int) -> None:
+        """Построение детерминированного автомата методом подмножеств."""
+        start = nfa.closure({root})
+        indexes = {start: 0}
+        queue = [start]
+        for states in queue:
+            moves: Dict[str, Set[int]] = {}
+            accept_any: Optional[int] = None
+            accept_word: Optional[int] = None
+            for state in states:
+                for key, targets in nfa.edges[state].items():
+                    moves.setdefault(key, set()).update(targets)
+                if state in nfa.accepts:
+                    rank, word_boundary = nfa.accepts[state]
+                    if word_boundary:
+                        accept_word = _min_rank(accept_word, rank)
+                    else:
+                        accept_any = _min_rank(accept_any, rank)
+            transitions = {}
+            for key, targets in moves.items():
+                target = nfa.closure(targets)
+                if target not in indexes:
+                    indexes[target] = len(queue)
+                    queue.append(target)
+                transitions[key] = indexes[target]
+            self._transitions.append(transitions)
+            if accept_any is None and accept_word is None:
+                self._accepts.append(None)
+            else:
+                self._accepts.append((accept_any, accept_word))
+
+    def _prefix_pattern(self, state: int, depth: int) -> str:
+        """
+        Регулярное выражение для быстрого поиска кандидатов в названия.
+
+        Описывает все префиксы названий длиной не более depth символов,
+        полные названия проверяются уже автоматом.
+        """
+        if depth == 0 or self._accepts[state] is not None:
+            return ""
+        keys_by_target: Dict[int, Set[str]] = {}
+        for key, target in self._transitions[state].items():
+            keys_by_target.setdefault(target, set()).add(
+                r"\s" if key in SPACES else key
+            )
+        alternatives = []
+        for target, keys in keys_by_target.items():
+            chars = "".join(
+                key if key == r"\s" else re.escape(key) for key in sorted(keys)
+            )
+            alternatives.append(f"[{chars}]" + self._prefix_pattern(target, depth - 1))
+        return "(?:" + "|".join(alternatives) + ")"
+
+    def _match(self, text: str, start: int) -> Optional[int]:
+        """Конец названия, начинающегося в заданной позиции текста."""
+        transitions = self._transitions
+        accepts = self._accepts
+        length = len(text)
+        state = 0
+        best_rank: Optional[int] = None
+        best_end: Optional[int] = None
+        for position in range(start, length):
+            next_state = transitions[state].get(text[position])
+            if next_state is None:
+                break
+            state = next_state
+            accept = accepts[state]
+            if accept is None:
+                continue
+            rank, word_rank = accept
+            end = position + 1
+            if word_rank is not None and (
+                end == length or not _is_word_char(text[end])
+            ):
+                rank = _min_rank(rank, word_rank)
+            if rank is not None and (best_rank is None or rank <= best_rank):
+                best_rank, best_end = rank, end
+        return best_end
+
+    def finditer(self, text: str) -> Iterator[Span]:
+        """Нахождение всех непересекающихся упоминаний названий в тексте."""
+        end = 0
+        for candidate in self._prefilter.finditer(text):
+            start = candidate.start()
+            if start < end:
+                continue
+            match_end = self._match(text, start)
+            if match_end is None:
+                continue
+            ending = self._endings.match(text, match_end)
+            end = ending.end() if ending else match_end
+            yield start, end
+
+    def sub(self, repl: Union[str, Callable[[str], str]], text: str) -> str:
+        """Замена всех упоминаний названий (аналог re.sub)."""
+        parts = []
+        last_end = 0
+        for start, end in self.finditer(text):
+            parts.append(text[last_end:start])
+            parts.append(repl if isinstance(repl, str) else repl(text[start:end]))
+            last_end = end
+        if not parts:
+            return text
+        parts.append(text[last_end:])
+        return "".join(parts)
+
+
+def _min_rank(rank: Optional[int], other: int) -> int:
+    """Наивысший (минимальный) приоритет."""
+    return other if rank is None else min(rank, other)
@@ -0,0 +1,65 @@
+"""
+Словарь форм слов, однозначных в хоккейных новостях.
+
+У этих форм несколько разборов pymorphy2 с разными начальными формами,
+например, 'голы' - 'гол' и 'голый', 'втором' - 'второй' и 'второе'.
+В хоккейных новостях почти всегда имеется в виду одна из них, поэтому
+при лемматизации с morph_mode="gated" (см. preprocess.form_lemmas) такие
+формы не требуют нейронной модели.
+
+В словарь входят все неоднозначные формы лексемы, а не отдельные формы,
+и только если в частотном словаре настоящих новостей
+(data/frequency_dictionary.json) каждая другая лемма формы встречается
+хотя бы в 100 раз реже леммы из словаря. Поэтому, например, нет
+'следующей' ('следовать'), 'ему' ('оно') и 'третью' ('треть').
+
+Формы - в нижнем регистре, с 'е' вместо 'ё', леммы - уже исправленные
+(см. khl.wrong_lemmas).
+"""
+
+
+hockey_forms = {
+    "броска": "бросок",
+    "броски": "бросок",
+    "броском": "бросок",
+    "бросок": "бросок",
+    "весь": "весь",
+    "второго": "второй",
+    "второе": "второй",
+    "второй": "второй",
+    "втором": "второй",
+    "второму": "второй",
+    "вторые": "второй",
+    "вторым": "второй",
+    "вторыми": "второй",
+    "вторых": "второй",
+    "гол": "гол",
+    "гола": "гол",
+    "голам": "гол",
+    "голом": "гол",
+    "голы": "гол",
+    "для": "для",
+    "из": "из",
+    "минут": "минута",
+    "первого": "первый",
+    "первое": "первый",
+    "первом": "первый",
+    "первому": "первый",
+    "первые": "первый",
+    "первым": "первый",
+    "первыми": "первый",
+    "первых": "первый",
+    "после": "после",
+    "счетам": "счет",
+    "счетами": "счет",
+    "счетах": "счет",
+    "счетов": "счет",
+    "третье": "третий",
+    "третьего": "третий",
+    "третьем": "третий",
+    "третьему": "третий",
+    "третьи": "третий",
+    "третьим": "третий",
+    "третьими": "третий",
+    "третьих": "третий",
+}
@@ -0,0 +1,247 @@
+"""
+Метрики обработки текстов: счетчики, показатели и гистограммы задержек.
+
+MetricsRegistry хранит метрики по именам и выгружает их словарем (as_dict)
+или в текстовом формате Prometheus (to_prometheus). Конвейер
+(khl.pipeline.Pipeline) с заданным metrics считает обработанные тексты,
+символы и коды, тексты в обработке и время этапов unify, simplify, ner,
+dates, lemmatize и encode, а также попадания в кэш лемм.
+
+Гистограммы задержек устроены как HdrHistogram: значения в микросекундах
+раскладываются по корзинам с логарифмической шкалой порядков и линейной
+внутри порядка (SUB_BUCKETS корзин), так что погрешность квантилей
+не больше микросекунды или 1 / SUB_BUCKETS от значения при любом разбросе
+задержек, а учет значения - несколько целочисленных операций под блокировкой.
+Все метрики можно пополнять одновременно из нескольких потоков.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
+
+SUB_BUCKETS_BITS = 5
+SUB_BUCKETS = 1 << (SUB_BUCKETS_BITS - 1)  # корзин на порядок (степень двойки)
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+Collector = Callable[[], Dict[str, int]]  # pragma: no mutate
+
+
+class Counter:
+    """Монотонно растущий счетчик."""
+
+    def __init__(self) -> None:
+        """Создание счетчика."""
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def add(self, value: int = 1) -> None:
+        """Увеличение счетчика на value."""
+        with self._lock:
+            self.value += value
+
+
+class Gauge:
+    """Показатель, который может как расти, так и уменьшаться."""
+
+    def __init__(self) -> None:
+        """Создание показателя."""
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def add(self, value: int) -> None:
+        """Изменение показателя на value."""
+        with self._lock:
+            self.value += value
+
+
+def _bucket(microseconds: int) -> int:
+    """Номер корзины гистограммы для значения в микросекундах."""
+    if microseconds < 2 * SUB_BUCKETS:
+        return microseconds
+    shift = microseconds.bit_length() - SUB_BUCKETS_BITS
+    return (shift + 1) * SUB_BUCKETS + (microseconds >> shift) - SUB_BUCKETS
+
+
+def _bucket_bounds(bucket: int) -> Tuple[int, int]:
+    """Границы значений корзины в микросекундах: [нижняя, верхняя)."""
+    if bucket < 2 * SUB_BUCKETS:
+        return bucket, bucket + 1
+    shift = bucket // SUB_BUCKETS - 1
+    lower = (bucket % SUB_BUCKETS + SUB_BUCKETS) << shift
+    return lower, lower + (1 << shift)
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек с логарифмическими корзинами (см. модуль).
+
+    observe(seconds) - учет задержки, quantile(q) - квантиль задержек
+    в секундах (середина корзины).
+    """
+
+    def __init__(self) -> None:
+        """Создание пустой гистограммы."""
+        self.count = 0
+        self.sum = 0.0
+        self._buckets: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        """Учет задержки в секундах."""
+        bucket = _bucket(max(int(seconds * 1_000_000), 0))
+        with self._lock:
+            self.count += 1
+            self.sum += seconds
+            self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+
+    def quantile(self, q: float) -> float:
+        """Квантиль задержек в секундах (0.0 для пустой гистограммы)."""
+        with self._lock:
+            buckets = sorted(self._buckets.items())
+            count = self.count
+        rank = q * count
+        seen = 0
+        for bucket, bucket_count in buckets:
+            seen += bucket_count
+            if seen >= rank:
+                lower, upper = _bucket_bounds(bucket)
+                return (lower + upper) / 2 / 1_000_000
+        return 0.0
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Учет времени выполнения блока with."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+Metric = Union[Counter, Gauge, LatencyHistogram]  # pragma: no mutate
+MetricType = TypeVar("MetricType", Counter, Gauge, LatencyHistogram)
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик по именам.
+
+    counter, gauge, histogram - метрика с именем name (создается при первом
+    обращении); add_collector - функция, значения которой выгружаются как
+    счетчики (например, попадания в кэш, которые считает сам кэш);
+    функция с уже добавленным ключом key заменяет прежнюю.
+    Имена метрик выгружаются с приставкой prefix.
+    """
+
+    def __init__(self, prefix: str = "khl") -> None:
+        """Создание пустого реестра."""
+        self.prefix = prefix
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: Dict[Hashable, Collector] = {}
+        self._lock = threading.Lock()
+
+    def _metric(self, name: str, kind: Type[MetricType]) -> MetricType:
+        """Метрика name типа kind (создается при первом обращении)."""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = kind()
+        if not isinstance(metric, kind):
+            raise ValueError(f"Метрика {name} уже есть и это не {kind.__name__}")
+        return metric
+
+    def counter(self, name: str) -> Counter:
+        """Счетчик name."""
+        return self._metric(name, Counter)
+
+    def gauge(self, name: str) -> Gauge:
+        """Показатель name."""
+        return self._metric(name, Gauge)
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        """Гистограмма задержек name (значения - в секундах)."""
+        return self._metric(name, LatencyHistogram)
+
+    def add_collector(
+        self, collector: Collector, key: Optional[Hashable] = None
+    ) -> None:
+        """
+        Добавление функции со значениями счетчиков, вызываемой при выгрузке.
+
+        key - ключ функции (по умолчанию - сама функция): повторное
+        добавление функции с тем же ключом (например, при создании
+        нескольких конвейеров с одним кэшем) не увеличивает число функций.
+        """
+        with self._lock:
+            self._collectors[collector if key is None else key] = collector
+
+    def _collect(self) -> Tuple[Dict[str, Metric], Dict[str, int]]:
+        """Снимок метрик и значения счетчиков функций-сборщиков."""
+        with self._lock:
+            metrics = dict(self._metrics)
+            collectors = list(self._collectors.values())
+        collected: Dict[str, int] = {}
+        for collector in collectors:
+            collected.update(collector())
+        return metrics, collected
+
+    def as_dict(self) -> Dict[str, Union[int, Dict[str, float]]]:
+        """
+        Метрики словарем.
+
+        Счетчики и показатели - числа, гистограммы - словари
+        {"count": ..., "sum": ..., "p50": ..., "p90": ..., "p99": ..., "p999": ...}.
+        """
+        metrics, collected = self._collect()
+        result: Dict[str, Union[int, Dict[str, float]]] = {}
+        for name, metric in sorted(metrics.items()):
+            if isinstance(metric, LatencyHistogram):
+                summary = {"count": float(metric.count), "sum": metric.sum}
+                for q in QUANTILES:
+                    summary[f"p{str(q)[2:].ljust(2, '0')}"] = metric.quantile(q)
+                result[name] = summary
+            else:
+                result[name] = metric.value
+        result.update(sorted(collected.items()))
+        return result
+
+    def to_prometheus(self) -> str:
+        """
+        Метрики в текстовом формате Prometheus.
+
+        Счетчики выгружаются с окончанием _total, гистограммы задержек -
+        как summary: квантили QUANTILES, _sum и _count.
+        """
+        metrics, collected = self._collect()
+        lines = []
+        for name, metric in sorted(metrics.items()):
+            full_name = f"{self.prefix}_{name}"
+            if isinstance(metric, Counter):
+                lines.append(f"# TYPE {full_name}_total counter")
+                lines.append(f"{full_name}_total {metric.value}")
+            elif isinstance(metric, Gauge):
+                lines.append(f"# TYPE {full_name} gauge")
+                lines.append(f"{full_name} {metric.value}")
+            else:
+                lines.append(f"# TYPE {full_name} summary")
+                for q in QUANTILES:
+                    value = metric.quantile(q)
+                    lines.append(f'{full_name}{{quantile="{q}"}} {value}')
+                lines.append(f"{full_name}_sum {metric.sum}")
+                lines.append(f"{full_name}_count {metric.count}")
+        for name, value in sorted(collected.items()):
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {full_name}_total counter")
+            lines.append(f"{full_name}_total {value}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,102 @@
+"""
+Загрузка моделей natasha.
+
+Если задана переменная окружения KHL_MODELS_CACHE, то массивы весов моделей
+(эмбеддингов navec и теггеров slovnet) при первой загрузке распаковываются
+в этот каталог в файлы .npy, а затем отображаются в память только для чтения.
+Тогда все процессы, импортирующие khl, используют одни и те же физические
+страницы памяти с весами вместо собственных копий:
+  KHL_MODELS_CACHE=/tmp/khl_models python train.py
+Файлы весов лежат в подкаталоге с версиями natasha, slovnet и navec
+(см. weights_cache_dir): после обновления библиотек веса распаковываются
+заново, а не берутся устаревшие файлы той же формы.
+"""
+
+import os
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+from natasha import NewsEmbedding
+from natasha.data import NEWS_EMBEDDING
+from numpy.typing import NDArray
+
+MODELS_CACHE_VARIABLE = "KHL_MODELS_CACHE"
+
+# Массивы navec, которые используются при работе эмбеддингов и теггеров
+pq_arrays = ("indexes", "codes", "norm", "ab")
+
+
+def get_models_cache() -> Optional[Path]:
+    """Каталог для распакованных весов моделей (None - веса не распаковываются)."""
+    models_cache = os.environ.get(MODELS_CACHE_VARIABLE)
+    return Path(models_cache) if models_cache else None
+
+
+def weights_cache_dir(models_cache: Path) -> Path:
+    """Каталог весов в models_cache для установленных версий моделей."""
+    versions = "-".join(
+        f"{package}-{version(package)}" for package in ("natasha", "slovnet", "navec")
+    )
+    return models_cache / versions
+
+
+def map_array(path: Path, array: NDArray[Any]) -> NDArray[Any]:
+    """
+    Отображение массива в память из файла .npy только для чтения.
+
+    Если файла нет или он не соответствует массиву, то массив сохраняется
+    в файл. Запись идет во временный файл, который затем атомарно
+    переименовывается, поэтому одновременно стартующие процессы не видят
+    недописанный файл.
+    """
+    if path.exists():
+        mapped: NDArray[Any] = np.load(path, mmap_mode="r")
+        if mapped.shape == array.shape and mapped.dtype == array.dtype:
+            return mapped
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+    np.save(temporary_path, array)
+    os.replace(temporary_path, path)
+    mapped = np.load(path, mmap_mode="r")
+    return mapped
+
+
+def load_embedding(models_cache: Optional[Path] = None) -> NewsEmbedding:
+    """Загрузка эмбеддингов navec, с весами из models_cache, если он задан."""
+    emb = NewsEmbedding()
+    if models_cache is not None:
+        name = Path(NEWS_EMBEDDING).stem
+        for array in pq_arrays:
+            path = weights_cache_dir(models_cache) / f"{name}-{array}.npy"
+            setattr(emb.pq, array, map_array(path, getattr(emb.pq, array)))
+    return emb
+
+
+def load_tagger(
+    tagger_class: Any,
+    emb: NewsEmbedding,
+    models_cache: Optional[Path] = None,
+) -> Any:
+    """
+    Загрузка теггера natasha, с весами из models_cache, если он задан.
+
+    Словарь слов теггера совпадает со словарем эмбеддингов, поэтому теггер
+    использует словарь эмбеддингов вместо собственной копии.
+    """
+    tagger = tagger_class(emb)
+    words_vocab = tagger.infer.encoder.words_vocab
+    if words_vocab.items == emb.vocab.words:
+        words_vocab.items = emb.vocab.words
+        words_vocab.item_ids = emb.vocab.word_ids
+    if models_cache is not None:
+        for index, weight in enumerate(tagger.infer.model.weights):
+            # Веса эмбеддингов navec уже отображены в память в load_embedding
+            if weight.array is None or isinstance(weight.array, np.memmap):
+                continue
+            path = weights_cache_dir(models_cache) / (
+                f"{tagger_class.__name__}-{index}.npy"
+            )
+            weight.array = map_array(path, weight.array)
+    return tagger
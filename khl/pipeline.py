@@ -0,0 +1,718 @@
+"""
+Конвейер подготовки текстов хоккейных новостей.
+
+Pipeline один раз компилирует свою конфигурацию (стоп-слова, выбранные
+шаги упрощения, замену ner'ов), владеет нейронными моделями и кэшами,
+которыми пользуется, и дает явные гарантии потокобезопасности.
+Функции text_to_codes и texts_to_codes пакета - обертки над Pipeline.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from itertools import accumulate, islice
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from khl import preprocess, utils
+from khl.batching import (
+    DEFAULT_BUCKET_SIZE,
+    DEFAULT_CHUNK_SIZE,
+    PaddingStats,
+    chunked,
+    parallel_map,
+)
+from khl.metrics import MetricsRegistry
+from khl.preprocess import Code, Lemma, LemmaCache, MorphMode, TokenizedText
+from khl.shadow import ShadowVerifier
+from khl.stop_words import stop_words as default_stop_words
+
+Degradation = Literal["skip_dates", "gazetteer_ners"]  # pragma: no mutate
+# Текст или текст, уже разбитый на предложения и токены (для pretokenized)
+Text = Union[str, TokenizedText]  # pragma: no mutate
+# Упрощенный текст и упрощения обработки, примененные к нему
+SimplifiedText = Tuple[str, FrozenSet[Degradation]]  # pragma: no mutate
+
+# Упрощения обработки при нехватке времени в порядке их применения
+DEGRADATIONS: Tuple[Degradation, ...] = ("skip_dates", "gazetteer_ners")
+
+# Оценки времени дорогих этапов на символ текста (замеры на одном ядре)
+NER_SECONDS_PER_CHAR = 1e-5
+DATES_SECONDS_PER_CHAR = 1.5e-5
+
+
+class EncodedText(NamedTuple):
+    """Последовательность кодов текста и упрощения, примененные при обработке."""
+
+    codes: List[Code]
+    degradations: Tuple[Degradation, ...]
+
+
+class TextBudget:
+    """
+    Оставшееся время на обработку одного текста (см. Pipeline.encode).
+
+    На текст тратится только время, которое ушло на него самого: время
+    этапов, обрабатывающих тексты по одному, и доля времени батча
+    нейронной модели по числу символов текста. Поэтому упрощения обработки
+    текста в батче те же, что и при обработке его одного. Фрагменты текста
+    тратят общее время, в том числе из разных потоков.
+    """
+
+    def __init__(self, seconds: float) -> None:
+        """Создание бюджета в seconds секунд."""
+        self.remaining = seconds
+        self._lock = threading.Lock()
+
+    def spend(self, seconds: float) -> None:
+        """Учет seconds секунд, потраченных на текст."""
+        with self._lock:
+            self.remaining -= seconds
+
+
+class PreludeText(NamedTuple):
+    """
+    Текст после этапа prelude (см. Pipeline.prelude_stage).
+
+    chunks - фрагменты текста после шагов упрощения до замены ner'ов
+    и время их упрощения, budget - время на обработку текста.
+    """
+
+    chunks: List[Tuple[str, float]]
+    budget: Optional[TextBudget]
+
+
+def _ordered(degradations: Iterable[Degradation]) -> Tuple[Degradation, ...]:
+    """Упрощения обработки в порядке DEGRADATIONS."""
+    applied = set(degradations)
+    return tuple(name for name in DEGRADATIONS if name in applied)
+
+
+class Pipeline:
+    """
+    Конвейер преобразования текстов в последовательности кодов.
+
+    Pipeline(coder, stop_words, ...)(text) - то же, что и
+    text_to_codes(text, coder, stop_words, ...), но конфигурация
+    разбирается один раз при создании конвейера.
+
+    args:
+      coder, stop_words, replace_ners, replace_dates, replace_penalties,
+        exclude_unknown, max_len, ner_mode, incremental, morph_mode - как
+        у text_to_codes
+      chunk_size, bucket_size - как у texts_to_codes (для map и batch)
+      max_text_len, workers, hash_buckets, budget_ms - как у text_to_codes
+      padding_stats: если задана, то в нее записывается статистика
+        паддинга батчей нейронных моделей
+      trigger_stats: если задана, то в нее записывается статистика
+        пропусков шагов упрощения по триггерам (см. utils.TriggerStats)
+      metrics: если задан, то в него записываются метрики обработки
+        (см. khl.metrics): число текстов, символов и кодов, тексты
+        в обработке, время этапов unify, simplify, dates, encode (на текст),
+        ner, lemmatize (на батч), попадания в кэш лемм
+      ner_tagger, morph_tagger: нейронные модели natasha (по умолчанию -
+        общие модели модулей khl.utils и khl.preprocess)
+      lemma_cache: кэш лемм (по умолчанию - общий кэш khl.preprocess)
+      disabled_steps, insert_before, insert_after: отключение шагов упрощения
+        и вставка собственных шагов (см. utils.compile_simplify_steps)
+      pretokenized: если True, то на вход подаются тексты, уже разбитые
+        на предложения и токены (preprocess.TokenizedText); каждое
+        предложение упрощается отдельно, как фрагмент текста (см. _chunks),
+        а нейронные модели получают его токены без разбивки razdel'ем;
+        режим incremental с заданным max_len для них не поддерживается
+      shadow: если задана, то коды текстов, обработанных без упрощений
+        (см. encode), передаются ей на фоновую сверку с эталоном
+        (см. khl.shadow)
+
+    Один объект Pipeline можно использовать одновременно из нескольких
+    потоков, в том числе в сборках CPython без GIL:
+      - конфигурация, модели, словари и регулярные выражения после создания
+        только читаются;
+      - все изменяемое состояние обработки текста (документы natasha, токены,
+        промежуточные тексты) создается заново на каждый вызов, а парсеры дат
+        yargy - отдельно для каждого потока;
+      - общие изменяемые кэш лемм и статистика паддинга защищены блокировками
+        (кэш разборов слов pymorphy2 - functools.lru_cache, он потокобезопасен
+        сам по себе).
+    """
+
+    def __init__(
+        self,
+        coder: Dict[Lemma, Code],
+        stop_words: Optional[Collection[Lemma]] = default_stop_words,
+        replace_ners: bool = True,
+        replace_dates: bool = True,
+        replace_penalties: bool = True,
+        exclude_unknown: bool = True,
+        max_len: Optional[int] = None,
+        ner_mode: utils.NerMode = "neural",
+        incremental: bool = False,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        bucket_size: int = DEFAULT_BUCKET_SIZE,
+        padding_stats: Optional[PaddingStats] = None,
+        ner_tagger: Any = utils.ner_tagger,
+        morph_tagger: Any = preprocess.morph_tagger,
+        lemma_cache: LemmaCache = preprocess.shared_lemma_cache,
+        disabled_steps: Collection[str] = (),
+        insert_before: Optional[Dict[str, List[utils.SimplifyStep]]] = None,
+        insert_after: Optional[Dict[str, List[utils.SimplifyStep]]] = None,
+        max_text_len: Optional[int] = None,
+        workers: int = 1,
+        trigger_stats: Optional[utils.TriggerStats] = None,
+        hash_buckets: int = 0,
+        metrics: Optional[MetricsRegistry] = None,
+        budget_ms: Optional[float] = None,
+        pretokenized: bool = False,
+        shadow: Optional[ShadowVerifier] = None,
+        morph_mode: MorphMode = "neural",
+    ) -> None:
+        """Создание конвейера и компиляция его конфигурации."""
+        if pretokenized and incremental and max_len is not None:
+            raise ValueError("Режим incremental не поддерживается для pretokenized")
+        self.coder = coder
+        self.stop_words = None if stop_words is None else frozenset(stop_words)
+        self.exclude_unknown = exclude_unknown
+        self.max_len = max_len
+        self.incremental = incremental
+        # Коды, которые могут 'схлопнуться' с кодами следующих предложений:
+        # ner'ы и коды неизвестных слов (см. _incremental_codes)
+        self._mergeable_codes = frozenset(
+            code
+            for lemma, code in coder.items()
+            if lemma in preprocess._ner_merges
+            or lemma in preprocess._ner_merges.values()
+            or lemma.startswith(preprocess.UNKNOWN)
+        )
+        self.chunk_size = chunk_size
+        self.bucket_size = bucket_size
+        self.padding_stats = padding_stats
+        self.ner_tagger = ner_tagger
+        self.morph_tagger = morph_tagger
+        self.lemma_cache = lemma_cache
+        self.max_text_len = max_text_len
+        self.workers = workers
+        self.trigger_stats = trigger_stats
+        self.hash_buckets = hash_buckets
+        self.metrics = metrics
+        self.budget_ms = budget_ms
+        self.pretokenized = pretokenized
+        self.shadow = shadow
+        self.morph_mode = morph_mode
+        self._steps = utils.compile_simplify_steps(
+            replace_ners,
+            replace_dates,
+            replace_penalties,
+            disabled_steps,
+            insert_before,
+            insert_after,
+        )
+        self._replace_ners: Optional[Callable[[List[str]], List[str]]] = None
+        self._neural_ners = self._steps.replace_ners and ner_mode == "neural"
+        if self._neural_ners:
+            self._replace_ners = self._replace_ners_by_tagger
+        elif self._steps.replace_ners:
+            replacer = utils.ners_replacers[ner_mode]
+            self._replace_ners = lambda texts: [replacer(text) for text in texts]
+        # Шаги после замены ner'ов: до замены дат, замена дат, после нее
+        # (для раздельного учета времени этапов simplify и dates и для
+        # пропуска замены дат при нехватке времени)
+        dates_index = len(self._steps.after_ners)
+        if utils.replace_dates in self._steps.after_ners:
+            dates_index = self._steps.after_ners.index(utils.replace_dates)
+        self._before_dates = self._steps.after_ners[:dates_index]
+        self._dates = self._steps.after_ners[dates_index : dates_index + 1]
+        self._after_dates = self._steps.after_ners[dates_index + 1 :]
+        if metrics is not None:
+            metrics.add_collector(
+                lambda: {
+                    "lemma_cache_hits": lemma_cache.hits,
+                    "lemma_cache_misses": lemma_cache.misses,
+                },
+                key=("lemma_cache", lemma_cache),
+            )
+
+    def __call__(self, text: Text) -> List[Code]:
+        """Преобразует текст в последовательность кодов."""
+        return self.encode(text).codes
+
+    def map(self, texts: Iterable[Text]) -> Iterator[List[Code]]:
+        """
+        Преобразует поток текстов в последовательности кодов.
+
+        Тексты читаются по chunk_size штук, а их тексты и предложения подаются
+        в нейронные модели батчами из последовательностей близкой длины
+        (см. khl.batching). Результаты возвращаются в исходном порядке текстов.
+        В режиме incremental тексты обрабатываются по одному.
+        """
+        for encoded in self.encode_map(texts):
+            yield encoded.codes
+
+    def batch(self, texts: Iterable[Text]) -> List[List[Code]]:
+        """Преобразует тексты в последовательности кодов (см. map)."""
+        return list(self.map(texts))
+
+    def encode(self, text: Text) -> EncodedText:
+        """
+        Аналог __call__, но вместе с кодами возвращаются упрощения обработки.
+
+        Если задан budget_ms, то на обработку текста отводится budget_ms
+        миллисекунд. Когда оставшегося времени не хватает на дорогие этапы
+        (по оценкам NER_SECONDS_PER_CHAR и DATES_SECONDS_PER_CHAR), они
+        упрощаются в порядке DEGRADATIONS: сначала пропускается замена дат
+        ("skip_dates"), затем ner'ы заменяются по словарям вместо нейронной
+        модели ("gazetteer_ners"). Учитывается только время, потраченное
+        на сам текст (см. TextBudget).
+        """
+        budget = self._budget()
+        with self._in_progress([text]):
+            if isinstance(text, str) and self.incremental and self.max_len is not None:
+                start = time.perf_counter()
+                unified = self._unify(text)
+                if budget is not None:
+                    budget.spend(time.perf_counter() - start)
+                encoded = self._incremental_codes(unified, self.max_len, budget)
+            else:
+                (encoded,) = self._codes([text], self.max_len, [budget])
+        self._count_encoded([encoded])
+        self._submit_shadow([text], [encoded])
+        return encoded
+
+    def encode_map(self, texts: Iterable[Text]) -> Iterator[EncodedText]:
+        """
+        Аналог map, но вместе с кодами возвращаются упрощения обработки.
+
+        Время budget_ms (см. encode) отводится каждому тексту отдельно,
+        как и при обработке текстов по одному.
+        """
+        if self.incremental and self.max_len is not None:
+            yield from map(self.encode, texts)
+            return
+        for chunk in chunked(texts, self.chunk_size):
+            with self._in_progress(chunk):
+                encoded = self._codes(
+                    chunk, self.max_len, [self._budget() for _ in chunk]
+                )
+            self._count_encoded(encoded)
+            self._submit_shadow(chunk, encoded)
+            yield from encoded
+
+    def prelude_stage(self, text: Text) -> PreludeText:
+        """
+        Этап prelude: унификация, разбиение и шаги упрощения до замены ner'ов.
+
+        Этапы prelude_stage, ner_stage и morph_stage вместе дают то же, что
+        и encode_map (кроме режима incremental с заданным max_len), и могут
+        выполняться в разных потоках (см. khl.staged). Текст, поданный
+        на этапы, учитывается в метриках вызовами texts_started
+        и texts_finished.
+        """
+        budget = self._budget()
+        chunks = self._chunks(text, budget)
+        return PreludeText(
+            self._simplify_before_ners(chunks, [budget] * len(chunks)), budget
+        )
+
+    def ner_stage(self, texts: List[PreludeText]) -> List[List[SimplifiedText]]:
+        """Этап ner: замена ner'ов во фрагментах всех текстов и шаги после нее."""
+        simplified = iter(
+            self._simplify_from_ners(
+                [chunk for text in texts for chunk in text.chunks],
+                [text.budget for text in texts for _ in text.chunks],
+            )
+        )
+        return [[next(simplified) for _ in text.chunks] for text in texts]
+
+    def morph_stage(self, texts: List[List[SimplifiedText]]) -> List[EncodedText]:
+        """Этап morph: лемматизация и кодирование фрагментов текстов в одном потоке."""
+        return self._encode_simplified(texts, self.max_len, workers=1)
+
+    def texts_started(self, count: int) -> None:
+        """Учет count текстов, поданных на этапы (см. prelude_stage)."""
+        self._add_in_progress(count)
+
+    def texts_finished(
+        self, texts: List[Text], encoded_texts: List[EncodedText]
+    ) -> None:
+        """Учет текстов, прошедших этапы, и передача их кодов на сверку."""
+        self._add_in_progress(-len(texts))
+        self._count_texts(texts)
+        self._count_encoded(encoded_texts)
+        self._submit_shadow(texts, encoded_texts)
+
+    def _budget(self) -> Optional[TextBudget]:
+        """Время на обработку очередного текста (None - без ограничения)."""
+        if self.budget_ms is None:
+            return None
+        return TextBudget(self.budget_ms / 1000)
+
+    @contextmanager
+    def _in_progress(self, texts: List[Text]) -> Iterator[None]:
+        """Учет текстов в обработке, а после обработки - текстов и символов."""
+        self._add_in_progress(len(texts))
+        try:
+            yield
+        finally:
+            self._add_in_progress(-len(texts))
+        self._count_texts(texts)
+
+    def _add_in_progress(self, count: int) -> None:
+        """Изменение числа текстов в обработке на count."""
+        if self.metrics is not None:
+            self.metrics.gauge("texts_in_progress").add(count)
+
+    def _count_texts(self, texts: List[Text]) -> None:
+        """Учет обработанных текстов и символов (токенов - вместе с пробелами)."""
+        if self.metrics is not None:
+            self.metrics.counter("texts").add(len(texts))
+            self.metrics.counter("characters").add(
+                sum(
+                    len(text)
+                    if isinstance(text, str)
+                    else sum(len(" ".join(sentence)) for sentence in text)
+                    for text in texts
+                )
+            )
+
+    def _count_encoded(self, encoded_texts: List[EncodedText]) -> None:
+        """Учет полученных кодов и упрощений обработки."""
+        if self.metrics is None:
+            return
+        codes = sum(len(encoded.codes) for encoded in encoded_texts)
+        self.metrics.counter("codes").add(codes)
+        for encoded in encoded_texts:
+            for degradation in encoded.degradations:
+                self.metrics.counter(f"degraded_{degradation}").add()
+
+    def _submit_shadow(
+        self, texts: List[Text], encoded_texts: List[EncodedText]
+    ) -> None:
+        """Передача кодов текстов, обработанных без упрощений, на сверку."""
+        if self.shadow is None:
+            return
+        for text, encoded in zip(texts, encoded_texts):
+            if not encoded.degradations:
+                self.shadow.submit(text, encoded.codes)
+
+    def _unify(self, text: str) -> str:
+        """Унификация текста (см. utils.unify) с учетом времени."""
+        if self.metrics is None:
+            return utils.unify(text)
+        with self.metrics.histogram("unify_seconds").time():
+            return utils.unify(text)
+
+    def _replace_ners_by_tagger(self, texts: List[str]) -> List[str]:
+        """Замена ner'ов нейронной моделью конвейера."""
+        return utils.replace_ners_batch(
+            texts,
+            self.bucket_size,
+            self.padding_stats,
+            self.ner_tagger,
+            self.pretokenized,
+        )
+
+    def _chunks(self, text: Text, budget: Optional[TextBudget] = None) -> List[str]:
+        """
+        Унифицированные фрагменты текста, которые упрощаются по отдельности.
+
+        Текст длиннее max_text_len разбивается на фрагменты по границам
+        предложений (см. utils.split_long_text). Текст, уже разбитый
+        на предложения и токены (pretokenized), не разбивается razdel'ем:
+        фрагменты - его предложения с токенами через пробел.
+        """
+        if isinstance(text, str) == self.pretokenized:
+            raise TypeError(
+                "Конвейеру pretokenized нужны списки предложений из токенов"
+                if self.pretokenized
+                else "Списки предложений из токенов - только для pretokenized"
+            )
+        start = time.perf_counter()
+        if isinstance(text, str):
+            chunks = utils.split_long_text(self._unify(text), self.max_text_len)
+        else:
+            chunks = [self._unify(" ".join(sentence)) for sentence in text]
+        if budget is not None:
+            budget.spend(time.perf_counter() - start)
+        return chunks
+
+    def _simplify(
+        self, texts: List[Tuple[str, Optional[TextBudget]]]
+    ) -> List[SimplifiedText]:
+        """
+        Упрощение унифицированных текстов (см. utils.simplify).
+
+        texts - тексты и время на обработку каждого из них (см. TextBudget).
+        Возвращаются упрощенные тексты и упрощения обработки (см. encode),
+        примененные к каждому из них. Если задан metrics, то учитывается
+        время этапов simplify и dates (на каждый текст) и ner (на батч).
+        """
+        budgets = [budget for _, budget in texts]
+        return self._simplify_from_ners(
+            self._simplify_before_ners([text for text, _ in texts], budgets), budgets
+        )
+
+    def _simplify_before_ners(
+        self, texts: List[str], budgets: Sequence[Optional[TextBudget]]
+    ) -> List[Tuple[str, float]]:
+        """Шаги упрощения до замены ner'ов: тексты и время их упрощения."""
+        result = []
+        for text, budget in zip(texts, budgets):
+            start = time.perf_counter()
+            text = utils.apply_steps(text, self._steps.before_ners, self.trigger_stats)
+            seconds = time.perf_counter() - start
+            if budget is not None:
+                budget.spend(seconds)
+            result.append((text, seconds))
+        return result
+
+    def _simplify_from_ners(
+        self,
+        texts: List[Tuple[str, float]],
+        budgets: Sequence[Optional[TextBudget]],
+    ) -> List[SimplifiedText]:
+        """
+        Замена ner'ов и шаги упрощения после нее (см. _simplify).
+
+        texts - результаты _simplify_before_ners, budgets - время
+        на обработку текстов (см. TextBudget).
+        """
+        simplified_texts = [text for text, _ in texts]
+        texts_seconds = [seconds for _, seconds in texts]
+        degradations = self._plan_degradations(simplified_texts, budgets)
+        if self._replace_ners is not None:
+            start = time.perf_counter()
+            simplified_texts = self._replace_ners_within_budget(
+                self._replace_ners, simplified_texts, degradations, budgets
+            )
+            if self.metrics is not None:
+                self.metrics.histogram("ner_seconds").observe(
+                    time.perf_counter() - start
+                )
+        result = []
+        for text, seconds, text_degradations, budget in zip(
+            simplified_texts, texts_seconds, degradations, budgets
+        ):
+            start = time.perf_counter()
+            text = utils.apply_steps(text, self._before_dates, self.trigger_stats)
+            dates_start = time.perf_counter()
+            if budget is not None:
+                budget.spend(dates_start - start)
+                if self._dates and budget.remaining < DATES_SECONDS_PER_CHAR * len(
+                    text
+                ):
+                    text_degradations.add("skip_dates")
+            if "skip_dates" not in text_degradations:
+                text = utils.apply_steps(text, self._dates, self.trigger_stats)
+            dates_stop = time.perf_counter()
+            text = utils.apply_steps(text, self._after_dates, self.trigger_stats)
+            if budget is not None:
+                budget.spend(time.perf_counter() - dates_start)
+            if self.metrics is not None:
+                seconds += dates_start - start + time.perf_counter() - dates_stop
+                self.metrics.histogram("simplify_seconds").observe(seconds)
+                if self._dates and "skip_dates" not in text_degradations:
+                    self.metrics.histogram("dates_seconds").observe(
+                        dates_stop - dates_start
+                    )
+            result.append((text, frozenset(text_degradations)))
+        return result
+
+    def _plan_degradations(
+        self, texts: List[str], budgets: Sequence[Optional[TextBudget]]
+    ) -> List[Set[Degradation]]:
+        """
+        Упрощения обработки текстов перед заменой ner'ов (см. encode).
+
+        Оценка времени фрагмента учитывает оценки предыдущих фрагментов
+        того же текста (с тем же budget), но не других текстов батча.
+        """
+        degradations: List[Set[Degradation]] = [set() for _ in texts]
+        planned: Dict[int, float] = {}
+        for text, text_degradations, budget in zip(texts, degradations, budgets):
+            if budget is None:
+                continue
+            remaining = budget.remaining - planned.get(id(budget), 0.0)
+            ner_seconds = NER_SECONDS_PER_CHAR * len(text) if self._neural_ners else 0.0
+            dates_seconds = DATES_SECONDS_PER_CHAR * len(text) if self._dates else 0.0
+            if self._dates and remaining < ner_seconds + dates_seconds:
+                text_degradations.add("skip_dates")
+                dates_seconds = 0.0
+            if self._neural_ners and remaining < ner_seconds:
+                text_degradations.add("gazetteer_ners")
+                ner_seconds = 0.0
+            planned[id(budget)] = (
+                planned.get(id(budget), 0.0) + ner_seconds + dates_seconds
+            )
+        return degradations
+
+    @staticmethod
+    def _replace_ners_within_budget(
+        replace_ners: Callable[[List[str]], List[str]],
+        texts: List[str],
+        degradations: List[Set[Degradation]],
+        budgets: Sequence[Optional[TextBudget]],
+    ) -> List[str]:
+        """
+        Замена ner'ов, по словарям - в текстах с упрощением gazetteer_ners.
+
+        Время батча replace_ners делится между его текстами пропорционально
+        их длине (см. TextBudget).
+        """
+        gazetteer = ["gazetteer_ners" in degradation for degradation in degradations]
+        batch = [
+            text for text, by_gazetteer in zip(texts, gazetteer) if not by_gazetteer
+        ]
+        start = time.perf_counter()
+        replaced = iter(replace_ners(batch))
+        seconds_per_char = (time.perf_counter() - start) / max(sum(map(len, batch)), 1)
+        result = []
+        for text, by_gazetteer, budget in zip(texts, gazetteer, budgets):
+            start = time.perf_counter()
+            if by_gazetteer:
+                result.append(utils.replace_ners_by_gazetteer(text))
+                seconds = time.perf_counter() - start
+            else:
+                result.append(next(replaced))
+                seconds = seconds_per_char * len(text)
+            if budget is not None:
+                budget.spend(seconds)
+        return result
+
+    def _codes(
+        self,
+        texts: List[Text],
+        max_len: Optional[int],
+        budgets: Sequence[Optional[TextBudget]],
+    ) -> List[EncodedText]:
+        """
+        Преобразование текстов в последовательности кодов.
+
+        Тексты унифицируются и разбиваются на фрагменты (см. _chunks).
+        Фрагменты всех текстов упрощаются и разбиваются на токены в workers
+        потоках, а токены фрагментов одного текста лемматизируются подряд
+        (см. preprocess.lemmatize_chunks_to_codes_batch).
+        """
+        texts_chunks = [
+            self._chunks(text, budget) for text, budget in zip(texts, budgets)
+        ]
+        chunks = iter(
+            parallel_map(
+                self._simplify,
+                [
+                    (chunk, budget)
+                    for text_chunks, budget in zip(texts_chunks, budgets)
+                    for chunk in text_chunks
+                ],
+                self.workers,
+            )
+        )
+        return self._encode_simplified(
+            [list(islice(chunks, len(text_chunks))) for text_chunks in texts_chunks],
+            max_len,
+            self.workers,
+        )
+
+    def _encode_simplified(
+        self,
+        simplified_texts_chunks: List[List[SimplifiedText]],
+        max_len: Optional[int],
+        workers: int,
+    ) -> List[EncodedText]:
+        """
+        Лемматизация и кодирование упрощенных фрагментов текстов (см. _codes).
+
+        Упрощения обработки текста - все упрощения его фрагментов.
+        """
+        texts_codes = preprocess.lemmatize_chunks_to_codes_batch(
+            [
+                [chunk for chunk, _ in text_chunks]
+                for text_chunks in simplified_texts_chunks
+            ],
+            self.coder,
+            self.stop_words,
+            self.exclude_unknown,
+            max_len,
+            self.bucket_size,
+            self.padding_stats,
+            self.morph_tagger,
+            self.lemma_cache,
+            workers,
+            self.hash_buckets,
+            self.metrics,
+            self.pretokenized,
+            self.morph_mode,
+        )
+        return [
+            EncodedText(
+                codes,
+                _ordered(
+                    degradation
+                    for _, degradations in text_chunks
+                    for degradation in degradations
+                ),
+            )
+            for codes, text_chunks in zip(texts_codes, simplified_texts_chunks)
+        ]
+
+    def _incremental_codes(
+        self, text: str, max_len: int, budget: Optional[TextBudget]
+    ) -> EncodedText:
+        """
+        Преобразование в коды только начала унифицированного текста.
+
+        Обрабатываются начальные фрагменты текста из целых предложений,
+        каждый следующий фрагмент вдвое длиннее (по числу слов) предыдущего.
+        На стыке предложений коды могут меняться: ner'ы распознаются с учетом
+        контекста, одинаковые соседние леммы и коды 'схлопываются', стоп-слова
+        (например, точка) могут убрать границу между предложениями. Поэтому
+        первые max_len кодов принимаются, только если они совпали у двух
+        фрагментов подряд и за ними во фрагменте есть еще хотя бы один код,
+        который не 'схлопывается' (не ner и не код неизвестного слова):
+        тогда последняя из первых max_len лемм уже не продолжится
+        леммами следующих предложений, даже если между ними только
+        стоп-слова. Если такого не случилось, то обрабатывается весь текст.
+        Упрощения обработки - все упрощения обработанных фрагментов.
+        """
+        sentences_ends = [sentence.stop for sentence in utils.segmenter.sentenize(text)]
+        words_counts = list(
+            accumulate(
+                len(text[start:stop].split())
+                for start, stop in zip([0] + sentences_ends, sentences_ends)
+            )
+        )
+        previous_codes: List[Code] = []
+        degradations: List[Degradation] = []
+        words_count = max_len
+        while True:
+            sentences_count = bisect_left(words_counts, words_count) + 1
+            if sentences_count >= len(sentences_ends):
+                break
+            (encoded,) = self._codes(
+                [text[: sentences_ends[sentences_count - 1]]], None, [budget]
+            )
+            codes = encoded.codes
+            degradations.extend(encoded.degradations)
+            if codes[:max_len] == previous_codes[:max_len] and any(
+                code not in self._mergeable_codes for code in codes[max_len:]
+            ):
+                return EncodedText(codes[:max_len], _ordered(degradations))
+            previous_codes = codes
+            words_count = words_counts[sentences_count - 1] * 2
+        (encoded,) = self._codes([text], max_len, [budget])
+        degradations.extend(encoded.degradations)
+        return EncodedText(encoded.codes, _ordered(degradations))
@@ -5,28 +5,61 @@
 """
 
 import json
-from itertools import groupby
+import threading
+import time
+import zlib
+from functools import lru_cache, partial
+from itertools import chain, groupby, islice
 from pathlib import Path
-from typing import Dict, List, Literal, Optional, Union
-
+from typing import (
+    Any,
+    Collection,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import numpy as np
 from natasha import Doc, NewsMorphTagger
-from natasha.doc import DocToken
-
+from natasha.doc import DocSent, DocToken, inject_morph, sent_words
+from natasha.morph.lemma import normal_word
+from numpy.typing import ArrayLike, NDArray
+
+from khl.batching import (
+    DEFAULT_BUCKET_SIZE,
+    PaddingStats,
+    bucketed_map,
+    parallel_map,
+    tagger_batch_size,
+)
+from khl.hockey_forms import hockey_forms
+from khl.metrics import MetricsRegistry
+from khl.models import get_models_cache, load_tagger
 from khl.stop_words import stop_words
-from khl.utils import emb, morph_vocab, segmenter
+from khl.utils import emb, morph_vocab, pretokenized_words, segmenter
 from khl.wrong_lemmas import fixed_lemmas
 
 PLACEHOLDER = ""
 UNKNOWN = "???"
 
 
-morph_tagger = NewsMorphTagger(emb)
+morph_tagger = load_tagger(NewsMorphTagger, emb, get_models_cache())
 
 
 Word = str  # pragma: no mutate
 Lemma = str  # pragma: no mutate
 Code = int  # pragma: no mutate
 Ner = Literal["per", "org", "loc", "date", "pen"]  # pragma: no mutate
+MorphMode = Literal["neural", "gated"]  # pragma: no mutate
+# Текст, уже разбитый на предложения и токены: список предложений,
+# каждое - список токенов
+TokenizedText = List[List[Word]]  # pragma: no mutate
 
 
 def _merge(text_list: List[Word], source_word: Ner, target_word: Word) -> List[Word]:
@@ -74,6 +107,16 @@ def _merge_pens(text_list: List[Word]) -> List[Word]:
     return _merge(text_list=text_list, source_word="pen", target_word="pens")
 
 
+# Во что 'схлопываются' одинаковые соседние ner'ы
+_ner_merges: Dict[Word, Word] = {
+    "per": "pers",
+    "org": "orgs",
+    "loc": "locs",
+    "date": "dates",
+    "pen": "pens",
+}
+
+
 def _merge_ners(text_list: List[Word]) -> List[Word]:
     """# noqa
     ['per', 'per', 'org', 'org', 'loc', 'loc', 'date', 'date', 'pen', 'pen']
@@ -82,16 +125,52 @@ def _merge_ners(text_list: List[Word]) -> List[Word]:
     return _merge_pers(_merge_orgs(_merge_locs(_merge_dates(_merge_pens(text_list)))))
 
 
-def _tokenize(text: str) -> List[DocToken]:
+def _pretokenized_doc(sentences: TokenizedText) -> Doc:
+    """
+    Документ natasha из текста, уже разбитого на предложения и токены.
+
+    Аналог Doc(text).segment(segmenter), но без razdel: токены предложения
+    записываются в текст документа через пробел, предложения - через
+    перевод строки. Пустые предложения пропускаются.
+    """
+    tokens: List[DocToken] = []
+    sents: List[DocSent] = []
+    start = 0
+    for sentence in sentences:
+        if not sentence:
+            continue
+        sentence_tokens = []
+        stop = start
+        for word in sentence:
+            sentence_tokens.append(DocToken(stop, stop + len(word), word))
+            stop += len(word) + 1
+        text = " ".join(sentence)
+        sents.append(DocSent(start, start + len(text), text, sentence_tokens))
+        tokens.extend(sentence_tokens)
+        start = stop
+    return Doc("\n".join(sent.text for sent in sents), tokens, sents=sents)
+
+
+def _segmented_doc(text: Union[str, TokenizedText]) -> Doc:
+    """Документ natasha, разбитый на предложения и токены."""
+    if not isinstance(text, str):
+        return _pretokenized_doc(text)
+    doc = Doc(text)
+    doc.segment(segmenter)
+    return doc
+
+
+def _tokenize(text: Union[str, TokenizedText]) -> List[DocToken]:
     """
     Разбивка текста на токены с морфемами.
 
     'с морфемами' означает, что у каждого токена определено
     к какой части речи токен принадлежит, в каком он роде, числе и падеже.
     Это нужно для дальнейшей лемматизации - приведению токена к начальной форме.
+    Текст, уже разбитый на предложения и токены (TokenizedText), сразу
+    подается в нейронную модель, без разбивки razdel'ем.
     """
-    doc = Doc(text)
-    doc.segment(segmenter)
+    doc = _segmented_doc(text)
     doc.tag_morph(morph_tagger)
     tokens: List[DocToken] = doc.tokens
     return tokens
@@ -119,7 +198,7 @@ def fix_lemma(lemma: Lemma) -> Lemma:
 
 
 def lemmatize(
-    text: str, stop_words_: Optional[List[Lemma]] = stop_words
+    text: Union[str, TokenizedText], stop_words_: Optional[List[Lemma]] = stop_words
 ) -> List[Lemma]:
     """
     Разбивка текста на леммы.
@@ -134,6 +213,12 @@ def lemmatize(
         text="1 мая Морозов и Семин забили много голов от борта",
         stop_words_=["и", "много", "от"],
       ) -> ["1", "май", "морозов", "семин", "забить", "гол", "борт"]
+    Текст можно задать уже разбитым на предложения и токены (TokenizedText),
+    тогда он не разбивается razdel'ем:
+      lemmatize(
+        text=[["1", "мая", "Морозов", "забил"], ["Гол", "!"]],
+        stop_words_=None,
+      ) -> ["1", "май", "морозов", "забить", "гол", "!"]
     """
     text_tokens = _tokenize(text)
     for token in text_tokens:
@@ -149,6 +234,386 @@ def lemmatize(
     return _merge_lemmas(_merge_ners(text_lemmas))
 
 
+class LemmaCache:
+    """
+    Кэш лемм токенов: (слово, часть речи, морфемы) -> исправленная лемма.
+
+    Один кэш можно использовать одновременно из нескольких потоков:
+    обращения к словарю кэша защищены блокировкой, а сама лемматизация
+    идет вне блокировки. Когда в кэше max_size лемм, новые не добавляются.
+    hits и misses - сколько раз лемма нашлась и не нашлась в кэше.
+    """
+
+    def __init__(self, max_size: int = 100_000) -> None:
+        """Создание пустого кэша."""
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lemmas: Dict[Tuple[Any, ...], Lemma] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Количество лемм в кэше."""
+        return len(self._lemmas)
+
+    def items(self) -> List[Tuple[Tuple[Any, ...], Lemma]]:
+        """Снимок кэша: пары (ключ, лемма) (см. khl.snapshots)."""
+        with self._lock:
+            return list(self._lemmas.items())
+
+    def update(self, items: Iterable[Tuple[Tuple[Any, ...], Lemma]]) -> None:
+        """Добавление пар (ключ, лемма), пока в кэше меньше max_size лемм."""
+        with self._lock:
+            for key, lemma in items:
+                if len(self._lemmas) >= self.max_size:
+                    break
+                self._lemmas.setdefault(key, lemma)
+
+    def lemmatize(self, token: DocToken) -> Lemma:
+        """Исправленная лемма токена (см. fix_lemma)."""
+        key = (token.text, token.pos, *(token.feats or {}).items())
+        with self._lock:
+            lemma = self._lemmas.get(key)
+            if lemma is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if lemma is None:
+            token.lemmatize(morph_vocab)
+            lemma = fix_lemma(token.lemma)
+            with self._lock:
+                if len(self._lemmas) < self.max_size:
+                    self._lemmas[key] = lemma
+        return lemma
+
+
+# Кэш лемм, общий для всех конвейеров по умолчанию
+shared_lemma_cache = LemmaCache()
+
+
+@lru_cache(maxsize=100_000)
+def form_lemmas(word: Word) -> FrozenSet[Lemma]:
+    """
+    Все исправленные леммы, которые может получить форма слова.
+
+    Лемма токена - начальная форма того разбора pymorphy2, который лучше
+    всего совпадает с частью речи и морфемами от нейронной модели. Если
+    у всех разборов формы одна начальная форма, то лемма от модели
+    почти не зависит (если разборов нет, то лемма - сама форма). Она
+    отличается, только если модель ошиблась так, что ни один разбор
+    не совпал с ней ни частью речи, ни морфемами: тогда natasha берет
+    леммой саму форму (например, 'читайте' вместо 'читать'). Формы
+    из khl.hockey_forms (неоднозначные в общем словаре, но однозначные
+    в хоккейных новостях) получают лемму из него.
+    """
+    form = normal_word(word)
+    lemma = hockey_forms.get(form)
+    if lemma is not None:
+        return frozenset([lemma])
+    lemmas = frozenset(
+        fix_lemma(normal_word(parse.normal)) for parse in morph_vocab(form)
+    )
+    return lemmas or frozenset([fix_lemma(form)])
+
+
+def _unambiguous_lemma(
+    word: Word, stop_words_: Optional[Collection[Lemma]]
+) -> Optional[Lemma]:
+    """
+    Лемма формы слова, если она не зависит от нейронной модели, иначе None.
+
+    Если все возможные леммы формы - стоп-слова, то форма отбрасывается
+    при любой лемме, и возвращается любая из них.
+    """
+    lemmas = form_lemmas(word)
+    if len(lemmas) == 1 or (
+        stop_words_ is not None and all(lemma in stop_words_ for lemma in lemmas)
+    ):
+        return min(lemmas)
+    return None
+
+
+def _lemmatize_unambiguous(
+    tokens: List[DocToken], stop_words_: Optional[Collection[Lemma]]
+) -> bool:
+    """
+    Лемматизация токенов предложения без нейронной модели (см. form_lemmas).
+
+    Если леммы всех токенов однозначны, то они записываются в token.lemma
+    (уже исправленными, часть речи токенов остается None) и возвращается
+    True, иначе токены не меняются и возвращается False.
+    """
+    lemmas = []
+    for token in tokens:
+        lemma = _unambiguous_lemma(token.text, stop_words_)
+        if lemma is None:
+            return False
+        lemmas.append(lemma)
+    for token, lemma in zip(tokens, lemmas):
+        token.lemma = lemma
+    return True
+
+
+def _iter_lemmas(
+    tokens: Iterable[DocToken],
+    stop_words_: Optional[Collection[Lemma]],
+    lemma_cache: Optional[LemmaCache] = None,
+) -> Iterator[Lemma]:
+    """
+    Ленивая лемматизация токенов с исправлением лемм и отбрасыванием стоп-слов.
+
+    Токены без части речи уже лемматизированы без нейронной модели
+    (см. _lemmatize_unambiguous).
+    """
+    for token in tokens:
+        if token.pos is None:
+            lemma = token.lemma
+        elif lemma_cache is None:
+            token.lemmatize(morph_vocab)
+            lemma = fix_lemma(token.lemma)
+        else:
+            lemma = lemma_cache.lemmatize(token)
+        if stop_words_ is None or lemma not in stop_words_:
+            yield lemma
+
+
+def _iter_merged_lemmas(lemmas: Iterable[Lemma]) -> Iterator[Lemma]:
+    """
+    'Схлопывание' соседних ner'ов и одинаковых соседних лемм за один проход.
+
+    Потоковый аналог _merge_lemmas(_merge_ners(lemmas)).
+    """
+    previous = None
+    for lemma, group in groupby(lemmas):
+        if lemma in _ner_merges and sum(1 for _ in islice(group, 2)) > 1:
+            lemma = _ner_merges[lemma]
+        if lemma != previous:
+            yield lemma
+            previous = lemma
+
+
+def _iter_codes(
+    lemmas: Iterable[Lemma],
+    coder: Dict[Lemma, Code],
+    exclude_unknown: bool,
+    hash_buckets: int = 0,
+) -> Iterator[Code]:
+    """Потоковый аналог lemmas_to_codes без ограничения длины."""
+    previous = None
+    for lemma in lemmas:
+        code = coder.get(lemma)
+        if code is None:
+            if exclude_unknown:
+                continue
+            code = _unknown_code(lemma, coder, hash_buckets)
+        if code != previous:
+            yield code
+            previous = code
+
+
+def lemmatize_to_codes(
+    text: Union[str, TokenizedText],
+    coder: Dict[Lemma, Code],
+    stop_words_: Optional[List[Lemma]] = stop_words,
+    exclude_unknown: bool = True,
+    max_len: Optional[int] = None,
+    hash_buckets: int = 0,
+) -> List[Code]:
+    """
+    Разбивка текста на леммы сразу с преобразованием их в коды.
+
+    Аналог lemmas_to_codes(lemmatize(text, stop_words_), coder, ...), но
+    исправление лемм, отбрасывание стоп-слов, 'схлопывание' ner'ов и
+    повторов, получение кодов делаются за один потоковый проход по токенам,
+    без промежуточных списков. Если задан max_len, то лемматизация
+    прекращается, как только набрано max_len кодов.
+    """
+    return _tokens_to_codes(
+        _tokenize(text),
+        coder,
+        None if stop_words_ is None else set(stop_words_),
+        exclude_unknown,
+        max_len,
+        hash_buckets=hash_buckets,
+    )
+
+
+def _tokens_to_codes(
+    tokens: Iterable[DocToken],
+    coder: Dict[Lemma, Code],
+    stop_words_: Optional[Collection[Lemma]],
+    exclude_unknown: bool,
+    max_len: Optional[int],
+    lemma_cache: Optional[LemmaCache] = None,
+    hash_buckets: int = 0,
+) -> List[Code]:
+    """Лемматизация токенов с преобразованием лемм в коды (см. lemmatize_to_codes)."""
+    lemmas = _iter_lemmas(tokens, stop_words_, lemma_cache)
+    codes = _iter_codes(
+        _iter_merged_lemmas(lemmas), coder, exclude_unknown, hash_buckets
+    )
+    if max_len is None:
+        return list(codes)
+    taken_codes = list(islice(codes, max_len))
+    if len(taken_codes) == max_len:
+        return taken_codes
+    return _fill_placeholders(taken_codes, coder, max_len)
+
+
+def _tokenize_batch(
+    texts: List[str],
+    bucket_size: int = DEFAULT_BUCKET_SIZE,
+    padding_stats: Optional[PaddingStats] = None,
+    morph_tagger_: Any = morph_tagger,
+    pretokenized: bool = False,
+    morph_mode: MorphMode = "neural",
+    stop_words_: Optional[Collection[Lemma]] = None,
+) -> List[List[DocToken]]:
+    """
+    Разбивка сразу нескольких текстов на токены с морфемами.
+
+    Предложения всех текстов подаются в нейронную модель батчами
+    из предложений близкой длины (см. khl.batching).
+    pretokenized=True - каждый текст - одно предложение, уже разбитое
+    на токены (см. utils.pretokenized_words), без разбивки razdel'ем.
+    morph_mode="gated" - в нейронную модель подаются только предложения,
+    в которых лемма хотя бы одного токена зависит от нее, остальные
+    предложения лемматизируются сразу (см. _lemmatize_unambiguous);
+    stop_words_ - стоп-слова, леммы которых не различаются.
+    """
+    if pretokenized:
+        docs = [_pretokenized_doc([pretokenized_words(text)]) for text in texts]
+    else:
+        docs = [_segmented_doc(text) for text in texts]
+    sents = []
+    for doc in docs:
+        sents.extend(doc.sents)
+    if morph_mode == "gated":
+        sents = [
+            sent
+            for sent in sents
+            if not _lemmatize_unambiguous(sent.tokens, stop_words_)
+        ]
+    words = [sent_words(sent) for sent in sents]
+    markups = bucketed_map(
+        morph_tagger_.map,
+        words,
+        [len(sent_words_) for sent_words_ in words],
+        tagger_batch_size(morph_tagger_),
+        bucket_size,
+        padding_stats,
+    )
+    for sent, markup in zip(sents, markups):
+        inject_morph(sent.tokens, markup.tokens)
+    return [doc.tokens for doc in docs]
+
+
+def lemmatize_to_codes_batch(
+    texts: List[str],
+    coder: Dict[Lemma, Code],
+    stop_words_: Optional[Collection[Lemma]] = stop_words,
+    exclude_unknown: bool = True,
+    max_len: Optional[int] = None,
+    bucket_size: int = DEFAULT_BUCKET_SIZE,
+    padding_stats: Optional[PaddingStats] = None,
+    morph_tagger_: Any = morph_tagger,
+    lemma_cache: Optional[LemmaCache] = None,
+    hash_buckets: int = 0,
+    morph_mode: MorphMode = "neural",
+) -> List[List[Code]]:
+    """
+    Разбивка сразу нескольких текстов на леммы с преобразованием их в коды.
+
+    Аналог [lemmatize_to_codes(text, ...) for text in texts], но предложения
+    текстов подаются в нейронную модель батчами (см. _tokenize_batch).
+    """
+    return lemmatize_chunks_to_codes_batch(
+        [[text] for text in texts],
+        coder,
+        stop_words_,
+        exclude_unknown,
+        max_len,
+        bucket_size,
+        padding_stats,
+        morph_tagger_,
+        lemma_cache,
+        hash_buckets=hash_buckets,
+        morph_mode=morph_mode,
+    )
+
+
+def lemmatize_chunks_to_codes_batch(
+    texts_chunks: List[List[str]],
+    coder: Dict[Lemma, Code],
+    stop_words_: Optional[Collection[Lemma]] = stop_words,
+    exclude_unknown: bool = True,
+    max_len: Optional[int] = None,
+    bucket_size: int = DEFAULT_BUCKET_SIZE,
+    padding_stats: Optional[PaddingStats] = None,
+    morph_tagger_: Any = morph_tagger,
+    lemma_cache: Optional[LemmaCache] = None,
+    workers: int = 1,
+    hash_buckets: int = 0,
+    metrics: Optional[MetricsRegistry] = None,
+    pretokenized: bool = False,
+    morph_mode: MorphMode = "neural",
+) -> List[List[Code]]:
+    """
+    Аналог lemmatize_to_codes_batch для текстов, разбитых на фрагменты.
+
+    Каждый текст задан списком своих фрагментов (см. utils.split_long_text).
+    Фрагменты всех текстов разбиваются на токены вместе, в workers потоках
+    (см. batching.parallel_map), а токены фрагментов одного текста
+    лемматизируются подряд, как токены целого текста: 'схлопывание' ner'ов,
+    одинаковых лемм и кодов работает и на стыках фрагментов.
+    Если задан metrics, то в него записывается время этапов lemmatize
+    (разбивка на токены с морфемами, на весь вызов) и encode (лемматизация
+    токенов и получение кодов, на каждый текст).
+    pretokenized=True - фрагменты - предложения, уже разбитые на токены
+    (см. _tokenize_batch).
+    morph_mode="gated" - в нейронную модель подаются только предложения
+    с неоднозначными леммами (см. _tokenize_batch).
+    """
+    stop_words_set = None if stop_words_ is None else frozenset(stop_words_)
+    start = time.perf_counter()
+    chunks_tokens = iter(
+        parallel_map(
+            partial(
+                _tokenize_batch,
+                bucket_size=bucket_size,
+                padding_stats=padding_stats,
+                morph_tagger_=morph_tagger_,
+                pretokenized=pretokenized,
+                morph_mode=morph_mode,
+                stop_words_=stop_words_set,
+            ),
+            [chunk for text_chunks in texts_chunks for chunk in text_chunks],
+            workers,
+        )
+    )
+    encode_seconds = None
+    if metrics is not None:
+        metrics.histogram("lemmatize_seconds").observe(time.perf_counter() - start)
+        encode_seconds = metrics.histogram("encode_seconds")
+    texts_codes = []
+    for text_chunks in texts_chunks:
+        start = time.perf_counter()
+        texts_codes.append(
+            _tokens_to_codes(
+                chain.from_iterable(list(islice(chunks_tokens, len(text_chunks)))),
+                coder,
+                stop_words_set,
+                exclude_unknown,
+                max_len,
+                lemma_cache,
+                hash_buckets,
+            )
+        )
+        if encode_seconds is not None:
+            encode_seconds.observe(time.perf_counter() - start)
+    return texts_codes
+
+
 def _merge_codes(codes: List[Code]) -> List[Code]:
     """
     Схлопывание одинаковых соседних кодов.
@@ -163,6 +628,7 @@ def lemmas_to_codes(
     coder: Dict[Lemma, Code],
     exclude_unknown: bool = True,
     max_len: Optional[int] = None,
+    hash_buckets: int = 0,
 ) -> List[Code]:
     """
     Преобразует последовательность лемм в последовательность их кодов.
@@ -171,15 +637,18 @@ def lemmas_to_codes(
       если True, то леммы, которых нет в частотном словаре, отбрасываются;
       если False, то для лемм, которых нет в частотном словаре,
         проставляется код неизвестного слова
+    hash_buckets:
+      если не 0 и exclude_unknown=False, то леммы, которых нет в частотном
+        словаре, вместо одного кода неизвестного слова распределяются
+        хэшем по hash_buckets кодам корзин (кодер должен быть получен
+        get_coder с тем же hash_buckets)
     """
     codes = []
     for lemma in lemmas:
-        if not exclude_unknown:
-            codes.append(coder.get(lemma, coder[UNKNOWN]))
-        elif lemma in coder:
+        if lemma in coder:
             codes.append(coder[lemma])
-        else:
-            continue
+        elif not exclude_unknown:
+            codes.append(_unknown_code(lemma, coder, hash_buckets))
     codes = _merge_codes(codes)
     if max_len is None:
         return codes
@@ -189,6 +658,28 @@ def lemmas_to_codes(
         return _fill_placeholders(codes, coder, max_len)
 
 
+def hash_bucket(lemma: Lemma, hash_buckets: int) -> int:
+    """
+    Номер корзины леммы: от 0 до hash_buckets - 1.
+
+    Хэш - crc32 от utf-8 байтов леммы: в отличие от встроенного hash,
+    он не зависит от PYTHONHASHSEED и одинаков во всех процессах.
+    """
+    return zlib.crc32(lemma.encode("utf-8")) % hash_buckets
+
+
+def bucket_lemma(bucket: int) -> Lemma:
+    """Метка корзины неизвестных лемм в кодере: '???0', '???1', ..."""
+    return f"{UNKNOWN}{bucket}"
+
+
+def _unknown_code(lemma: Lemma, coder: Dict[Lemma, Code], hash_buckets: int) -> Code:
+    """Код леммы, которой нет в частотном словаре (см. lemmas_to_codes)."""
+    if hash_buckets:
+        return coder[bucket_lemma(hash_bucket(lemma, hash_buckets))]
+    return coder[UNKNOWN]
+
+
 def _fill_placeholders(
     codes: List[Code],
     coder: Dict[Lemma, Code],
@@ -209,7 +700,96 @@ def codes_to_lemmas(codes: List[Code], coder: Dict[Lemma, Code]) -> List[Lemma]:
     return lemmas
 
 
-def get_coder(frequency_dictionary_file: Union[Path, str]) -> Dict[Lemma, Code]:
+class LemmasVocabulary:
+    """
+    Обратный кодер на массивах numpy: леммы и их длины, индекс - код.
+
+    Создается один раз на кодер и используется для векторного
+    преобразования кодов в леммы (см. codes_to_lemmas_batch).
+    """
+
+    def __init__(self, coder: Dict[Lemma, Code]) -> None:
+        """Создание обратного кодера."""
+        self.lemmas: NDArray[np.object_] = np.full(
+            max(coder.values()) + 1, "", dtype=object
+        )
+        for lemma, code in coder.items():
+            self.lemmas[code] = lemma
+        self.lengths = np.array([len(lemma) for lemma in self.lemmas], dtype=np.int64)
+        self.placeholder = coder[PLACEHOLDER]
+
+
+def _ragged_codes(
+    codes: ArrayLike,
+    vocabulary: LemmasVocabulary,
+    offsets: Optional[ArrayLike],
+) -> Tuple[NDArray[Any], NDArray[np.int64]]:
+    """
+    Коды документов подряд без кода заполнителя и начала документов в них.
+
+    offsets=None - codes двумерный массив (документ - строка),
+    иначе codes - коды документов подряд, offsets - начала документов
+    в codes (документов + 1, как в khl.dataset).
+    """
+    codes = np.asarray(codes)
+    kept = codes != vocabulary.placeholder
+    if offsets is None:
+        ragged_offsets = np.zeros(len(codes) + 1, dtype=np.int64)
+        np.cumsum(kept.sum(axis=1), out=ragged_offsets[1:])
+    else:
+        kept_before = np.zeros(len(codes) + 1, dtype=np.int64)
+        np.cumsum(kept, out=kept_before[1:])
+        ragged_offsets = kept_before[np.asarray(offsets)]
+    return codes[kept], ragged_offsets
+
+
+def codes_to_lemmas_batch(
+    codes: ArrayLike,
+    vocabulary: LemmasVocabulary,
+    offsets: Optional[ArrayLike] = None,
+) -> List[List[Lemma]]:
+    """
+    Преобразует сразу много последовательностей кодов в леммы.
+
+    codes - двумерный массив кодов (например, батч последовательностей
+    длины max_len) или, если заданы offsets, коды документов подряд
+    и начала документов в них (см. khl.dataset). Коды заполнителя
+    пропускаются. Леммы всех кодов берутся из массива vocabulary одной
+    векторной операцией.
+    """
+    values, ragged_offsets = _ragged_codes(codes, vocabulary, offsets)
+    lemmas = vocabulary.lemmas[values].tolist()
+    bounds = ragged_offsets.tolist()
+    return [lemmas[start:stop] for start, stop in zip(bounds, bounds[1:])]
+
+
+def codes_to_texts_batch(
+    codes: ArrayLike,
+    vocabulary: LemmasVocabulary,
+    offsets: Optional[ArrayLike] = None,
+    separator: str = " ",
+) -> List[str]:
+    """
+    Аналог codes_to_lemmas_batch, но леммы каждого документа склеены через separator.
+
+    Леммы всех документов склеиваются в одну строку за один вызов
+    str.join, а тексты документов вырезаются из нее по границам,
+    вычисленным из длин лемм.
+    """
+    values, ragged_offsets = _ragged_codes(codes, vocabulary, offsets)
+    text = separator.join(vocabulary.lemmas[values].tolist())
+    lemmas_starts = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(vocabulary.lengths[values] + len(separator), out=lemmas_starts[1:])
+    starts = lemmas_starts[ragged_offsets[:-1]].tolist()
+    stops = (lemmas_starts[ragged_offsets[1:]] - len(separator)).tolist()
+    return [text[start:stop] for start, stop in zip(starts, stops)]
+
+
+def get_coder(
+    frequency_dictionary_file: Union[Path, str],
+    max_lemmas: Optional[int] = None,
+    hash_buckets: int = 0,
+) -> Dict[Lemma, Code]:
     """
     Получение словаря кодового представления лемм из частотного словаря лемм.
 
@@ -224,10 +804,19 @@ def get_coder(frequency_dictionary_file: Union[Path, str]) -> Dict[Lemma, Code]:
     Первые 2 элемента кодера зарезервированы:
       0 - символ-заполнитель
       1 - неизвестное слово
+
+    max_lemmas - если задано, то в кодер попадают только первые max_lemmas
+      лемм частотного словаря.
+    hash_buckets - сколько кодов зарезервировать после лемм частотного
+      словаря под корзины неизвестных лемм (метки корзин - bucket_lemma):
+      с ним небольшой кодер различает неизвестные леммы, а не сводит их
+      все к одному коду (см. lemmas_to_codes).
     """
     coder = {PLACEHOLDER: 0, UNKNOWN: 1}
     with open(frequency_dictionary_file, "r", encoding="utf-8") as fr:
         freq_dict = json.load(fr)
-    for freq, word in enumerate(freq_dict, len(coder)):
+    for freq, word in enumerate(islice(freq_dict, max_lemmas), len(coder)):
         coder[word] = freq
+    for bucket in range(hash_buckets):
+        coder[bucket_lemma(bucket)] = len(coder)
     return coder
@@ -0,0 +1,203 @@
+"""
+Теневая проверка быстрых путей обработки текстов.
+
+Быстрые пути (батчи нейронных моделей, разбивка длинных текстов, кэши,
+поэтапная обработка) должны давать те же коды, что и эталон - например,
+text_to_codes с теми же параметрами. ShadowVerifier проверяет это прямо
+в работе: доля sample_rate обработанных текстов вместе с полученными
+кодами ставится в очередь, а фоновый поток пересчитывает их эталоном
+и сравнивает. Основной поток только кладет текст в очередь и не ждет
+(если очередь заполнена, то текст не проверяется), поэтому задержка
+обработки не растет; фоновый поток делит с основным процессор, так что
+sample_rate стоит держать небольшим.
+
+Метрики (в metrics, по умолчанию - в собственный реестр, см. khl.metrics):
+  shadow_checked, shadow_diverged - проверено текстов и с расхождениями;
+  shadow_dropped - не проверено из-за заполненной очереди;
+  shadow_errors - эталон завершился ошибкой;
+  shadow_reference_seconds - время эталона на текст.
+Последние max_examples расхождений - в examples (см. ShadowDiff), а вместе
+с метриками - в сводке report(), которую можно сохранить как JSON.
+"""
+
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Union
+
+from khl.metrics import MetricsRegistry
+from khl.preprocess import Code, TokenizedText
+
+DEFAULT_SHADOW_QUEUE_SIZE = 1_000
+DEFAULT_MAX_EXAMPLES = 10
+
+_DONE = object()  # признак остановки фонового потока
+
+Reference = Callable[[Union[str, TokenizedText]], List[Code]]  # pragma: no mutate
+
+
+class ShadowDiff(NamedTuple):
+    """
+    Расхождение быстрого пути с эталоном.
+
+    position - номер первого различающегося кода (или длина более короткой
+    последовательности, если одна из них - начало другой).
+    """
+
+    text: Union[str, TokenizedText]
+    codes: List[Code]
+    expected_codes: List[Code]
+    position: int
+
+
+def _first_difference(codes: List[Code], expected_codes: List[Code]) -> int:
+    """Номер первого различающегося кода двух последовательностей."""
+    for position, (code, expected_code) in enumerate(zip(codes, expected_codes)):
+        if code != expected_code:
+            return position
+    return min(len(codes), len(expected_codes))
+
+
+class ShadowVerifier:
+    """
+    Фоновая проверка кодов текстов эталоном (см. модуль).
+
+    Пример использования:
+      verifier = ShadowVerifier(partial(text_to_codes, coder=coder), 0.01)
+      pipeline = Pipeline(coder, shadow=verifier)
+      ...
+      verifier.divergence_rate   # доля проверенных текстов с расхождениями
+      verifier.examples          # последние расхождения
+
+    args:
+      reference: эталон - функция текст -> коды
+      sample_rate: доля проверяемых текстов
+      metrics: реестр метрик проверки (по умолчанию - собственный)
+      max_examples: сколько последних расхождений хранить
+      queue_size: наибольшее число текстов в очереди на проверку
+      seed: начальное значение генератора выборки текстов
+    """
+
+    def __init__(
+        self,
+        reference: Reference,
+        sample_rate: float = 0.01,
+        metrics: Optional[MetricsRegistry] = None,
+        max_examples: int = DEFAULT_MAX_EXAMPLES,
+        queue_size: int = DEFAULT_SHADOW_QUEUE_SIZE,
+        seed: Optional[int] = None,
+    ) -> None:
+        """Создание проверки; фоновый поток запускается при первом тексте."""
+        self.reference = reference
+        self.sample_rate = sample_rate
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self._examples: Deque[ShadowDiff] = deque(maxlen=max_examples)
+        self._queue: "queue.Queue[Any]" = queue.Queue(queue_size)
+        self._random = random.Random(seed)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def examples(self) -> List[ShadowDiff]:
+        """Последние (не больше max_examples) расхождения, от старых к новым."""
+        with self._lock:
+            return list(self._examples)
+
+    @property
+    def checked(self) -> int:
+        """Число проверенных текстов."""
+        return self.metrics.counter("shadow_checked").value
+
+    @property
+    def diverged(self) -> int:
+        """Число проверенных текстов, коды которых разошлись с эталоном."""
+        return self.metrics.counter("shadow_diverged").value
+
+    @property
+    def divergence_rate(self) -> float:
+        """Доля проверенных текстов с расхождениями (0.0, если проверок не было)."""
+        checked = self.checked
+        return self.diverged / checked if checked else 0.0
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Сводка: число проверок, расхождений, их доля и последние расхождения.
+
+        Расхождения - словари с полями ShadowDiff, так что сводку можно
+        выгрузить в JSON вместе с метриками (см. MetricsRegistry.as_dict).
+        """
+        examples = [diff._asdict() for diff in self.examples]
+        return {
+            "checked": self.checked,
+            "diverged": self.diverged,
+            "dropped": self.metrics.counter("shadow_dropped").value,
+            "errors": self.metrics.counter("shadow_errors").value,
+            "divergence_rate": self.divergence_rate,
+            "examples": examples,
+        }
+
+    def submit(self, text: Union[str, TokenizedText], codes: List[Code]) -> None:
+        """Постановка текста и его кодов в очередь на проверку (с вероятностью)."""
+        with self._lock:
+            if self._random.random() >= self.sample_rate:
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait((text, list(codes)))
+        except queue.Full:
+            self.metrics.counter("shadow_dropped").add()
+
+    def join(self) -> None:
+        """Ожидание проверки всех текстов, поставленных в очередь."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Проверка текстов из очереди и остановка фонового потока."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_DONE)
+            thread.join()
+
+    def __enter__(self) -> "ShadowVerifier":
+        """Начало проверки."""
+        return self
+
+    def __exit__(self, *_exc_info: object) -> None:
+        """Завершение проверки (см. close)."""
+        self.close()
+
+    def _run(self) -> None:
+        """Фоновый поток: пересчет кодов текстов из очереди эталоном."""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _DONE:
+                    return
+                self._check(*item)
+            finally:
+                self._queue.task_done()
+
+    def _check(self, text: Union[str, TokenizedText], codes: List[Code]) -> None:
+        """Сравнение кодов текста с эталоном."""
+        start = time.perf_counter()
+        try:
+            expected_codes = self.reference(text)
+        except Exception:  # ошибка эталона не должна останавливать проверку
+            self.metrics.counter("shadow_errors").add()
+            return
+        self.metrics.histogram("shadow_reference_seconds").observe(
+            time.perf_counter() - start
+        )
+        self.metrics.counter("shadow_checked").add()
+        if codes != expected_codes:
+            diff = ShadowDiff(
+                text, codes, expected_codes, _first_difference(codes, expected_codes)
+            )
+            with self._lock:
+                self._examples.append(diff)
+            self.metrics.counter("shadow_diverged").add()
@@ -0,0 +1,147 @@
+"""
+Сохранение кэша лемм между перезапусками процессов.
+
+Новый процесс начинает с пустым кэшем лемм (khl.preprocess.LemmaCache),
+и пока кэш не наполнится, каждое слово разбирается pymorphy2 заново.
+Снимок кэша сохраняется в файл (save_lemma_cache) при завершении работы
+или периодически, а при старте процесса загружается обратно
+(load_lemma_cache). Файл снимка - сжатый zlib JSON с парами
+(ключ, лемма) и версиями, от которых зависят леммы (snapshot_versions):
+khl, natasha, pymorphy2 и словаря khl.wrong_lemmas. Снимок с другими
+версиями устаревший и не загружается.
+
+Пример использования:
+  with LemmaCacheSnapshots("/var/cache/khl/lemmas.snapshot", interval=600):
+      ...  # обработка текстов
+"""
+
+import json
+import os
+import threading
+import zlib
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import khl
+from khl.preprocess import LemmaCache, shared_lemma_cache
+from khl.wrong_lemmas import fixed_lemmas
+
+
+def snapshot_versions() -> Dict[str, str]:
+    """Версии, от которых зависят леммы кэша."""
+    wrong_lemmas = json.dumps(fixed_lemmas, ensure_ascii=False, sort_keys=True)
+    return {
+        "khl": khl.__version__,
+        "natasha": version("natasha"),
+        "pymorphy2": version("pymorphy2"),
+        "wrong_lemmas": f"{zlib.crc32(wrong_lemmas.encode('utf-8')):08x}",
+    }
+
+
+def save_lemma_cache(
+    path: Union[Path, str], cache: LemmaCache = shared_lemma_cache
+) -> int:
+    """
+    Сохранение снимка кэша лемм в файл, возвращает число сохраненных лемм.
+
+    Запись идет во временный файл, который затем атомарно переименовывается
+    (см. models.map_array), поэтому другие процессы не видят недописанный
+    снимок.
+    """
+    path = Path(path)
+    items = cache.items()
+    snapshot = {
+        "versions": snapshot_versions(),
+        "lemmas": [[text, pos, feats, lemma] for (text, pos, *feats), lemma in items],
+    }
+    data = json.dumps(snapshot, ensure_ascii=False, separators=(",", ":"))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    temporary_path.write_bytes(zlib.compress(data.encode("utf-8")))
+    os.replace(temporary_path, path)
+    return len(items)
+
+
+def load_lemma_cache(
+    path: Union[Path, str], cache: LemmaCache = shared_lemma_cache
+) -> int:
+    """
+    Загрузка снимка кэша лемм из файла, возвращает число загруженных лемм.
+
+    Если файла нет, он поврежден или снимок сделан с другими версиями
+    (см. snapshot_versions), то кэш не меняется и возвращается 0.
+    """
+    try:
+        data = zlib.decompress(Path(path).read_bytes())
+        snapshot: Dict[str, Any] = json.loads(data.decode("utf-8"))
+        if snapshot["versions"] != snapshot_versions():
+            return 0
+        items = [
+            ((text, pos, *(tuple(feat) for feat in feats)), lemma)
+            for text, pos, feats, lemma in snapshot["lemmas"]
+        ]
+    except (OSError, zlib.error, ValueError, KeyError, TypeError):
+        return 0
+    size = len(cache)
+    cache.update(items)
+    return len(cache) - size
+
+
+class LemmaCacheSnapshots:
+    """
+    Загрузка снимка кэша лемм при создании и сохранение при закрытии.
+
+    Если задан interval, то снимок сохраняется еще и фоновым потоком
+    каждые interval секунд, чтобы не потерять его при аварийном
+    завершении процесса.
+
+    args:
+      path: файл снимка
+      cache: кэш лемм (по умолчанию - общий кэш khl.preprocess)
+      interval: период сохранения снимка в секундах (None - только при закрытии)
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str],
+        cache: LemmaCache = shared_lemma_cache,
+        interval: Optional[float] = None,
+    ) -> None:
+        """Загрузка снимка и запуск периодического сохранения."""
+        self.path = Path(path)
+        self.cache = cache
+        self.interval = interval
+        self.loaded = load_lemma_cache(self.path, cache)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if interval is not None:
+            self._thread = threading.Thread(
+                target=self._run, args=(interval,), daemon=True
+            )
+            self._thread.start()
+
+    def save(self) -> int:
+        """Сохранение снимка, возвращает число сохраненных лемм."""
+        return save_lemma_cache(self.path, self.cache)
+
+    def close(self) -> None:
+        """Остановка периодического сохранения и сохранение снимка."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.save()
+
+    def __enter__(self) -> "LemmaCacheSnapshots":
+        """Начало работы с кэшем."""
+        return self
+
+    def __exit__(self, *_exc_info: object) -> None:
+        """Завершение работы с кэшем (см. close)."""
+        self.close()
+
+    def _run(self, interval: float) -> None:
+        """Фоновый поток: сохранение снимка каждые interval секунд."""
+        while not self._stop.wait(interval):
+            self.save()
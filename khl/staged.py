@@ -0,0 +1,343 @@
+"""
+Поэтапная обработка текстов пулами потоков, связанными очередями.
+
+Этапы конвейера (khl.pipeline.Pipeline) стоят и масштабируются по-разному:
+унификация и шаги упрощения до замены ner'ов - регулярные выражения,
+замена ner'ов - нейронная модель, а лемматизация - морфологический теггер.
+StagedExecutor выполняет их тремя пулами потоков (STAGES) через этапы
+конвейера Pipeline.prelude_stage, ner_stage и morph_stage:
+  prelude - унификация, разбиение длинных текстов и шаги упрощения
+            до замены ner'ов;
+  ner     - замена ner'ов и шаги упрощения после нее (в т.ч. замена дат);
+  morph   - лемматизация и кодирование.
+Пулы связаны очередями ограниченного размера (queue_size), у каждого пула
+свое число потоков и размер батча (StageConfig). Поток пула забирает
+из очереди все, что в ней есть, но не больше batch_size текстов, так что
+при простое следующего этапа батчи маленькие, а при заторе - полные.
+utilization() - доля времени, которое потоки этапа были заняты работой:
+этап с загрузкой около 1.0 - узкое место, ему стоит добавить потоков,
+а этапу с низкой загрузкой - убавить.
+"""
+
+import queue
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Tuple,
+)
+
+from khl.pipeline import EncodedText, Pipeline, PreludeText, SimplifiedText, Text
+from khl.preprocess import Code
+
+DEFAULT_STAGE_BATCH_SIZE = 64
+DEFAULT_QUEUE_SIZE = 256
+STAGES = ("prelude", "ner", "morph")
+
+_DONE = object()  # признак конца очереди
+_POLL_SECONDS = 0.1  # период проверки остановки при ожидании очереди
+
+_PreludeItem = Tuple[int, Text, PreludeText]  # pragma: no mutate
+_NerItem = Tuple[int, Text, List[SimplifiedText]]  # pragma: no mutate
+_MorphItem = Tuple[int, Text, EncodedText]  # pragma: no mutate
+
+
+class StageConfig(NamedTuple):
+    """Число потоков и наибольший размер батча этапа."""
+
+    workers: int = 1
+    batch_size: int = DEFAULT_STAGE_BATCH_SIZE
+
+
+class StageStats:
+    """
+    Статистика этапа: число текстов и батчей, время работы потоков.
+
+    Пополняется одновременно из нескольких потоков.
+    """
+
+    def __init__(self) -> None:
+        """Создание пустой статистики."""
+        self.documents = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, documents: int, seconds: float) -> None:
+        """Учет батча из documents текстов, обработанного за seconds секунд."""
+        with self._lock:
+            self.documents += documents
+            self.batches += 1
+            self.busy_seconds += seconds
+
+
+class _Stopped(Exception):
+    """Обработка остановлена (закрыт генератор или ошибка в другом потоке)."""
+
+
+def _get(source: "queue.Queue[Any]", stop: threading.Event) -> Any:
+    """Элемент очереди с ожиданием, пока обработка не остановлена."""
+    while not stop.is_set():
+        try:
+            return source.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            pass
+    raise _Stopped
+
+
+def _put(target: "queue.Queue[Any]", item: Any, stop: threading.Event) -> None:
+    """Добавление в очередь с ожиданием, пока обработка не остановлена."""
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=_POLL_SECONDS)
+            return
+        except queue.Full:
+            pass
+    raise _Stopped
+
+
+class StagedExecutor:
+    """
+    Поэтапная обработка текстов конвейером pipeline (см. модуль).
+
+    Пример использования:
+      executor = StagedExecutor(pipeline, ner=StageConfig(workers=2))
+      for codes in executor.map(texts):
+          ...
+      executor.utilization()  # {"prelude": 0.2, "ner": 0.9, "morph": 0.6}
+
+    args:
+      pipeline: конвейер, шаги и модели которого выполняются
+      prelude, ner, morph: число потоков и размер батча этапов
+      queue_size: наибольшее число текстов в очереди перед этапом;
+        текстов в обработке - не больше queue_size * len(STAGES)
+        и еще по батчу на каждый поток
+
+    Результаты совпадают с pipeline.map и возвращаются в исходном порядке
+    текстов. Время budget_ms конвейера отводится каждому тексту отдельно
+    (см. pipeline.TextBudget). Режим incremental с заданным max_len
+    не поддерживается: в нем тексты обрабатываются по одному.
+    """
+
+    def __init__(
+        self,
+        pipeline: Pipeline,
+        prelude: StageConfig = StageConfig(),
+        ner: StageConfig = StageConfig(),
+        morph: StageConfig = StageConfig(),
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ) -> None:
+        """Создание исполнителя для конвейера pipeline."""
+        if pipeline.incremental and pipeline.max_len is not None:
+            raise ValueError("Режим incremental не поддерживается поэтапной обработкой")
+        self.pipeline = pipeline
+        self.configs = dict(zip(STAGES, (prelude, ner, morph)))
+        for name, config in self.configs.items():
+            if config.workers < 1 or config.batch_size < 1:
+                raise ValueError(f"Неверная конфигурация этапа {name}: {config}")
+        self.queue_size = queue_size
+        self.stats = {name: StageStats() for name in STAGES}
+        self.wall_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def utilization(self) -> Dict[str, float]:
+        """
+        Загрузка этапов: время работы их потоков / (потоков * время обработки).
+
+        Время обработки - суммарное время работы map и encode_map
+        с начала чтения текстов до возврата последнего результата.
+        """
+        with self._lock:
+            wall_seconds = self.wall_seconds
+        if not wall_seconds:
+            return {name: 0.0 for name in STAGES}
+        return {
+            name: min(
+                self.stats[name].busy_seconds
+                / (self.configs[name].workers * wall_seconds),
+                1.0,
+            )
+            for name in STAGES
+        }
+
+    def map(self, texts: Iterable[Text]) -> Iterator[List[Code]]:
+        """Преобразует поток текстов в последовательности кодов (см. класс)."""
+        for encoded in self.encode_map(texts):
+            yield encoded.codes
+
+    def encode_map(self, texts: Iterable[Text]) -> Iterator[EncodedText]:
+        """Аналог map, но вместе с кодами возвращаются упрощения обработки."""
+        stop = threading.Event()
+        errors: List[BaseException] = []
+        queues: List["queue.Queue[Any]"] = [
+            queue.Queue(self.queue_size) for _ in range(len(STAGES) + 1)
+        ]
+        # Тексты, считанные, но еще не возвращенные: ограничивают буфер
+        # результатов, пришедших раньше предыдущих текстов
+        pending = threading.Semaphore(
+            self.queue_size * len(STAGES)
+            + sum(
+                config.workers * config.batch_size for config in self.configs.values()
+            )
+        )
+        threads = [
+            threading.Thread(
+                target=self._feed,
+                args=(texts, queues[0], pending, stop, errors),
+                daemon=True,
+            )
+        ]
+        functions: List[Callable[[List[Any]], List[Any]]] = [
+            self._prelude,
+            self._ner,
+            self._morph,
+        ]
+        for name, function, source, target in zip(
+            STAGES, functions, queues, queues[1:]
+        ):
+            live_workers = [self.configs[name].workers]
+            threads.extend(
+                threading.Thread(
+                    target=self._work,
+                    args=(name, function, source, target, live_workers, stop, errors),
+                    daemon=True,
+                )
+                for _ in range(self.configs[name].workers)
+            )
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            yield from self._collect(queues[-1], pending, stop, errors)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            with self._lock:
+                self.wall_seconds += time.perf_counter() - start
+
+    def _collect(
+        self,
+        results: "queue.Queue[Any]",
+        pending: threading.Semaphore,
+        stop: threading.Event,
+        errors: List[BaseException],
+    ) -> Iterator[EncodedText]:
+        """Результаты последнего этапа в исходном порядке текстов."""
+        buffer: Dict[int, _MorphItem] = {}
+        next_index = 0
+        while True:
+            try:
+                item = _get(results, stop)
+            except _Stopped:
+                raise errors[0] from None
+            if item is _DONE:
+                return
+            buffer[item[0]] = item
+            while next_index in buffer:
+                _, text, encoded = buffer.pop(next_index)
+                next_index += 1
+                self.pipeline.texts_finished([text], [encoded])
+                pending.release()
+                yield encoded
+
+    def _feed(
+        self,
+        texts: Iterable[Text],
+        target: "queue.Queue[Any]",
+        pending: threading.Semaphore,
+        stop: threading.Event,
+        errors: List[BaseException],
+    ) -> None:
+        """Подача текстов в очередь первого этапа, в конце - _DONE."""
+        try:
+            for index, text in enumerate(texts):
+                while not pending.acquire(timeout=_POLL_SECONDS):
+                    if stop.is_set():
+                        return
+                self.pipeline.texts_started(1)
+                _put(target, (index, text), stop)
+            _put(target, _DONE, stop)
+        except _Stopped:
+            return
+        except BaseException as error:  # передается в основной поток
+            errors.append(error)
+            stop.set()
+
+    def _work(
+        self,
+        name: str,
+        function: Callable[[List[Any]], List[Any]],
+        source: "queue.Queue[Any]",
+        target: "queue.Queue[Any]",
+        live_workers: List[int],
+        stop: threading.Event,
+        errors: List[BaseException],
+    ) -> None:
+        """
+        Поток этапа name: обработка батчей из source функцией function.
+
+        Получив _DONE, поток возвращает его в source для остальных потоков
+        этапа, а последний завершившийся поток этапа передает _DONE в target.
+        """
+        batch_size = self.configs[name].batch_size
+        stats = self.stats[name]
+        try:
+            done = False
+            while not done:
+                batch = [_get(source, stop)]
+                while batch[-1] is not _DONE and len(batch) < batch_size:
+                    try:
+                        batch.append(source.get_nowait())
+                    except queue.Empty:
+                        break
+                if batch[-1] is _DONE:
+                    batch.pop()
+                    done = True
+                if batch:
+                    start = time.perf_counter()
+                    results = function(batch)
+                    stats.add(len(batch), time.perf_counter() - start)
+                    for result in results:
+                        _put(target, result, stop)
+            _put(source, _DONE, stop)
+            with self._lock:
+                live_workers[0] -= 1
+                last = live_workers[0] == 0
+            if last:
+                _put(target, _DONE, stop)
+        except _Stopped:
+            return
+        except BaseException as error:  # передается в основной поток
+            errors.append(error)
+            stop.set()
+
+    def _prelude(self, batch: List[Tuple[int, Text]]) -> List[_PreludeItem]:
+        """Этап prelude: унификация, разбиение и упрощение до замены ner'ов."""
+        return [
+            (index, text, self.pipeline.prelude_stage(text)) for index, text in batch
+        ]
+
+    def _ner(self, batch: List[_PreludeItem]) -> List[_NerItem]:
+        """Этап ner: замена ner'ов во фрагментах всех текстов батча и шаги после."""
+        simplified = self.pipeline.ner_stage([prelude for _, _, prelude in batch])
+        return [
+            (index, text, text_chunks)
+            for (index, text, _), text_chunks in zip(batch, simplified)
+        ]
+
+    def _morph(self, batch: List[_NerItem]) -> List[_MorphItem]:
+        """Этап morph: лемматизация и кодирование текстов батча."""
+        encoded = self.pipeline.morph_stage(
+            [text_chunks for _, _, text_chunks in batch]
+        )
+        return [
+            (index, text, text_encoded)
+            for (index, text, _), text_encoded in zip(batch, encoded)
+        ]
@@ -0,0 +1,245 @@
+"""
+Синтетические хоккейные новости для замеров скорости и тестов.
+
+Тексты собираются из шаблонов: названия команд (khl.teams_orgs.teams),
+имена и фамилии игроков, города, даты, удаления вида '5+20', строки счета
+с результатами периодов, цитаты, ссылки и длинные интервью. Генерация
+детерминирована: одинаковые size (или count, min_size, max_size) и seed
+дают одинаковые тексты в любом процессе и на любой машине.
+
+Пример использования:
+  synthetic_news(80)        - заголовок
+  synthetic_news(100_000)   - статья около 100 КБ
+  synthetic_corpus(1_000)   - смесь заголовков и статей разной длины
+"""
+
+import math
+import random
+import re
+from typing import List, Tuple
+
+from khl.teams_orgs import teams
+
+MAX_HEADLINE_LEN = 120  # тексты не длиннее - заголовки
+
+TEAMS = tuple(team.name for team in teams)
+TEAMS_LATIN = tuple(
+    team.transliterations[0].lower().replace(" ", "")
+    for team in teams
+    if re.fullmatch(r"[A-Za-z ]+", team.transliterations[0])
+)
+# fmt: off
+FIRST_NAMES = (
+    "Александр", "Алексей", "Андрей", "Артем", "Вадим", "Василий", "Владимир",
+    "Данис", "Денис", "Дмитрий", "Евгений", "Иван", "Илья", "Кирилл",
+    "Максим", "Михаил", "Никита", "Николай", "Олег", "Павел", "Сергей",
+)
+SURNAMES = (
+    "Иванов", "Петров", "Сидоров", "Кузнецов", "Мозякин", "Зарипов",
+    "Шипачев", "Гусев", "Ткачев", "Самонов", "Лукоянов", "Педан",
+    "Галимов", "Воробьев", "Знарок", "Кравцов", "Капризов", "Григоренко",
+    "Барабанов", "Светлаков", "Толчинский", "Федотов", "Шалунов", "Яшкин",
+)
+CITIES = (
+    ("Москва", "Москве"), ("Казань", "Казани"), ("Уфа", "Уфе"),
+    ("Омск", "Омске"), ("Челябинск", "Челябинске"), ("Ярославль", "Ярославле"),
+    ("Магнитогорск", "Магнитогорске"), ("Нижнекамск", "Нижнекамске"),
+    ("Санкт-Петербург", "Санкт-Петербурге"), ("Новосибирск", "Новосибирске"),
+    ("Минск", "Минске"), ("Сочи", "Сочи"), ("Хабаровск", "Хабаровске"),
+)
+MONTHS = (
+    "января", "февраля", "марта", "апреля", "мая", "июня", "июля", "августа",
+    "сентября", "октября", "ноября", "декабря",
+)
+PENALTIES = ("2", "2+2", "2+10", "5+20", "10", "5+ДКИ")
+OFFENCES = (
+    "подножку", "задержку клюшкой", "удар клюшкой", "грубость", "драку",
+    "толчок на борт", "атаку в голову", "неспортивное поведение",
+)
+# fmt: on
+QUOTES_MARKS = (("'", "'"), ("«", "»"), ("„", "”"), ('"', '"'), ("", ""))
+ROLES = ("главный тренер", "капитан", "вратарь", "защитник", "нападающий")
+QUESTIONS = (
+    "Как оцените игру команды?",
+    "Что не получилось в третьем периоде?",
+    "Насколько тяжело играть на выезде?",
+    "Какие задачи стоят перед командой в плей-офф?",
+    "Как восстанавливаетесь после травмы?",
+    "Что сказал тренер в перерыве?",
+)
+ANSWERS = (
+    "Мы провели хороший матч, но допустили слишком много ошибок в своей зоне.",
+    "Соперник здорово играл в большинстве, нам нужно меньше удаляться.",
+    "В третьем периоде немного подсели физически, это нужно признать.",
+    "Вратарь сегодня выручал нас весь матч, спасибо ему.",
+    "Болельщики поддерживали до конца, для нас это очень важно.",
+    "Задача одна - выигрывать каждый матч и выходить в плей-офф.",
+    "Будем разбирать видео и исправлять ошибки к следующей игре.",
+    "Сезон длинный, впереди еще много матчей, паниковать рано.",
+    "Молодые ребята получают игровое время и прогрессируют.",
+    "Спецбригады сработали хорошо, но реализация пока хромает.",
+)
+
+
+class _NewsGenerator:
+    """Генератор фрагментов новостей на своем генераторе случайных чисел."""
+
+    def __init__(self, random_: random.Random) -> None:
+        """Создание генератора."""
+        self.random = random_
+
+    def team(self) -> str:
+        """Название команды в случайных кавычках."""
+        opening, closing = self.random.choice(QUOTES_MARKS)
+        return f"{opening}{self.random.choice(TEAMS)}{closing}"
+
+    def player(self) -> str:
+        """Имя и фамилия игрока."""
+        return f"{self.random.choice(FIRST_NAMES)} {self.random.choice(SURNAMES)}"
+
+    def surname(self) -> str:
+        """Фамилия игрока."""
+        return self.random.choice(SURNAMES)
+
+    def city(self) -> Tuple[str, str]:
+        """Город в именительном и предложном падежах."""
+        return self.random.choice(CITIES)
+
+    def date(self) -> str:
+        """Дата вида '12 января 2024 года' или '12.01.2024'."""
+        day = self.random.randint(1, 28)
+        month = self.random.randint(1, 12)
+        year = self.random.randint(2008, 2024)
+        if self.random.random() < 0.7:
+            return f"{day} {MONTHS[month - 1]} {year} года"
+        return f"{day:02d}.{month:02d}.{year}"
+
+    def score_line(self) -> str:
+        """Строка счета с результатами периодов."""
+        periods = [
+            (self.random.randint(0, 2), self.random.randint(0, 2)) for _ in range(3)
+        ]
+        home = sum(goals for goals, _ in periods)
+        away = sum(goals for _, goals in periods)
+        mark = ""
+        if home == away:
+            mark = self.random.choice([" ОТ", " Б"])
+            extra = (1, 0) if self.random.random() < 0.5 else (0, 1)
+            home, away = home + extra[0], away + extra[1]
+            if mark == " ОТ":
+                periods.append(extra)
+        periods_line = " ".join(f"{goals}:{goals_}" for goals, goals_ in periods)
+        return f"{self.team()} - {self.team()} {home}:{away}{mark} ({periods_line})"
+
+    def url(self) -> str:
+        """Ссылка на новость или страницу команды."""
+        year = self.random.randint(2008, 2024)
+        news_id = self.random.randint(100_000, 999_999)
+        return self.random.choice(
+            [
+                f"https://www.khl.ru/news/{year}/{news_id}.html",
+                f"www.{self.random.choice(TEAMS_LATIN)}.ru",
+                f"http://{self.random.choice(TEAMS_LATIN)}.com/news/{news_id}",
+                f"t.me/hc_{self.random.choice(TEAMS_LATIN)}",
+            ]
+        )
+
+    def headline(self) -> str:
+        """Заголовок новости."""
+        city, _ = self.city()
+        return self.random.choice(
+            [
+                f"{self.player()} не сыграет против {self.team()}",
+                f"{self.team()} обыграл {self.team()} в овертайме",
+                f"{self.player()} продлил контракт с {self.team()}",
+                f"{self.team()} отправился в {city}",
+                f"Голы забили: {self.surname()}, {self.surname()} и {self.surname()}.",
+                f"{self.score_line()}",
+                f"Вратарь {self.player()} отразил {self.random.randint(20, 50)} "
+                "бросков",
+                f"{self.surname()} получил {self.random.choice(PENALTIES)} "
+                f"в матче с {self.team()}",
+            ]
+        )
+
+    def sentence(self) -> str:
+        """Предложение отчета о матче."""
+        _, city_prep = self.city()
+        minute = self.random.randint(1, 60)
+        return self.random.choice(
+            [
+                f"{self.date()} в {city_prep} {self.team()} принимал {self.team()} "
+                "в рамках регулярного чемпионата КХЛ.",
+                f"Счет открыл {self.player()} на {minute}-й минуте, "
+                "реализовав большинство.",
+                f"{self.surname()} получил удаление {self.random.choice(PENALTIES)} "
+                f"за {self.random.choice(OFFENCES)}.",
+                f"{self.score_line()}",
+                f"Голы забили: {self.surname()}, {self.surname()} и {self.surname()}.",
+                f"«{self.random.choice(ANSWERS)}» - сказал "
+                f"{self.random.choice(ROLES)} {self.team()} {self.player()}.",
+                f"Подробнее читайте на сайте {self.url()}",
+                f"Вратарь {self.player()} отразил {self.random.randint(20, 50)} "
+                f"бросков из {self.random.randint(25, 55)}.",
+                f"{self.player()} продлил контракт с {self.team()} "
+                f"на {self.random.randint(2, 4)} года.",
+                f"Следующий матч {self.team()} проведет {self.date()} на выезде.",
+            ]
+        )
+
+    def interview(self) -> str:
+        """Абзац интервью: вопросы и развернутые ответы."""
+        lines = []
+        for _ in range(self.random.randint(2, 5)):
+            answers = self.random.choices(ANSWERS, k=self.random.randint(2, 6))
+            lines.append(f"- {self.random.choice(QUESTIONS)}")
+            lines.append(f"- {' '.join(answers)}")
+        return "\n".join(lines)
+
+    def news(self, size: int) -> str:
+        """Заголовок или новость длиной около size символов (не меньше)."""
+        headline = self.headline()
+        if size <= MAX_HEADLINE_LEN:
+            return headline
+        paragraphs = [headline]
+        length = len(headline)
+        while length < size:
+            if self.random.random() < 0.2:
+                paragraph = self.interview()
+            else:
+                paragraph = " ".join(
+                    self.sentence() for _ in range(self.random.randint(2, 6))
+                )
+            paragraphs.append(paragraph)
+            length += len(paragraph) + 1
+        return "\n".join(paragraphs)
+
+
+def synthetic_news(size: int, seed: int = 0) -> str:
+    """
+    Синтетическая новость длиной около size символов.
+
+    Если size не больше MAX_HEADLINE_LEN, то возвращается заголовок,
+    иначе - заголовок и абзацы отчета о матче и интервью общей длиной
+    не меньше size символов (чуть длиннее - на часть последнего абзаца).
+    """
+    return _NewsGenerator(random.Random(seed)).news(size)
+
+
+def synthetic_corpus(
+    count: int, min_size: int = 30, max_size: int = 5_000, seed: int = 0
+) -> List[str]:
+    """
+    Корпус из count синтетических новостей.
+
+    Длины новостей распределены лог-равномерно от min_size до max_size:
+    заголовков и коротких заметок в корпусе больше, чем длинных статей,
+    как и в настоящих новостных лентах.
+    """
+    random_ = random.Random(seed)
+    generator = _NewsGenerator(random_)
+    log_min, log_max = math.log(min_size), math.log(max_size)
+    return [
+        generator.news(round(math.exp(random_.uniform(log_min, log_max))))
+        for _ in range(count)
+    ]
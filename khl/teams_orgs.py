@@ -1,5 +1,12 @@
-"""Шаблон регулярных выражений для ручной замены названий команд и организаций."""
+"""
+Названия команд и организаций для ручной замены.
+
+Названия заданы данными (leagues, teams) и компилируются в конечный автомат
+khl.gazetteer.Gazetteer. Шаблон регулярного выражения teams_orgs_pattern
+сохранен как эталон для проверки эквивалентности и замеров скорости.
+"""
 
+from typing import List, NamedTuple, Tuple
 
 teams_orgs_pattern = r"""(?x)
 \b(?:
@@ -103,10 +110,130 @@ teams_orgs_pattern = r"""(?x)
         S(?i:ochi)|
     # ЦСКА
         (?i:цска)\b|
-        (?i:cska)\b|
-    # team
-        name
-        # ПОСЛЕДНЕЕ НАЗВАНИЕ ПРОПИСАТЬ БЕЗ ВЕРТИКАЛЬНОЙ ЧЕРТОЧКИ!!!
+        (?i:cska)\b
 )
 )(?:\'?[а-яА-ЯёЁa-zA-Z])*
 """
+
+
+class Org(NamedTuple):
+    """
+    Лига или команда вместе с вариантами написания её названия.
+
+    Синтаксис вариантов написания описан в модуле khl.gazetteer.
+    """
+
+    name: str
+    aliases: Tuple[str, ...]
+    transliterations: Tuple[str, ...]
+
+
+# Названия лиг
+leagues = [
+    Org("Континентальная хоккейная лига", ("кхл",), ("khl",)),
+    Org("Высшая хоккейная лига", ("вхл",), ("vhl",)),
+    Org("Молодежная хоккейная лига", ("мхл",), ("mhl",)),
+    Org("Женская хоккейная лига", ("жхл",), ("zhl",)),
+    Org("Национальная хоккейная лига", ("нхл",), ("nhl",)),
+    Org("Американская хоккейная лига", ("ахл",), ("ahl",)),
+]
+
+# Названия команд КХЛ (вместе с "закрепившимися" за ними именами)
+teams = [
+    Org("Авангард", ("Авангард",), ("Avangard",)),
+    Org("Автомобилист", ("Автомобилист",), ("Avtomobilist",)),
+    Org("Адмирал", ("Адмирал",), ("Admiral",)),
+    Org("Ак Барс", ("Ак барс",), ("Ak bars",)),
+    Org("Амур", ("Амур",), ("Amur",)),
+    Org("Барыс", ("Барыс",), ("Barys",)),
+    Org("Витязь", ("Витязь?",), ("Vityaz",)),
+    Org(
+        "Динамо",
+        (
+            "Динамо",
+            r"Динамо р\b",
+            r"Динамо рига\b",
+            r"Динамо м\b",
+            r"Динамо мск\b",
+            r"Динамо москва\b",
+            r"Динамо мн\b",
+            r"Динамо минск\b",
+        ),
+        (
+            "D[iy]namo",
+            r"D[iy]namo r\b",
+            r"D[iy]namo riga\b",
+            r"D[iy]namo m\b",
+            r"D[iy]namo msk\b",
+            r"D[iy]namo moscow\b",
+            r"D[iy]namo mn\b",
+            r"D[iy]namo minsk\b",
+        ),
+    ),
+    Org("Йокерит", ("Йокерит",), ("Jokerit",)),
+    Org(
+        "Куньлунь РС",
+        ("Кунь?лунь?", r"Кунь?лунь? рс\b", r"Кунь?лунь? ред стар\b"),
+        ("Kunlun", r"Kunlun rs\b", r"Kunlun red star\b"),
+    ),
+    Org("Лада", ("Лада",), ("Lada",)),
+    Org("Локомотив", ("Локомотив",), ("Lokomotiv",)),
+    Org(
+        "Металлург",
+        (
+            "Метал?лург",
+            r"Метал?лург мг\b",
+            r"Метал?лург магнитогорск\b",
+            r"магнитк[а-я]+\b",
+            r"ммг\b",
+        ),
+        (
+            "Metal?lurg",
+            r"Metal?lurg mg\b",
+            r"Metal?lurg magnitogorsk\b",
+            r"magnitk[a-z]+\b",
+            r"mmg\b",
+        ),
+    ),
+    Org("Нефтехимик", ("Нефтехимик",), ("Neftek?himik",)),
+    Org(
+        "Салават Юлаев",
+        ("Салават", "Салават[а-яё]* юлаев", r"сю\b"),
+        ("Salavat", "Salavat('?[а-яёa-z])* ulaev", r"su\b"),
+    ),
+    Org("Северсталь", ("Северсталь?",), ("Severstal",)),
+    Org("Сибирь", ("Сибирь?",), ("Sibir",)),
+    Org("СКА", (r"ска\b",), (r"ska\b",)),
+    Org("Спартак", ("Спартак",), ("Spartak",)),
+    Org(
+        "Торпедо НН",
+        ("Торпедо", r"Торпедо нн\b", r"Торпедо нижний новгород\b"),
+        ("Torpedo", r"Torpedo nn\b", r"Torpedo nizhni[yi] novgorod\b"),
+    ),
+    Org("Трактор", ("Трактор",), ("Tra[kc]tor",)),
+    Org("ХК Сочи", ("Сочи",), ("Sochi",)),
+    Org("ЦСКА", (r"цска\b",), (r"cska\b",)),
+]
+
+# Необязательные приставки перед названиями команд
+team_prefixes = ("хк ", "hc ")
+
+# Окончания, присоединяемые к найденным названиям ("Спартак'ом", "Авангарда")
+org_endings = r"(?:\'?[а-яА-ЯёЁa-zA-Z])*"
+
+
+def _variants(org: Org) -> List[str]:
+    """Все варианты написания названия."""
+    return [*org.aliases, *org.transliterations]
+
+
+# Варианты написания в порядке приоритета для компиляции в khl.gazetteer.Gazetteer:
+# сначала лиги, затем команды с приставкой 'ХК', затем команды без приставки
+teams_orgs_entries = [
+    *[_variants(league) for league in leagues],
+    *[
+        [prefix + variant for prefix in team_prefixes for variant in _variants(team)]
+        for team in teams
+    ],
+    *[_variants(team) for team in teams],
+]
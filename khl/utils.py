@@ -9,43 +9,114 @@
 
 
 import re
-from typing import Callable, List
-
-from natasha import (
-    DatesExtractor,
-    Doc,
-    MorphVocab,
-    NewsEmbedding,
-    NewsNERTagger,
-    Segmenter,
+import threading
+from functools import lru_cache, partial
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Literal,
+    Match,
+    NamedTuple,
+    Optional,
+    Pattern,
+    Tuple,
+    Union,
 )
+
+from natasha import DatesExtractor, Doc, MorphVocab, NewsNERTagger, Segmenter
 from natasha.extractors import Match as NatashaMatch
 from natasha.span import Span
+from slovnet.markup import BIOMarkup
 
-from khl.teams_orgs import teams_orgs_pattern
+from khl.batching import (
+    DEFAULT_BUCKET_SIZE,
+    PaddingStats,
+    bucketed_map,
+    tagger_batch_size,
+)
+from khl.gazetteer import Gazetteer
+from khl.models import get_models_cache, load_embedding, load_tagger
+from khl.teams_orgs import org_endings, teams_orgs_entries
 
 segmenter = Segmenter()
 morph_vocab = MorphVocab()  # pragma: no mutate
-emb = NewsEmbedding()  # pragma: no mutate
-ner_tagger = NewsNERTagger(emb)
+emb = load_embedding(get_models_cache())  # pragma: no mutate
+ner_tagger = load_tagger(NewsNERTagger, emb, get_models_cache())
+teams_orgs_gazetteer = Gazetteer(teams_orgs_entries, endings=org_endings)
+
+NerMode = Literal["neural", "gazetteer"]  # pragma: no mutate
+SimplifyStep = Callable[[str], str]  # pragma: no mutate
+
+# Изменяемое состояние, отдельное для каждого потока
+_thread_local = threading.local()
+
+
+class TextEdits:
+    """
+    Правки текста: замены участков исходного текста text.
+
+    Шаг упрощения, который меняет текст во многих местах, записывает замены
+    (replace) по позициям исходного текста, а текст с правками собирается
+    один раз (result). Так шаг копирует текст один раз, а не на каждую
+    замену, как text[:start] + replacement + text[stop:] в цикле.
+    Замены должны идти по возрастанию позиций и не пересекаться.
+    Если замен не было, то result возвращает сам исходный текст
+    (apply_steps по этому определяет, что шаг текст не изменил).
+    """
+
+    def __init__(self, text: str) -> None:
+        """Создание пустых правок текста text."""
+        self.text = text
+        self._parts: List[str] = []
+        self._position = 0
+
+    def replace(self, start: int, stop: int, replacement: str) -> None:
+        """Замена участка text[start:stop] на replacement."""
+        if start < self._position:
+            raise ValueError(
+                f"Замена [{start}, {stop}) пересекается с предыдущей или идет до нее"
+            )
+        self._parts.extend((self.text[self._position : start], replacement))
+        self._position = stop
+
+    def result(self) -> str:
+        """Текст со всеми заменами."""
+        if not self._parts:
+            return self.text
+        return "".join([*self._parts, self.text[self._position :]])
+
+
+# Замены символов при унификации текстов
+unify_table = {
+    **dict.fromkeys(['"', "`", "«", "»", "„", "“", "”"], "'"),
+    **dict.fromkeys(["—", "–", "−"], "-"),
+    "⅛": "1/8",
+    "¼": "1/4",
+    "½": "1/2",
+    "й": "й",
+    "ё": "ё",
+    "…": "...",
+}
 
 
 def unify(text: str) -> str:
-    """Приведение текстов новостей к единому виду."""
-    for symbol in ['"', "`", "«", "»", "„", "“", "”"]:
-        text = text.replace(symbol, "'")
-    for symbol in ["—", "–", "−"]:
-        text = text.replace(symbol, "-")
-    text = (
-        text.replace("⅛", "1/8")
-        .replace("¼", "1/4")
-        .replace("½", "1/2")
-        .replace("й", "й")
-        .replace("ё", "ё")
-        .replace("…", "...")
-    )
+    """
+    Приведение текстов новостей к единому виду.
+
+    Замены из unify_table делаются через str.replace, который не копирует
+    текст, если заменяемого символа в нем нет. После замены недопустимых
+    символов на пробел из пробельных символов в тексте остается только пробел,
+    поэтому схлопываются только пробелы, а не все пробельные символы.
+    """
+    for symbol, replacement in unify_table.items():
+        text = text.replace(symbol, replacement)
     text = re.sub(r"[^ А-Яа-яЁёA-Za-z0-9',.\[\]{}()/=+%№#@!?;:-]", " ", text)
-    return merge_spaces(text).strip()
+    return re.sub("  +", " ", text).strip()
 
 
 def _fix_quotes(text: str) -> str:
@@ -53,9 +124,8 @@ def _fix_quotes(text: str) -> str:
     return re.sub(r"\'{2,}", "'", text)
 
 
-def _surround_with_quotes(match_object: re.Match) -> str:  # type: ignore
+def _surround_with_quotes(word: str) -> str:
     """Окружение кавычками."""
-    word: str = match_object.group(0)
     return "'" + word + "'"
 
 
@@ -65,7 +135,7 @@ def surround_concrete_orgs_with_quotes(text: str) -> str:
 
     Чтобы natasha лучше распознавала ner'ы.
     """
-    text = re.sub(teams_orgs_pattern, _surround_with_quotes, text)
+    text = teams_orgs_gazetteer.sub(_surround_with_quotes, text)
     return _fix_quotes(text)
 
 
@@ -123,6 +193,17 @@ def _find_ners(text: str) -> List[Span]:
     return ners
 
 
+def _replace_found_ners(text: str, ners_spans: List[Span]) -> str:
+    """Замена найденных именованных сущностей на их тип."""
+    edits = TextEdits(text)
+    for ner_span in ners_spans:
+        edits.replace(ner_span.start, ner_span.stop, ner_span.type.lower())
+    text = replace_concrete_orgs(edits.result())
+    text = handwritten_replace_orgs(text)
+    text = handwritten_replace_per(text)
+    return text
+
+
 @fix_bug_14
 @fix_bug_5
 def replace_ners(text: str) -> str:
@@ -133,19 +214,225 @@ def replace_ners(text: str) -> str:
     'Магнитогорск' -> 'loc'
     'Ак Барс'      -> 'org'
     """
-    ners_spans = _find_ners(text)
-    for ner_span in reversed(ners_spans):
-        text = text[: ner_span.start] + ner_span.type.lower() + text[ner_span.stop :]
+    return _replace_found_ners(text, _find_ners(text))
+
+
+# Токен упрощенного предложения: слово или число (в т.ч. через дефис,
+# '3,5', '12.01.2024'), многоточие и подобные знаки подряд или один знак
+_pretokenized_word = re.compile(r"\w+(?:[-/.,]\w+)*|[.?!…]+|[^\w\s]")
+
+
+def pretokenized_words(text: str) -> List[str]:
+    """
+    Токены предложения, уже разбитого на токены, после шагов упрощения.
+
+    Шаги упрощения работают с текстом предложения (токены через пробел)
+    и могут приклеить знаки препинания к словам ('гол .' -> 'гол.'),
+    поэтому токены выделяются заново, но простым регулярным выражением,
+    а не razdel'ем: "'Спартак' забил гол." -> ["'", "Спартак", "'", "забил",
+    "гол", "."].
+    """
+    return _pretokenized_word.findall(text)
+
+
+def _tag_pretokenized_ners(ner_tagger_: Any, texts: List[str]) -> List[Any]:
+    """
+    Разметка ner'ов в предложениях, уже разбитых на токены.
+
+    Аналог ner_tagger_.map(texts), но токены (см. pretokenized_words)
+    подаются в модель без разбивки текстов на токены razdel'ем.
+    """
+    words = [pretokenized_words(text) for text in texts]
+    infer = ner_tagger_.infer
+    tags = infer.decoder(infer.process(infer.encoder(words)))
+    return [
+        BIOMarkup.from_tuples(zip(text_words, text_tags)).to_span(text)
+        for text, text_words, text_tags in zip(texts, words, tags)
+    ]
+
+
+def _find_ners_batch(
+    texts: List[str],
+    bucket_size: int = DEFAULT_BUCKET_SIZE,
+    padding_stats: Optional[PaddingStats] = None,
+    ner_tagger_: Any = ner_tagger,
+    pretokenized: bool = False,
+) -> List[List[Span]]:
+    """
+    Нахождение именованных сущностей сразу в нескольких текстах.
+
+    pretokenized=True - тексты - предложения, уже разбитые на токены
+    (см. _tag_pretokenized_ners).
+    """
+    ners: List[List[Span]] = [[] for _ in texts]
+    indexes = [index for index, text in enumerate(texts) if text.strip()]
+    items = [texts[index] for index in indexes]
+    tag: Callable[[List[str]], Iterable[Any]] = ner_tagger_.map
+    if pretokenized:
+        tag = partial(_tag_pretokenized_ners, ner_tagger_)
+        lengths = [len(pretokenized_words(text)) for text in items]
+    else:
+        lengths = [sum(1 for _ in segmenter.tokenize(text)) for text in items]
+    markups = bucketed_map(
+        tag,
+        items,
+        lengths,
+        tagger_batch_size(ner_tagger_),
+        bucket_size,
+        padding_stats,
+    )
+    for index, markup in zip(indexes, markups):
+        ners[index] = markup.spans
+    return ners
+
+
+def replace_ners_batch(
+    texts: List[str],
+    bucket_size: int = DEFAULT_BUCKET_SIZE,
+    padding_stats: Optional[PaddingStats] = None,
+    ner_tagger_: Any = ner_tagger,
+    pretokenized: bool = False,
+) -> List[str]:
+    """
+    Заменяет именованные сущности на их тип сразу в нескольких текстах.
+
+    Аналог [replace_ners(text) for text in texts], но тексты подаются
+    в нейронную модель батчами из текстов близкой длины (см. khl.batching).
+    pretokenized=True - тексты - предложения, уже разбитые на токены:
+    они подаются в модель без разбивки razdel'ем (см. pretokenized_words).
+    """
+    # Исправления fix_bug_14 и fix_bug_5, как у replace_ners
+    texts = [surround_concrete_orgs_with_quotes(text + "!") for text in texts]
+    ners = _find_ners_batch(
+        texts, bucket_size, padding_stats, ner_tagger_, pretokenized
+    )
+    return [
+        re.sub(r"\!$", "", delete_quotes_around_orgs(_replace_found_ners(*args)))
+        for args in zip(texts, ners)
+    ]
+
+
+# Граммемы pymorphy2, по которым слово из словаря признается именем или городом
+_per_grammemes = frozenset(["Name", "Surn", "Patr"])
+_loc_grammemes = frozenset(["Geox"])
+
+
+def _is_sentence_start(text: str, position: int) -> bool:
+    """Начинается ли с данной позиции текста предложение (или прямая речь)."""
+    while position > 0 and (text[position - 1].isspace() or text[position - 1] in "'-"):
+        position -= 1
+    return position == 0 or text[position - 1] in ".!?:"
+
+
+def _dictionary_ner_type(word: str, sentence_start: bool) -> Optional[str]:
+    """
+    Определение типа ner'а слова с заглавной буквы по словарю pymorphy2.
+
+    Имена, фамилии и отчества - 'per', географические названия - 'loc'.
+    В начале предложения заглавная буква ничего не значит, поэтому там
+    учитывается только самый вероятный разбор слова. В середине предложения
+    незнакомые словарю слова и слова с окончаниями фамилий считаются 'per'.
+    """
+    parses = morph_vocab(word)
+    if sentence_start:
+        parses = parses[:1]
+    grammemes = set().union(*(parse.tag.grammemes for parse in parses))
+    if grammemes & _per_grammemes:
+        return "per"
+    if grammemes & _loc_grammemes:
+        return "loc"
+    if sentence_start:
+        return None
+    if not parses[0].is_known or re.search(
+        r"(?:[оеё]в|[иы]н|[сц]к|енк|[ую]к|ич)[а-яё]{0,3}$", word
+    ):
+        return "per"
+    return None
+
+
+def _find_dictionary_ners(text: str) -> List[Tuple[int, int, str]]:
+    """
+    Нахождение имен людей и городов по словарю и заглавным буквам.
+
+    Соседние слова одного типа объединяются в одну сущность:
+    'Иван Иванов' -> одна сущность 'per'.
+    Слово сразу после имени человека считается частью имени, даже если
+    по словарю оно похоже на город: 'Артем Лукоянов' -> одна сущность 'per'.
+    """
+    ners: List[Tuple[int, int, str]] = []
+    pattern = r"\b[А-ЯЁ][а-яё]+(?:-[А-ЯЁ][а-яё]+)*\b"
+    for match_ in re.finditer(pattern, text):
+        start, stop = match_.span()
+        ner_type = _dictionary_ner_type(match_.group(), _is_sentence_start(text, start))
+        if ner_type is None:
+            continue
+        if ners and text[ners[-1][1] : start].isspace():
+            previous_start, _, previous_type = ners[-1]
+            if previous_type in (ner_type, "per"):
+                start, ner_type = previous_start, previous_type
+                ners.pop()
+        ners.append((start, stop, ner_type))
+    return ners
+
+
+def replace_ners_by_gazetteer(text: str) -> str:
+    """
+    Заменяет именованные сущности на их тип без нейронной модели.
+
+    Быстрый аналог replace_ners: названия команд и лиг находятся по газеттиру,
+    слова с заглавной буквы в кавычках считаются 'org', имена людей и
+    названия городов находятся по словарю pymorphy2 и заглавным буквам.
+    'Иванов Иван'  -> 'per'
+    'Магнитогорск' -> 'loc'
+    'Ак Барс'      -> 'org'
+    """
     text = replace_concrete_orgs(text)
     text = handwritten_replace_orgs(text)
-    text = handwritten_replace_per(text)
-    return text
+    edits = TextEdits(text)
+    for start, stop, ner_type in _find_dictionary_ners(text):
+        edits.replace(start, stop, ner_type)
+    text = handwritten_replace_per(edits.result())
+    return delete_quotes_around_orgs(text)
+
+
+# Способы замены именованных сущностей
+ners_replacers: Dict[str, Callable[[str], str]] = {
+    "neural": replace_ners,
+    "gazetteer": replace_ners_by_gazetteer,
+}
+
+
+def _get_dates_extractor() -> DatesExtractor:
+    """
+    Парсер дат текущего потока.
+
+    Создание парсера (компиляция грамматики yargy) дороже поиска дат
+    в коротком тексте, поэтому парсер создается один раз. Парсеры yargy
+    не рассчитаны на одновременное использование из нескольких потоков,
+    поэтому у каждого потока свой парсер.
+    """
+    dates_extractor = getattr(_thread_local, "dates_extractor", None)
+    if dates_extractor is None:
+        dates_extractor = _thread_local.dates_extractor = DatesExtractor(morph_vocab)
+    return dates_extractor
+
+
+def _blank_long_number(match_object: re.Match) -> str:  # type: ignore
+    """Замена числа пробелами."""
+    return " " * len(match_object.group(0))
 
 
 def _find_dates(text: str) -> List[NatashaMatch]:
-    """Нахождение дат."""
-    dates_extractor = DatesExtractor(morph_vocab)
-    return [match_ for match_ in dates_extractor(text)]
+    """
+    Нахождение дат.
+
+    Числа в датах natasha не больше 2100, а yargy переводит в int каждое
+    число текста, что для чисел из тысяч цифр долго или вовсе запрещено
+    (ValueError, см. sys.set_int_max_str_digits). Поэтому числа из 5 и более
+    цифр перед поиском заменяются пробелами (позиции дат не меняются).
+    """
+    text = re.sub(r"\d{5,}", _blank_long_number, text)
+    return [match_ for match_ in _get_dates_extractor()(text)]
 
 
 def replace_dates(text: str) -> str:
@@ -168,7 +455,7 @@ def _fix_space_plus_space(text: str) -> str:
     '1  +  2  +  3' -> '1+2+3'
     '1\t+\t2'       -> '1+2'
     """
-    pattern = r"\s*\+\s*"
+    pattern = r"(?:(?<!\s)\s+)?\+\s*"
     result = re.sub(pattern, "+", text)
     return result
 
@@ -211,11 +498,44 @@ def fix_press_conference(text: str) -> str:
     return result
 
 
+def _sub_by_candidates(
+    pattern: str, candidate_pattern: str, repl: str, text: str
+) -> str:
+    """
+    Замена pattern на repl с поиском pattern только в начале кандидатов.
+
+    candidate_pattern находит участки текста, с которых может начинаться
+    pattern. Если pattern не найден в начале участка, то он не начинается и
+    внутри участка, поэтому участок пропускается целиком. Каждый участок
+    проверяется pattern'ом один раз, и замена работает за линейное время,
+    даже если pattern с возвратами на каждой неудачной попытке просматривает
+    участок до конца (re.sub в таком случае работает за квадратичное время).
+    """
+    compiled_pattern = re.compile(pattern)
+    compiled_candidate_pattern = re.compile(candidate_pattern)
+    edits = TextEdits(text)
+    candidate = compiled_candidate_pattern.search(text)
+    while candidate is not None:
+        match = compiled_pattern.match(text, candidate.start())
+        if match is None:
+            search_position = candidate.end()
+        else:
+            edits.replace(match.start(), match.end(), repl)
+            search_position = match.end()
+        candidate = compiled_candidate_pattern.search(text, search_position)
+    return edits.result()
+
+
 def delete_numeric_data(text: str) -> str:
-    """Удаление данных типа 12:25, 2-10."""
+    """
+    Удаление данных типа 12:25, 2-10.
+
+    Если за последовательностью чисел не найдены данные, то их нет и в ее
+    конце, поэтому данные ищутся только в начале последовательностей.
+    """
     pattern = r"\b\d+\s*(?:[:-]\s*\d+)+\b(?!-)"
-    result = re.sub(pattern, "", text)
-    return result
+    numbers_pattern = r"\b\d+\s*(?:[:-]\s*\d+)+"
+    return _sub_by_candidates(pattern, numbers_pattern, "", text)
 
 
 def _replace_dash_with_space(match_object: re.Match) -> str:  # type: ignore
@@ -286,8 +606,16 @@ def fix_dots(text: str) -> str:
     ' .' -> '.'
     ' . . .' -> '.'
     ' - .' -> '.'
+
+    Каждая последовательность пробелов и тире перед точками разбирается
+    однозначно и только с ее начала, поэтому на длинных сериях пробелов
+    и тире без точки нет квадратичных и кубических возвратов.
     """
-    return re.sub(r"\s*\.*\-*(?:\s*\-*\s*\.)+", ".", text)
+    pattern = (
+        r"(?<!\s)\s*(?:\.+(?:-+\.|-*\s+(?:-+\s*)?\.)?|(?<!-)-+(?:\s+(?:-+\s*)?)?\.)"
+        r"(?:\s*(?:-+\s*)?\.)*"
+    )
+    return re.sub(pattern, ".", text)
 
 
 def fix_question_marks(text: str) -> str:
@@ -298,13 +626,19 @@ def fix_question_marks(text: str) -> str:
     ' ?' -> '?'
     ' ? ? ?' -> '?'
     ' - ?' -> '?'
+
+    Регулярное выражение устроено так же, как и в fix_dots.
     """
-    return re.sub(r"\s*\?*\-*(?:\s*\-*\s*\?)+", "?", text)
+    pattern = (
+        r"(?<!\s)\s*(?:\?+(?:-+\?|-*\s+(?:-+\s*)?\?)?|(?<!-)-+(?:\s+(?:-+\s*)?)?\?)"
+        r"(?:\s*(?:-+\s*)?\?)*"
+    )
+    return re.sub(pattern, "?", text)
 
 
 def fix_colons(text: str) -> str:
     """Корректирование двоеточий ' :' -> ':'."""
-    return re.sub(r"\s+\:", ":", text)
+    return re.sub(r"(?<!\s)\s+\:", ":", text)
 
 
 def generalize_top(text: str) -> str:
@@ -319,9 +653,15 @@ def generalize_top(text: str) -> str:
 
 
 def delete_serial_numbers(text: str) -> str:
-    """Удаление порядковых числительных типа '5-й', '2ого', '1.'."""
-    pattern = r"\b\d(?:\d*-?)*(?:[а-яёА-ЯЁё]{1,4}\b|\.)"
-    return re.sub(pattern, "", text)
+    """
+    Удаление порядковых числительных типа '5-й', '2ого', '1.'.
+
+    Окончание числительного проверяется только в конце всей серии цифр
+    и тире, поэтому она разбирается один раз.
+    """
+    pattern = r"\b\d[\d-]*(?:[а-яёА-ЯЁё]{1,4}\b|\.)"
+    numbers_pattern = r"\b\d[\d-]*"
+    return _sub_by_candidates(pattern, numbers_pattern, "", text)
 
 
 def delete_parentheses_content(text: str) -> str:
@@ -377,7 +717,7 @@ def latin_c_to_cirillic(text: str) -> str:
 
 def replace_vs_with_dash(text: str) -> str:
     """'vs' -> '-', '- vs - ' -> '-'."""
-    pattern = r"\s*-?\s*(?<!\w)[Vv][sS](?!\w)\s*-?\s*"
+    pattern = r"(?:(?<!\s)\s+)?(?:-\s*)?(?<!\w)[Vv][sS](?!\w)\s*(?:-\s*)?"
     return re.sub(pattern, " - ", text)
 
 
@@ -387,12 +727,16 @@ def delete_urls(text: str) -> str:
 
     Взято отсюда:
       https://stackoverflow.com/questions/839994/extracting-a-url-in-python
+
+    Ссылка ищется только в начале каждой серии символов, из которых состоит
+    адрес сайта: если в начале серии ссылки нет, то нет и в ее середине.
     """
     pattern = (
         r"\b(?:https?://)?(?:www\.)?(?:[\da-zа-яё\.-]+)\."
-        r"(?:[a-zа-яё]{2,6})(?:/[\w\.-?=&]*)*/?\b"
+        r"(?:[a-zа-яё]{2,6})(?:/[\w\.-?=&]*)?\b"
     )
-    return re.sub(pattern, "", text)
+    host_pattern = r"\b(?:https?://)?(?:(?!https?://)[\da-zа-яё\.-])+"
+    return _sub_by_candidates(pattern, host_pattern, "", text)
 
 
 def handwritten_replace_orgs(text: str) -> str:
@@ -403,7 +747,7 @@ def handwritten_replace_orgs(text: str) -> str:
 
 def replace_concrete_orgs(text: str) -> str:
     """Замена прописанных названий лиг и команд на org."""
-    return re.sub(teams_orgs_pattern, "org", text)
+    return teams_orgs_gazetteer.sub("org", text)
 
 
 def _handwritten_replace_per(match_object: re.Match) -> str:  # type: ignore
@@ -507,7 +851,7 @@ def fix_english_dash_russian_words(text: str) -> str:
 
 def delete_age_category(text: str) -> str:
     """Удаление возрастной категории типа 'U-18'."""
-    pattern = r"\s*-?U\s*-?\s*\d{1,2}"
+    pattern = r"(?<!\s)\s*-?U\s*(?:-\s*)?\d{1,2}"
     return re.sub(pattern, "", text)
 
 
@@ -517,7 +861,7 @@ def delete_birth_mark(text: str) -> str:
 
     'г.р.', '2000 г.р.', '2000/04 г. р.', '2000/2001 гг.р.'
     """
-    pattern = r"\d+[/-]?\d*\s*гг?\.?\s*р\."
+    pattern = r"(?<!\d)\d+(?:[/-]\d*)?\s*гг?\.?\s*р\."
     return re.sub(pattern, "", text)
 
 
@@ -591,8 +935,8 @@ def _delete_dash(match_object: re.Match) -> str:  # type: ignore
 def delete_beginning_ending_dashes_in_words(text: str) -> str:
     """Удаление тире в начале или в конце слова."""
     pattern = (
-        r"(?<![a-zA-Zа-яА-ЯёЁ])-+[a-zA-Zа-яА-ЯёЁ]+-*(?![a-zA-Zа-яА-ЯёЁ])|"
-        r"(?<![a-zA-Zа-яА-ЯёЁ])-*[a-zA-Zа-яА-ЯёЁ]+-+(?![a-zA-Zа-яА-ЯёЁ])"
+        r"(?<![a-zA-Zа-яА-ЯёЁ])(?:(?!-)|(?<!-)|(?<=[a-zA-Zа-яА-ЯёЁ]-)|(?=-(?!-)))"
+        r"(?:-+[a-zA-Zа-яА-ЯёЁ]+-*|-*[a-zA-Zа-яА-ЯёЁ]+-+)(?![a-zA-Zа-яА-ЯёЁ])"
     )
     return re.sub(pattern, _delete_dash, text)
 
@@ -642,17 +986,17 @@ def fix_b_o_lshii(text: str) -> str:
 
 def merge_dashes(text: str) -> str:
     """'Схлопывает' все соседние тире в одно."""
-    return re.sub(r"(?<=\s)-+(\s*-+)+(?=\s)|-{2,}", "-", text)
+    return re.sub(r"(?<=\s)-[-\s]*-(?=\s)|-{2,}", "-", text)
 
 
 def fix_question_dot(text: str) -> str:
     """'?..' -> '?'."""
-    return re.sub(r"\?+[.\s]*\.", "?", text)
+    return re.sub(r"(?<!\?)\?+[.\s]*\.", "?", text)
 
 
 def fix_dot_question(text: str) -> str:
     """'..?' -> '?'."""
-    return re.sub(r"[.\s]*\.\s*\?+", "?", text)
+    return re.sub(r"(?<![.\s])[.\s]*\.\s*\?+", "?", text)
 
 
 def delete_year_city_mark(text: str) -> str:
@@ -693,7 +1037,10 @@ def fix_dash_word(text: str) -> str:
 
     Natasha так распознает per'ов намного лучше.
     """
-    pattern = r"\s*\B-+[A-ZА-ЯЁ]|[A-ZА-ЯЁ][a-zа-яё]+-+\B\s*"
+    pattern = (
+        r"(?:(?<!\s)\s+)?\B(?:(?<!--)|(?=-(?!-)))-+[A-ZА-ЯЁ]|"
+        r"[A-ZА-ЯЁ][a-zа-яё]+-+\B\s*"
+    )
     return re.sub(pattern, _surround_dash_with_spaces, text).strip()
 
 
@@ -719,6 +1066,11 @@ def simplify(
     replace_ners_: bool = True,
     replace_dates_: bool = True,
     replace_penalties_: bool = True,
+    ner_mode: NerMode = "neural",
+    disabled_steps: Collection[str] = (),
+    insert_before: Optional[Dict[str, List[SimplifyStep]]] = None,
+    insert_after: Optional[Dict[str, List[SimplifyStep]]] = None,
+    trigger_stats: Optional["TriggerStats"] = None,
 ) -> str:
     """
     Упрощение текста хоккейной новости.
@@ -734,6 +1086,17 @@ def simplify(
         replace_penalties=True,
       ) -> "date per в loc забил гол в ворота org а также заработал pen за грубость"
 
+    ner_mode - способ замены именованных сущностей:
+      "neural"    - нейронной моделью natasha (replace_ners)
+      "gazetteer" - по словарям и заглавным буквам, без нейронной модели,
+                    быстрее, но менее точно (replace_ners_by_gazetteer)
+
+    disabled_steps, insert_before, insert_after - отключение шагов и вставка
+    собственных шагов по именам шагов (см. compile_simplify_steps).
+
+    Шаги, которые заведомо не изменят текст, пропускаются (см. simplify_triggers),
+    trigger_stats - статистика пропусков (см. TriggerStats).
+
     Последовательность действий:
       1. Удаляем все что в скобках
       2. Заменяем сокращение 'т.к.'
@@ -784,56 +1147,475 @@ def simplify(
       47. Удаляем тире и двоеточия в конце текста (rstrip)
       48. Корректируем ' :' -> ':'
     """
-    text = delete_parentheses_content(text)
-    text = replace_tak_kak(text)
-    text = replace_to_est(text)
-    text = delete_letter_dot_letter_dot(text)
-    text = fix_b_o_lshii(text)
-    text = delete_shutouts(text)
-    text = delete_overtime_mark(text)
-    text = delete_amplua(text)
-    text = lowercase_shaiba_word(text)
-    text = latin_c_to_cirillic(text)
-    text = fix_latin_c_in_russian_words(text)
-    text = fix_cirillic_c_in_english_words(text)
-    text = replace_vs_with_dash(text)
-    text = delete_cirillic_ending_from_english_words(text)
-    text = fix_covid(text)
-    text = fix_english_dash_russian_words(text)
-    text = delete_age_category(text)
-    text = delete_birth_mark(text)
-    text = fix_surname_dash_surname_dash_surname(text)
-    text = fix_dash_word(text)
-    text = lowercase_sdk(text)
-    text = replace_sdk(text)
-    text = fix_press_conference(text)
-    text = generalize_top(text)
-    if replace_ners_:
-        text = replace_ners(text)
-    if replace_dates_:
-        text = replace_dates(text)
-    if replace_penalties_:
-        text = replace_penalty(text)
-    text = delete_year_city_mark(text)
-    text = split_ners(text)
-    text = delete_urls(text)
-    text = delete_quotes_with_one_symbol(text)
-    text = delete_one_symbol_english_words(text)
-    text = delete_numeric_data(text)
-    text = delete_serial_numbers(text)
-    text = delete_play_format(text)
-    text = replace_exclamation_mark_with_dot(text)
-    text = leave_only_significant_symbols(text)
-    text = fix_org_loc(text)
-    text = merge_spaces(text)
-    text = merge_dashes(text)
-    text = replace_dash_between_ners(text)
-    text = fix_ner_with_and_ner(text)
-    text = delete_beginning_ending_dashes_in_words(text)
-    text = fix_dots(text)
-    text = fix_question_marks(text)
-    text = fix_question_dot(text)
-    text = fix_dot_question(text)
-    text = delete_ending_colon_dash(text)
-    text = fix_colons(text)
+    steps = _simplify_steps(
+        replace_ners_,
+        replace_dates_,
+        replace_penalties_,
+        disabled_steps,
+        insert_before,
+        insert_after,
+    )
+    text = apply_steps(text, steps.before_ners, trigger_stats)
+    if steps.replace_ners:
+        text = ners_replacers[ner_mode](text)
+    return apply_steps(text, steps.after_ners, trigger_stats)
+
+
+# Шаги 1-24 упрощения текста (см. simplify)
+simplify_steps_before_ners: List[SimplifyStep] = [
+    delete_parentheses_content,
+    replace_tak_kak,
+    replace_to_est,
+    delete_letter_dot_letter_dot,
+    fix_b_o_lshii,
+    delete_shutouts,
+    delete_overtime_mark,
+    delete_amplua,
+    lowercase_shaiba_word,
+    latin_c_to_cirillic,
+    fix_latin_c_in_russian_words,
+    fix_cirillic_c_in_english_words,
+    replace_vs_with_dash,
+    delete_cirillic_ending_from_english_words,
+    fix_covid,
+    fix_english_dash_russian_words,
+    delete_age_category,
+    delete_birth_mark,
+    fix_surname_dash_surname_dash_surname,
+    fix_dash_word,
+    lowercase_sdk,
+    replace_sdk,
+    fix_press_conference,
+    generalize_top,
+]
+
+
+def _merge_spaces_and_strip(text: str) -> str:
+    """Схлопывание пробелов и удаление пробелов в начале и в конце текста."""
     return merge_spaces(text).strip()
+
+
+# Шаги 28-48 упрощения текста (см. simplify)
+simplify_steps_after_dates_penalties: List[SimplifyStep] = [
+    delete_year_city_mark,
+    split_ners,
+    delete_urls,
+    delete_quotes_with_one_symbol,
+    delete_one_symbol_english_words,
+    delete_numeric_data,
+    delete_serial_numbers,
+    delete_play_format,
+    replace_exclamation_mark_with_dot,
+    leave_only_significant_symbols,
+    fix_org_loc,
+    merge_spaces,
+    merge_dashes,
+    replace_dash_between_ners,
+    fix_ner_with_and_ner,
+    delete_beginning_ending_dashes_in_words,
+    fix_dots,
+    fix_question_marks,
+    fix_question_dot,
+    fix_dot_question,
+    delete_ending_colon_dash,
+    fix_colons,
+    _merge_spaces_and_strip,
+]
+
+
+# Все шаги упрощения текста по порядку (см. simplify), ключи - имена шагов
+simplify_rules: Dict[str, SimplifyStep] = {
+    **{step.__name__: step for step in simplify_steps_before_ners},
+    "replace_ners": replace_ners,
+    "replace_dates": replace_dates,
+    "replace_penalty": replace_penalty,
+    **{step.__name__: step for step in simplify_steps_after_dates_penalties},
+}
+
+
+# Категории символов для триггеров шагов упрощения (битовая маска)
+DIGITS = 1
+LATIN = 2
+LATIN_UPPERCASE = 4
+OTHER_SPACES = 8
+
+_categories_patterns = {
+    DIGITS: re.compile(r"\d"),
+    LATIN: re.compile(r"[a-zA-Z]"),
+    LATIN_UPPERCASE: re.compile(r"[A-Z]"),
+    OTHER_SPACES: re.compile(r"[^\S ]"),
+}
+
+
+class TextSignature:
+    """
+    Сигнатура текста для проверки триггеров шагов упрощения.
+
+    Текст в нижнем регистре и битовая маска категорий символов текста
+    вычисляются один раз, при первой проверке, которой они нужны, и служат
+    всем следующим триггерам, пока какой-либо шаг не изменит текст.
+    """
+
+    def __init__(self, text: str) -> None:
+        """Создание сигнатуры текста."""
+        self.text = text
+        self._lowered: Optional[str] = None
+        self._categories: Optional[int] = None
+
+    @property
+    def lowered(self) -> str:
+        """Текст в нижнем регистре."""
+        if self._lowered is None:
+            self._lowered = self.text.lower()
+        return self._lowered
+
+    @property
+    def categories(self) -> int:
+        """Битовая маска категорий символов, которые есть в тексте."""
+        if self._categories is None:
+            self._categories = 0
+            for category, pattern in _categories_patterns.items():
+                if pattern.search(self.text):
+                    self._categories |= category
+        return self._categories
+
+
+class Trigger(NamedTuple):
+    """
+    Дешевая проверка того, что шаг упрощения может изменить текст.
+
+    Шаг выполняется, если в тексте есть хотя бы одна из подстрок substrings,
+    или хотя бы один из символов characters, или символ хотя бы одной
+    из категорий categories (битовая маска: DIGITS, LATIN и т.д.).
+    ignore_case - подстроки (в нижнем регистре) ищутся в тексте
+    в нижнем регистре.
+    Если триггера в тексте нет, то шаг гарантированно не меняет текст.
+    """
+
+    substrings: Tuple[str, ...] = ()
+    characters: str = ""
+    categories: int = 0
+    ignore_case: bool = False
+
+    def matches(self, signature: TextSignature) -> bool:
+        """Есть ли триггер в тексте."""
+        text = signature.lowered if self.ignore_case else signature.text
+        return (
+            any(substring in text for substring in self.substrings)
+            or any(character in signature.text for character in self.characters)
+            or bool(self.categories and self.categories & signature.categories)
+        )
+
+
+# Триггеры шагов упрощения текста по именам шагов (см. simplify_rules).
+# Шаги без триггера выполняются всегда.
+simplify_triggers: Dict[str, Trigger] = {
+    "delete_parentheses_content": Trigger(characters="("),
+    "replace_tak_kak": Trigger(("т.", "т ", "тк"), categories=OTHER_SPACES),
+    "replace_to_est": Trigger(("т.", "т ", "те"), categories=OTHER_SPACES),
+    "delete_letter_dot_letter_dot": Trigger(characters="."),
+    "fix_b_o_lshii": Trigger(("б о льш", "Б о льш")),
+    "delete_shutouts": Trigger(("so", "So", "sO", "SO"), "бБ"),
+    "delete_overtime_mark": Trigger(("от", "ОТ", "ot", "OT")),
+    "delete_amplua": Trigger(("вр",), "зн"),
+    "lowercase_shaiba_word": Trigger(("Шайба",)),
+    "latin_c_to_cirillic": Trigger(characters="cC"),
+    "fix_latin_c_in_russian_words": Trigger(characters="cC"),
+    "fix_cirillic_c_in_english_words": Trigger(characters="сС"),
+    "replace_vs_with_dash": Trigger(("vs", "Vs", "vS", "VS")),
+    "delete_cirillic_ending_from_english_words": Trigger(categories=LATIN_UPPERCASE),
+    "fix_covid": Trigger(("cov",), ignore_case=True),
+    "fix_english_dash_russian_words": Trigger(categories=LATIN),
+    "delete_age_category": Trigger(characters="U"),
+    "delete_birth_mark": Trigger(("р.",)),
+    "fix_surname_dash_surname_dash_surname": Trigger(characters="-"),
+    "lowercase_sdk": Trigger(("сдк",), ignore_case=True),
+    "replace_sdk": Trigger(("дисциплинарн",), ignore_case=True),
+    "fix_press_conference": Trigger(("пресс",), ignore_case=True),
+    "generalize_top": Trigger(("топ", "ТОП", "top", "TOP")),
+    "replace_dates": Trigger(categories=DIGITS),
+    "replace_penalty": Trigger(characters="+"),
+    "delete_year_city_mark": Trigger(characters="гГ"),
+    "split_ners": Trigger(("per", "org", "loc", "date", "pen")),
+    "delete_urls": Trigger(characters="."),
+    "delete_quotes_with_one_symbol": Trigger(characters="'"),
+    "delete_one_symbol_english_words": Trigger(categories=LATIN),
+    "delete_numeric_data": Trigger(categories=DIGITS),
+    "delete_serial_numbers": Trigger(categories=DIGITS),
+    "delete_play_format": Trigger(
+        ("три", "четыре", "пять", "шесть"), "3456", ignore_case=True
+    ),
+    "replace_exclamation_mark_with_dot": Trigger(characters="!"),
+    "fix_org_loc": Trigger(("loc",)),
+    "merge_spaces": Trigger(("  ",), categories=OTHER_SPACES),
+    "merge_dashes": Trigger(("--", "- "), categories=OTHER_SPACES),
+    "replace_dash_between_ners": Trigger(characters="-"),
+    "fix_ner_with_and_ner": Trigger(("per", "org", "loc", "date")),
+    "delete_beginning_ending_dashes_in_words": Trigger(characters="-"),
+    "fix_dots": Trigger(characters="."),
+    "fix_question_marks": Trigger(characters="?"),
+    "fix_question_dot": Trigger(characters="?"),
+    "fix_dot_question": Trigger(characters="?"),
+    "fix_colons": Trigger(characters=":"),
+}
+
+_steps_triggers: Dict[SimplifyStep, Tuple[str, Trigger]] = {
+    simplify_rules[name]: (name, trigger) for name, trigger in simplify_triggers.items()
+}
+
+
+class TriggerStats:
+    """
+    Статистика пропусков шагов упрощения по триггерам.
+
+    Для каждого шага с триггером учитывается, на скольких текстах он
+    проверялся и на скольких был пропущен. Статистику можно пополнять
+    одновременно из нескольких потоков.
+    """
+
+    def __init__(self) -> None:
+        """Создание пустой статистики."""
+        self.checked: Dict[str, int] = {}
+        self.skipped: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, skipped: bool) -> None:
+        """Учет проверки триггера шага name."""
+        with self._lock:
+            self.checked[name] = self.checked.get(name, 0) + 1
+            self.skipped[name] = self.skipped.get(name, 0) + skipped
+
+    def skip_rates(self) -> Dict[str, float]:
+        """Доли текстов, на которых шаги были пропущены, по именам шагов."""
+        with self._lock:
+            return {
+                name: self.skipped[name] / checked
+                for name, checked in self.checked.items()
+            }
+
+
+class SimplifySteps(NamedTuple):
+    """Скомпилированные шаги упрощения текста."""
+
+    before_ners: List[SimplifyStep]
+    replace_ners: bool
+    after_ners: List[SimplifyStep]
+
+
+def compile_simplify_steps(
+    replace_ners_: bool = True,
+    replace_dates_: bool = True,
+    replace_penalties_: bool = True,
+    disabled_steps: Collection[str] = (),
+    insert_before: Optional[Dict[str, List[SimplifyStep]]] = None,
+    insert_after: Optional[Dict[str, List[SimplifyStep]]] = None,
+) -> SimplifySteps:
+    """
+    Составление списка шагов упрощения текста с заданными параметрами.
+
+    Шаги указываются по именам из simplify_rules:
+      disabled_steps: шаги, которые не нужно выполнять
+      insert_before, insert_after: собственные шаги, которые нужно выполнить
+        перед указанным шагом или после него (даже если он отключен)
+
+    Пример использования:
+      compile_simplify_steps(
+        disabled_steps=["delete_shutouts", "delete_play_format"],
+        insert_after={"fix_covid": [regex_step("ё", "е")]},
+      )
+
+    Замена ner'ов выполняется отдельно от остальных шагов (в том числе
+    батчами), поэтому шаги разделены на шаги до нее и после нее.
+    Неизвестное имя шага - ValueError.
+    """
+    insert_before = insert_before or {}
+    insert_after = insert_after or {}
+    disabled = set(disabled_steps)
+    if not replace_ners_:
+        disabled.add("replace_ners")
+    if not replace_dates_:
+        disabled.add("replace_dates")
+    if not replace_penalties_:
+        disabled.add("replace_penalty")
+    unknown = (disabled | insert_before.keys() | insert_after.keys()) - set(
+        simplify_rules
+    )
+    if unknown:
+        raise ValueError(f"Неизвестные шаги упрощения: {', '.join(sorted(unknown))}")
+    before_ners: List[SimplifyStep] = []
+    after_ners: List[SimplifyStep] = []
+    steps = before_ners
+    for name, step in simplify_rules.items():
+        steps.extend(insert_before.get(name, []))
+        if name == "replace_ners":
+            steps = after_ners
+        elif name not in disabled:
+            steps.append(step)
+        steps.extend(insert_after.get(name, []))
+    return SimplifySteps(before_ners, "replace_ners" not in disabled, after_ners)
+
+
+# Собственные шаги по именам шагов в хэшируемом виде (см. _simplify_steps)
+_NamedSteps = Tuple[Tuple[str, Tuple[SimplifyStep, ...]], ...]  # pragma: no mutate
+
+
+@lru_cache(maxsize=64)
+def _compiled_simplify_steps(
+    replace_ners_: bool,
+    replace_dates_: bool,
+    replace_penalties_: bool,
+    disabled_steps: FrozenSet[str],
+    insert_before: _NamedSteps,
+    insert_after: _NamedSteps,
+) -> SimplifySteps:
+    """compile_simplify_steps с хэшируемыми параметрами, результаты кэшируются."""
+    return compile_simplify_steps(
+        replace_ners_,
+        replace_dates_,
+        replace_penalties_,
+        disabled_steps,
+        {name: list(steps) for name, steps in insert_before},
+        {name: list(steps) for name, steps in insert_after},
+    )
+
+
+def _simplify_steps(
+    replace_ners_: bool = True,
+    replace_dates_: bool = True,
+    replace_penalties_: bool = True,
+    disabled_steps: Collection[str] = (),
+    insert_before: Optional[Dict[str, List[SimplifyStep]]] = None,
+    insert_after: Optional[Dict[str, List[SimplifyStep]]] = None,
+) -> SimplifySteps:
+    """
+    Шаги упрощения текста для simplify и simplify_batch.
+
+    Аналог compile_simplify_steps, но шаги с одними и теми же параметрами
+    составляются один раз. Возвращаемые списки шагов общие для всех
+    вызовов и не должны изменяться.
+    """
+    return _compiled_simplify_steps(
+        replace_ners_,
+        replace_dates_,
+        replace_penalties_,
+        frozenset(disabled_steps),
+        tuple((name, tuple(steps)) for name, steps in (insert_before or {}).items()),
+        tuple((name, tuple(steps)) for name, steps in (insert_after or {}).items()),
+    )
+
+
+def regex_step(
+    pattern: Union[str, Pattern[str]],
+    repl: Union[str, Callable[[Match[str]], str]],
+) -> SimplifyStep:
+    """
+    Собственный шаг упрощения текста: замена по регулярному выражению.
+
+    Регулярное выражение компилируется один раз при создании шага.
+    """
+    compiled_pattern = re.compile(pattern)
+
+    def step(text: str) -> str:
+        """Замена по регулярному выражению."""
+        return compiled_pattern.sub(repl, text)
+
+    step.__name__ = f"regex_step({compiled_pattern.pattern!r})"
+    return step
+
+
+def apply_steps(
+    text: str,
+    steps: List[SimplifyStep],
+    trigger_stats: Optional[TriggerStats] = None,
+) -> str:
+    """
+    Последовательное применение шагов преобразования к тексту.
+
+    Шаги с триггером (см. simplify_triggers) пропускаются, если триггера
+    в тексте нет. Сигнатура текста для триггеров создается заново, только
+    когда шаг изменил текст. Если задана trigger_stats, то в нее
+    записывается статистика пропусков шагов.
+    """
+    signature = TextSignature(text)
+    for step in steps:
+        step_trigger = _steps_triggers.get(step)
+        if step_trigger is not None:
+            name, trigger = step_trigger
+            skipped = not trigger.matches(signature)
+            if trigger_stats is not None:
+                trigger_stats.add(name, skipped)
+            if skipped:
+                continue
+        new_text = step(text)
+        if new_text is not text:
+            text = new_text
+            signature = TextSignature(text)
+    return text
+
+
+def simplify_batch(
+    texts: List[str],
+    replace_ners_: bool = True,
+    replace_dates_: bool = True,
+    replace_penalties_: bool = True,
+    ner_mode: NerMode = "neural",
+    bucket_size: int = DEFAULT_BUCKET_SIZE,
+    padding_stats: Optional[PaddingStats] = None,
+    ner_tagger_: Any = ner_tagger,
+    disabled_steps: Collection[str] = (),
+    insert_before: Optional[Dict[str, List[SimplifyStep]]] = None,
+    insert_after: Optional[Dict[str, List[SimplifyStep]]] = None,
+    trigger_stats: Optional[TriggerStats] = None,
+) -> List[str]:
+    """
+    Упрощение сразу нескольких текстов хоккейных новостей.
+
+    Аналог [simplify(text, ...) for text in texts], но именованные сущности
+    нейронной моделью распознаются батчами (см. replace_ners_batch).
+    """
+    steps = _simplify_steps(
+        replace_ners_,
+        replace_dates_,
+        replace_penalties_,
+        disabled_steps,
+        insert_before,
+        insert_after,
+    )
+    texts = [apply_steps(text, steps.before_ners, trigger_stats) for text in texts]
+    if steps.replace_ners and ner_mode == "neural":
+        texts = replace_ners_batch(texts, bucket_size, padding_stats, ner_tagger_)
+    elif steps.replace_ners:
+        texts = [ners_replacers[ner_mode](text) for text in texts]
+    return [apply_steps(text, steps.after_ners, trigger_stats) for text in texts]
+
+
+def split_long_text(text: str, max_text_len: Optional[int]) -> List[str]:
+    """
+    Разбивка длинного текста на фрагменты не длиннее max_text_len символов.
+
+    Текст разрезается по границам предложений, а предложения длиннее
+    max_text_len - по пробелам (и только слово длиннее max_text_len - внутри
+    слова). В унифицированном тексте переносов строк нет (см. unify), поэтому
+    границы абзацев - тоже границы предложений. Фрагменты идут в тексте
+    подряд, между соседними фрагментами - один пробел или ничего.
+    max_text_len=None - без разбивки.
+    """
+    if max_text_len is None or len(text) <= max_text_len:
+        return [text]
+    chunks = []
+    start = stop = 0
+    for sentence in segmenter.sentenize(text):
+        if sentence.stop - start > max_text_len and stop > start:
+            chunks.append(text[start:stop])
+            start = sentence.start
+        while sentence.stop - start > max_text_len:
+            cut = text.rfind(" ", start + 1, start + max_text_len + 1)
+            if cut == -1:
+                chunks.append(text[start : start + max_text_len])
+                start += max_text_len
+            else:
+                chunks.append(text[start:cut])
+                start = cut + 1
+        stop = sentence.stop
+    chunks.append(text[start:])
+    return chunks
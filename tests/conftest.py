@@ -0,0 +1,11 @@
+"""Общие фикстуры тестов."""
+
+import pytest
+
+from khl.preprocess import get_coder
+from tests.test_khl import test_frequency_dictionary_file, tests_dir
+
+
+@pytest.fixture(scope="module")
+def coder():
+    return get_coder(tests_dir / test_frequency_dictionary_file)
@@ -0,0 +1,79 @@
+"""Юнит-тесты для пакетной обработки текстов."""
+
+import pytest
+
+from khl.batching import PaddingStats, bucketed_map, chunked, parallel_map
+
+
+@pytest.mark.parametrize(
+    "lengths,batch_size,expected_efficiency",
+    [
+        ([], 8, 1.0),
+        ([5, 5, 5, 5], 2, 1.0),
+        ([1, 3], 2, 4 / 6),
+        ([1, 3], 1, 1.0),
+        ([1, 3, 2, 2], 2, 8 / 10),
+    ],
+)
+def test_padding_stats(lengths, batch_size, expected_efficiency):
+    padding_stats = PaddingStats()
+    padding_stats.add(lengths, batch_size)
+    assert padding_stats.efficiency == pytest.approx(expected_efficiency)
+
+
+@pytest.mark.parametrize(
+    "bucket_size,expected_order,expected_efficiency",
+    [
+        (1, ["ccc", "a", "bb", "dddd", "e"], 11 / 15),
+        (2, ["a", "ccc", "bb", "dddd", "e"], 11 / 15),
+        (5, ["a", "e", "bb", "ccc", "dddd"], 11 / 12),
+    ],
+)
+def test_bucketed_map(bucket_size, expected_order, expected_efficiency):
+    items = ["ccc", "a", "bb", "dddd", "e"]
+    order = []
+
+    def tag(chunk):
+        order.extend(chunk)
+        return [item.upper() for item in chunk]
+
+    padding_stats = PaddingStats()
+    results = bucketed_map(
+        tag, items, [len(item) for item in items], 2, bucket_size, padding_stats
+    )
+    assert results == ["CCC", "A", "BB", "DDDD", "E"]
+    assert order == expected_order
+    assert padding_stats.efficiency == pytest.approx(expected_efficiency)
+
+
+@pytest.mark.parametrize(
+    "items,size,expected_chunks",
+    [
+        ([], 2, []),
+        ([1, 2, 3], 2, [[1, 2], [3]]),
+        ([1, 2, 3, 4], 2, [[1, 2], [3, 4]]),
+    ],
+)
+def test_chunked(items, size, expected_chunks):
+    assert list(chunked(iter(items), size)) == expected_chunks
+
+
+@pytest.mark.parametrize(
+    "items,workers,expected_parts",
+    [
+        ([], 4, [[]]),
+        ([1], 4, [[1]]),
+        ([1, 2, 3], 1, [[1, 2, 3]]),
+        ([1, 2, 3], 2, [[1, 2], [3]]),
+        ([1, 2, 3, 4, 5], 4, [[1, 2], [3, 4], [5]]),
+    ],
+)
+def test_parallel_map(items, workers, expected_parts):
+    parts = []
+
+    def function(part):
+        parts.append(part)
+        return [item * 10 for item in part]
+
+    assert parallel_map(function, items, workers) == [item * 10 for item in items]
+    assert sorted(parts) == expected_parts
@@ -0,0 +1,89 @@
+"""Юнит-тесты для хранения закодированных новостей."""
+
+import numpy as np
+import pytest
+
+from khl.dataset import DatasetReader, DatasetWriter, codes_dtype
+
+DOCUMENTS = [[2, 3, 4], [], [5], [6, 7, 8, 9, 10], [0, 0, 11], [12, 13]]
+
+
+@pytest.mark.parametrize(
+    "coder_size,expected_dtype",
+    [(2, np.uint16), (65_536, np.uint16), (65_537, np.uint32)],
+)
+def test_codes_dtype(coder_size, expected_dtype):
+    coder = {str(code): code for code in range(coder_size)}
+    assert codes_dtype(coder) == expected_dtype
+
+
+@pytest.mark.parametrize("shard_size", [1, 2, 4, 100])
+def test_dataset_write_read(tmp_path, shard_size):
+    coder = {str(code): code for code in range(20)}
+    with DatasetWriter(tmp_path, coder, shard_size) as writer:
+        assert writer.write(DOCUMENTS[0]) == 0
+        writer.extend(DOCUMENTS[1:])
+    assert len(list(tmp_path.glob("codes-*.npy"))) == -(-len(DOCUMENTS) // shard_size)
+    reader = DatasetReader(tmp_path)
+    assert len(reader) == len(DOCUMENTS)
+    assert [reader[index].tolist() for index in range(len(reader))] == DOCUMENTS
+    assert reader[-1].tolist() == DOCUMENTS[-1]
+    assert [codes.tolist() for codes in reader[1:5:2]] == DOCUMENTS[1:5:2]
+    assert [codes.tolist() for codes in reader[:]] == DOCUMENTS
+    codes = reader[3]
+    assert codes.dtype == np.uint16
+    assert isinstance(codes.base, np.memmap)
+    assert not codes.flags.writeable
+
+
+@pytest.mark.parametrize("document_id", [6, -7])
+def test_dataset_reader_index_error(tmp_path, document_id):
+    coder = {str(code): code for code in range(20)}
+    with DatasetWriter(tmp_path, coder, 4) as writer:
+        writer.extend(DOCUMENTS)
+    with pytest.raises(IndexError):
+        DatasetReader(tmp_path)[document_id]
+
+
+def test_dataset_empty(tmp_path):
+    DatasetWriter(tmp_path, {"": 0, "???": 1}).close()
+    reader = DatasetReader(tmp_path)
+    assert len(reader) == 0
+    assert reader[:] == []
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["index.json"]
+
+
+@pytest.mark.parametrize("shard_size", [0, -1])
+def test_dataset_writer_shard_size_error(tmp_path, shard_size):
+    with pytest.raises(ValueError):
+        DatasetWriter(tmp_path, {"": 0}, shard_size)
+
+
+def test_dataset_writer_exception(tmp_path):
+    coder = {str(code): code for code in range(20)}
+    with pytest.raises(RuntimeError):
+        with DatasetWriter(tmp_path, coder, 2) as writer:
+            writer.extend(DOCUMENTS[:3])
+            raise RuntimeError
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "codes-00000.npy",
+        "offsets-00000.npy",
+    ]
+    with pytest.raises(FileNotFoundError):
+        DatasetReader(tmp_path)
+
+
+@pytest.mark.parametrize("shard_size", [1, 4])
+def test_dataset_writer_existing_dataset(tmp_path, shard_size):
+    coder = {str(code): code for code in range(20)}
+    with DatasetWriter(tmp_path, coder, shard_size) as writer:
+        writer.extend(DOCUMENTS)
+    (tmp_path / "index.json").unlink()
+    with pytest.raises(FileExistsError):
+        DatasetWriter(tmp_path, coder)
+    other_file = tmp_path / "other" / "README"
+    other_file.parent.mkdir()
+    other_file.write_text("")
+    with DatasetWriter(tmp_path / "other", coder) as writer:
+        writer.write(DOCUMENTS[0])
+    assert len(DatasetReader(tmp_path / "other")) == 1
@@ -0,0 +1,76 @@
+"""Юнит-тесты для поиска названий из словаря."""
+
+import re
+
+import pytest
+
+from khl.gazetteer import Gazetteer
+from khl.teams_orgs import org_endings, teams_orgs_entries, teams_orgs_pattern
+
+teams_orgs_gazetteer = Gazetteer(teams_orgs_entries, endings=org_endings)
+
+
+@pytest.mark.parametrize(
+    "entries,source_text,expected_text",
+    [
+        ([["Спартак"]], "Спартак спартак СПАРТАК", "org спартак org"),
+        ([["ска"]], "ска СКА Ска сказал", "org org org orgзал"),
+        ([[r"ска\b"]], "ска СКА сказал ска-2", "org org сказал org-2"),
+        ([["Ак барс"]], "Ак Барс Ак  барс АкБарс Ак\tбарс", "org org org org"),
+        ([["Витязь?"]], "Витязь Витяз", "org org"),
+        ([["D[iy]namo"]], "Dinamo Dynamo Danamo", "org org Danamo"),
+        ([["магнитк[а-я]+"]], "магнитк магнитка", "магнитк org"),
+        ([["Салават([а-я]* юлаев)?"]], "Салават Салавата Юлаева", "org orgа"),
+        ([["Динамо", r"Динамо м\b"]], "Динамо М Динамо может", "org org может"),
+        ([["кхл"]], "КХЛ вКХЛ", "org вКХЛ"),
+        ([[r"кхл\b"], ["кхлу"]], "КХЛу", "org"),
+        ([["кхл"], ["кхлу"]], "КХЛу", "orgу"),
+    ],
+)
+def test_gazetteer_sub(entries, source_text, expected_text):
+    assert Gazetteer(entries).sub("org", source_text) == expected_text
+
+
+@pytest.mark.parametrize(
+    "source_text,expected_spans",
+    [
+        ("", []),
+        ("Текст", []),
+        ("'Спартаку' и Ак Барсу", [(1, 9), (13, 21)]),
+        ("ХК Сочи", [(0, 7)]),
+    ],
+)
+def test_gazetteer_finditer(source_text, expected_spans):
+    assert list(teams_orgs_gazetteer.finditer(source_text)) == expected_spans
+
+
+def test_gazetteer_sub_with_function():
+    assert (
+        teams_orgs_gazetteer.sub(lambda word: f"[{word}]", "Спартак'у с ЦСКА")
+        == "[Спартак'у] с [ЦСКА]"
+    )
+
+
+@pytest.mark.parametrize("variant", ["Салават(", "Салават[а-я"])
+def test_gazetteer_wrong_variant(variant):
+    with pytest.raises(ValueError):
+        Gazetteer([[variant]])
+
+
+@pytest.mark.parametrize(
+    "source_text",
+    [
+        "Динамо Москва Динамо Рига-2 Динамо  Мн Динамо-М Dynamo msk'у",
+        "ХКСпартак хк Сочи хк сочи hc Dynamo ПХК ЦСКА хк кхл",
+        "Салават'а Юлаев Salavat'е Ulaev SalavatUlaev 'Salavat' ulaev",
+        "СалаватЮлаевЮлаев Салават Юлаев Юлаев Salavat''a Ulaev",
+        "Куньлунь РС Кунлунь ред стар Kunlun RedStar Кунлуньрс",
+        "ММГ'а Магнитке Магниткё магнитка2 magnitka ММГшник",
+        "Торпедо нижний  новгород Torpedo Nizhnii Novgorod Torpedo NNовцы",
+        "СКА_ ска2 цска ЦСКА'шники cska_ 5Спартак Спартак5 name",
+    ],
+)
+def test_gazetteer_same_as_teams_orgs_pattern(source_text):
+    assert teams_orgs_gazetteer.sub("org", source_text) == re.sub(
+        teams_orgs_pattern, "org", source_text
+    )
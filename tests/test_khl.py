@@ -25,7 +25,7 @@ class TestMetadata:
     PACKAGE_LICENSE_FILE = "LICENSE"
     PACKAGE_AUTHORS = ["Rishat Fayzullin <nilluziaf@gmail.com>"]
     PACKAGE_REPOSITORY = "https://github.com/Rishat-F/khl"
-    PACKAGE_DEPS = {"python": "^3.8", "natasha": "==1.4.0"}
+    PACKAGE_DEPS = {"python": "^3.8", "natasha": "==1.4.0", "numpy": ">=1.21"}
     with open(project_dir / "pyproject.toml", "rb") as frb:
         PROJECT_TOML = tomli.load(frb)
 
@@ -1081,6 +1081,130 @@ def test_e2e_with_default_params():
     assert khl.text_to_codes(text, coder) == expected_codes
 
 
+def test_e2e_with_gazetteer_ner_mode():
+    text = """
+        1 апреля 2023 года в матче ⅛ финала против „Спартака” Иван Иванов забил свой 100—й гол за карьеру.
+        «Динамо Мск» - «Спартак» 2:1 ОТ (1:0 0:1 0:0 1:0) Голы забили: Иванов, Петров, Сидоров.
+        В матче судьи выписали два удаления '5+20'.
+    """
+    coder = khl.preprocess.get_coder(tests_dir / test_frequency_dictionary_file)
+    assert khl.text_to_codes(text, coder, ner_mode="gazetteer") == khl.text_to_codes(
+        text, coder, ner_mode="neural"
+    )
+
+
+@pytest.mark.parametrize("max_len", [1, 5, 20, 60, 1000])
+@pytest.mark.parametrize("stop_words_", [khl.stop_words, None, [".", "и", "в", "свой"]])
+@pytest.mark.parametrize("ner_mode", ["neural", "gazetteer"])
+def test_incremental_text_to_codes(max_len, stop_words_, ner_mode):
+    text = (
+        """
+        1 апреля 2023 года в матче ⅛ финала против „Спартака” Иван Иванов забил свой 100—й гол за карьеру.
+        «Динамо Мск» - «Спартак» 2:1 ОТ (1:0 0:1 0:0 1:0) Голы забили: Иванов, Петров, Сидоров.
+        В матче судьи выписали два удаления '5+20'. Петров. Сидоров. Иванов
+    """
+        * 5
+    )
+    coder = khl.preprocess.get_coder(tests_dir / test_frequency_dictionary_file)
+    for exclude_unknown in (True, False):
+        assert khl.text_to_codes(
+            text,
+            coder,
+            stop_words_,
+            exclude_unknown=exclude_unknown,
+            max_len=max_len,
+            ner_mode=ner_mode,
+            incremental=True,
+        ) == khl.text_to_codes(
+            text,
+            coder,
+            stop_words_,
+            exclude_unknown=exclude_unknown,
+            max_len=max_len,
+            ner_mode=ner_mode,
+        )
+
+
+@pytest.mark.parametrize("ner_mode", ["neural", "gazetteer"])
+def test_incremental_text_to_codes_with_stop_words_sentences(ner_mode):
+    # Предложения только из стоп-слов не меняют коды фрагмента, но следующий
+    # за ними per 'схлопывается' с последним per первого предложения
+    text = "Сегодня забил гол Иванов. " + "Вот ну. " * 10 + "Петров забил гол. " * 3
+    coder = khl.preprocess.get_coder(tests_dir / test_frequency_dictionary_file)
+    options = dict(
+        coder=coder,
+        stop_words_=[".", "вот", "ну"],
+        exclude_unknown=False,
+        max_len=4,
+        ner_mode=ner_mode,
+    )
+    expected_codes = khl.text_to_codes(text, **options)
+    assert expected_codes[-1] == coder["pers"]
+    assert khl.text_to_codes(text, incremental=True, **options) == expected_codes
+
+
+@pytest.mark.parametrize("chunk_size,bucket_size", [(1, 1), (2, 1), (3, 2), (256, 256)])
+def test_texts_to_codes(chunk_size, bucket_size):
+    texts = [
+        "Андрей Педан не сыграет против 'Спартака'",
+        "",
+        """
+        1 апреля 2023 года в матче ⅛ финала против „Спартака” Иван Иванов забил свой 100—й гол за карьеру.
+        «Динамо Мск» - «Спартак» 2:1 ОТ (1:0 0:1 0:0 1:0) Голы забили: Иванов, Петров, Сидоров.
+        """,
+        "Уральская проверка",
+        "В матче судьи выписали два удаления '5+20'.",
+    ]
+    coder = khl.preprocess.get_coder(tests_dir / test_frequency_dictionary_file)
+    padding_stats = khl.batching.PaddingStats()
+    assert list(
+        khl.texts_to_codes(
+            iter(texts),
+            coder,
+            max_len=10,
+            chunk_size=chunk_size,
+            bucket_size=bucket_size,
+            padding_stats=padding_stats,
+        )
+    ) == [text_to_codes(text, coder, max_len=10) for text in texts]
+    assert 0 < padding_stats.efficiency <= 1
+
+
+def test_text_to_codes_reuses_pipelines():
+    coder = khl.preprocess.get_coder(tests_dir / test_frequency_dictionary_file)
+    text = "Андрей Педан не сыграет против 'Спартака'"
+    khl._pipelines.clear()
+    expected_codes = text_to_codes(text, coder)
+    for _ in range(10):
+        assert text_to_codes(text, coder, stop_words_=list(khl.stop_words)) == (
+            expected_codes
+        )
+        assert list(khl.texts_to_codes([text], coder)) == [expected_codes]
+    assert len(khl._pipelines) == 2
+    text_to_codes(text, coder, max_len=5)
+    text_to_codes(text, {**coder, "сыграть": len(coder)})
+    assert len(khl._pipelines) == 4
+    for max_len in range(khl.PIPELINES_CACHE_SIZE):
+        text_to_codes(text, coder, max_len=max_len + 1)
+    assert len(khl._pipelines) == khl.PIPELINES_CACHE_SIZE
+
+
+def test_text_to_codes_coder_changed_in_place():
+    coder = khl.preprocess.get_coder(tests_dir / test_frequency_dictionary_file)
+    text = "Андрей Педан не сыграет против 'Спартака'"
+    khl._pipelines.clear()
+    text_to_codes(text, coder)
+    # Число лемм не меняется, а 'per' становится обычной леммой
+    coder["per"], coder["против"] = coder["против"], coder["per"]
+    expected_pipeline = khl.pipeline.Pipeline(dict(coder))
+    expected_codes = expected_pipeline(text)
+    assert text_to_codes(text, coder) == expected_codes
+    pipeline = next(reversed(khl._pipelines.values()))
+    assert pipeline._mergeable_codes == expected_pipeline._mergeable_codes
+    assert list(khl.texts_to_codes([text], coder)) == [expected_codes]
+    assert len(khl._pipelines) == 2
+
+
 class TestUsagesFromReadme:
     coder = {
         "": 0,  # placeholder
@@ -0,0 +1,124 @@
+"""Юнит-тесты для метрик обработки текстов."""
+
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from khl.metrics import (
+    SUB_BUCKETS,
+    LatencyHistogram,
+    MetricsRegistry,
+    _bucket,
+    _bucket_bounds,
+)
+
+
+@pytest.mark.parametrize(
+    "microseconds",
+    [0, 1, 31, 32, 33, 47, 48, 1_000, 65_535, 65_536, 10**9, 2**40 + 12345],
+)
+def test_bucket_bounds(microseconds):
+    lower, upper = _bucket_bounds(_bucket(microseconds))
+    assert lower <= microseconds < upper
+    assert upper - lower == 1 or (upper - lower) / lower <= 1 / SUB_BUCKETS
+
+
+def test_buckets_are_contiguous():
+    previous_upper = 0
+    for bucket in range(2_000):
+        lower, upper = _bucket_bounds(bucket)
+        assert lower == previous_upper
+        assert _bucket(lower) == _bucket(upper - 1) == bucket
+        previous_upper = upper
+
+
+@pytest.mark.parametrize("q", [0.0, 0.5, 0.9, 0.99, 1.0])
+def test_histogram_quantile(q):
+    random_ = random.Random(0)
+    values = sorted(random_.lognormvariate(-6, 2) for _ in range(10_000))
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.observe(value)
+    assert histogram.count == len(values)
+    assert histogram.sum == pytest.approx(sum(values))
+    expected = values[max(round(q * len(values)) - 1, 0)]
+    assert histogram.quantile(q) == pytest.approx(
+        expected, rel=1 / SUB_BUCKETS, abs=1e-6
+    )
+
+
+def test_histogram_empty_and_time():
+    histogram = LatencyHistogram()
+    assert histogram.quantile(0.5) == 0.0
+    with histogram.time():
+        pass
+    assert histogram.count == 1
+
+
+def test_registry_as_dict_and_prometheus():
+    registry = MetricsRegistry()
+    registry.counter("texts").add(3)
+    registry.counter("texts").add()
+    registry.gauge("texts_in_progress").add(2)
+    registry.histogram("unify_seconds").observe(0.001)
+    registry.add_collector(lambda: {"lemma_cache_hits": 7})
+    assert registry.as_dict() == {
+        "texts": 4,
+        "texts_in_progress": 2,
+        "unify_seconds": {
+            "count": 1.0,
+            "sum": 0.001,
+            "p50": 0.001008,
+            "p90": 0.001008,
+            "p99": 0.001008,
+            "p999": 0.001008,
+        },
+        "lemma_cache_hits": 7,
+    }
+    assert registry.to_prometheus() == (
+        "# TYPE khl_texts_total counter\n"
+        "khl_texts_total 4\n"
+        "# TYPE khl_texts_in_progress gauge\n"
+        "khl_texts_in_progress 2\n"
+        "# TYPE khl_unify_seconds summary\n"
+        'khl_unify_seconds{quantile="0.5"} 0.001008\n'
+        'khl_unify_seconds{quantile="0.9"} 0.001008\n'
+        'khl_unify_seconds{quantile="0.99"} 0.001008\n'
+        'khl_unify_seconds{quantile="0.999"} 0.001008\n'
+        "khl_unify_seconds_sum 0.001\n"
+        "khl_unify_seconds_count 1\n"
+        "# TYPE khl_lemma_cache_hits_total counter\n"
+        "khl_lemma_cache_hits_total 7\n"
+    )
+
+
+def test_registry_collector_keys():
+    registry = MetricsRegistry()
+    for hits in range(3):
+        registry.add_collector(lambda hits=hits: {"hits": hits}, key="cache")
+    registry.add_collector(lambda: {"misses": 1})
+    registry.add_collector(lambda: {"misses": 2})
+    assert len(registry._collectors) == 3
+    assert registry.as_dict() == {"hits": 2, "misses": 2}
+
+
+def test_registry_metric_kind_conflict():
+    registry = MetricsRegistry()
+    registry.counter("texts")
+    with pytest.raises(ValueError):
+        registry.histogram("texts")
+
+
+def test_registry_threaded():
+    registry = MetricsRegistry()
+
+    def work(_):
+        for _ in range(1_000):
+            registry.counter("texts").add()
+            registry.histogram("unify_seconds").observe(0.0001)
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(work, range(8)))
+    assert registry.counter("texts").value == 8_000
+    assert registry.histogram("unify_seconds").count == 8_000
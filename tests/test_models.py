@@ -0,0 +1,75 @@
+"""Юнит-тесты для загрузки моделей."""
+
+import numpy as np
+import pytest
+from natasha import NewsNERTagger
+
+from khl import utils
+from khl.models import (
+    get_models_cache,
+    load_embedding,
+    load_tagger,
+    map_array,
+    weights_cache_dir,
+)
+
+
+@pytest.mark.parametrize(
+    "value,expected_models_cache",
+    [(None, None), ("", None), ("/tmp/khl_models", "/tmp/khl_models")],
+)
+def test_get_models_cache(monkeypatch, value, expected_models_cache):
+    if value is None:
+        monkeypatch.delenv("KHL_MODELS_CACHE", raising=False)
+    else:
+        monkeypatch.setenv("KHL_MODELS_CACHE", value)
+    models_cache = get_models_cache()
+    assert (None if models_cache is None else str(models_cache)) == (
+        expected_models_cache
+    )
+
+
+def test_map_array(tmp_path):
+    path = tmp_path / "cache" / "array.npy"
+    array = np.arange(12, dtype=np.float32).reshape(3, 4)
+    mapped = map_array(path, array)
+    assert isinstance(mapped, np.memmap)
+    assert not mapped.flags.writeable
+    assert np.array_equal(mapped, array)
+    assert [file.name for file in path.parent.iterdir()] == ["array.npy"]
+    # Файл другой формы перезаписывается
+    other = np.arange(3, dtype=np.uint8)
+    assert np.array_equal(map_array(path, other), other)
+
+
+def test_tagger_shares_words_vocab_with_embedding():
+    words_vocab = utils.ner_tagger.infer.encoder.words_vocab
+    assert words_vocab.items is utils.emb.vocab.words
+    assert words_vocab.item_ids is utils.emb.vocab.word_ids
+
+
+def test_load_from_models_cache(tmp_path):
+    emb = load_embedding(tmp_path)
+    ner_tagger = load_tagger(NewsNERTagger, emb, tmp_path)
+    assert isinstance(emb.pq.indexes, np.memmap)
+    assert all(
+        isinstance(weight.array, np.memmap)
+        for weight in ner_tagger.infer.model.weights
+        if weight.array is not None
+    )
+    text = "Сегодня Иван Иванов забил гол в Москве за 'Спартак'"
+    assert ner_tagger(text).spans == utils.ner_tagger(text).spans
+    assert [directory.name for directory in tmp_path.iterdir()] == [
+        weights_cache_dir(tmp_path).name
+    ]
+
+
+def test_weights_cache_dir_depends_on_versions(monkeypatch, tmp_path):
+    weights_dir = weights_cache_dir(tmp_path)
+    assert weights_dir.parent == tmp_path
+    assert "natasha-1.4.0" in weights_dir.name
+    monkeypatch.setattr(
+        "khl.models.version",
+        lambda package: "9.9" if package == "slovnet" else "1.0",
+    )
+    assert weights_cache_dir(tmp_path).name == "natasha-1.0-slovnet-9.9-navec-1.0"
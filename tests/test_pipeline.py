@@ -0,0 +1,342 @@
+"""Тесты конвейера, в том числе его потокобезопасности."""
+
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from razdel import sentenize, tokenize
+
+from khl import pipeline as pipeline_module
+from khl import preprocess, text_to_codes, texts_to_codes, utils
+from khl.metrics import MetricsRegistry
+from khl.pipeline import EncodedText, Pipeline
+from khl.preprocess import (
+    UNKNOWN,
+    LemmaCache,
+    _tokenize,
+    fix_lemma,
+    get_coder,
+    morph_vocab,
+)
+from khl.staged import StagedExecutor
+from khl.synthetic import synthetic_corpus
+from khl.utils import regex_step
+from tests.test_khl import test_frequency_dictionary_file, tests_dir
+
+TEXTS = [
+    "Андрей Педан не сыграет против 'Спартака'",
+    "1 апреля 2023 года в матче ⅛ финала против „Спартака” Иван Иванов забил гол.",
+    "«Динамо Мск» - «Спартак» 2:1 ОТ (1:0 0:1 0:0 1:0) Голы забили: Иванов, Петров.",
+    "Уральская проверка",
+    "В матче судьи выписали два удаления '5+20'. Матч прошел 12 января в Казани.",
+    "",
+]
+THREADS = 8
+
+
+@pytest.mark.parametrize("max_len", [None, 7])
+@pytest.mark.parametrize("stop_words_", [None, ["и", "в", "."]])
+@pytest.mark.parametrize("ner_mode", ["neural", "gazetteer"])
+@pytest.mark.parametrize(
+    "replace_ners_,replace_dates_,replace_penalties_",
+    [(True, True, True), (False, True, False), (True, False, True)],
+)
+def test_pipeline(
+    coder,
+    max_len,
+    stop_words_,
+    ner_mode,
+    replace_ners_,
+    replace_dates_,
+    replace_penalties_,
+):
+    pipeline = Pipeline(
+        coder,
+        stop_words=stop_words_,
+        replace_ners=replace_ners_,
+        replace_dates=replace_dates_,
+        replace_penalties=replace_penalties_,
+        max_len=max_len,
+        ner_mode=ner_mode,
+        chunk_size=4,
+    )
+    expected = [
+        text_to_codes(
+            text,
+            coder,
+            stop_words_,
+            replace_ners_,
+            replace_dates_,
+            replace_penalties_,
+            max_len=max_len,
+            ner_mode=ner_mode,
+        )
+        for text in TEXTS
+    ]
+    assert [pipeline(text) for text in TEXTS] == expected
+    assert list(pipeline.map(iter(TEXTS))) == expected
+    assert pipeline.batch(TEXTS) == expected
+
+
+@pytest.mark.parametrize("max_text_len", [None, 100, 200])
+@pytest.mark.parametrize("workers", [1, 3])
+def test_pipeline_long_texts(coder, max_text_len, workers):
+    texts = [" ".join(TEXTS[:3]), " ".join(TEXTS) * 3, TEXTS[3]]
+    pipeline = Pipeline(coder, max_text_len=max_text_len, workers=workers)
+    expected = Pipeline(coder, max_text_len=None).batch(texts)
+    assert [pipeline(text) for text in texts] == expected
+    assert pipeline.batch(texts) == expected
+
+
+def test_pipeline_very_long_text_not_split_by_default(coder):
+    # Фрагмент начинается с 'Подготовка - о ...': упрощение начала текста
+    # заменило бы это слово на per
+    text = (
+        "Хоккеисты провели тяжелую тренировку на льду перед важной игрой сезона. " * 69
+        + "Подготовка - о главном в новом сезоне. "
+        + " ".join(TEXTS)
+    )
+    assert len(text) > 5_000
+    expected = Pipeline(coder, exclude_unknown=False, max_text_len=None)(text)
+    assert Pipeline(coder, exclude_unknown=False)(text) == expected
+    assert text_to_codes(text, coder, exclude_unknown=False) == expected
+    assert list(texts_to_codes([text], coder, exclude_unknown=False)) == [expected]
+    chunked = Pipeline(coder, exclude_unknown=False, max_text_len=5_000)(text)
+    assert chunked != expected
+
+
+@pytest.mark.parametrize("max_len", [None, 7])
+def test_pipeline_morph_mode_gated(coder, max_len):
+    texts = TEXTS + [" ".join(TEXTS)]
+    pipeline = Pipeline(coder, max_len=max_len, morph_mode="gated")
+    expected = Pipeline(coder, max_len=max_len).batch(texts)
+    assert pipeline.batch(texts) == expected
+    assert text_to_codes(
+        texts[1], coder, max_len=max_len, morph_mode="gated"
+    ) == text_to_codes(texts[1], coder, max_len=max_len)
+
+
+def _pretokenized(text):
+    return [
+        [token.text for token in tokenize(sentence.text)]
+        for sentence in sentenize(text)
+    ]
+
+
+@pytest.mark.parametrize("ner_mode", ["neural", "gazetteer"])
+@pytest.mark.parametrize("max_len", [None, 7])
+def test_pipeline_pretokenized(coder, ner_mode, max_len):
+    texts = TEXTS + [" ".join(TEXTS)]
+    pipeline = Pipeline(coder, max_len=max_len, ner_mode=ner_mode, pretokenized=True)
+    expected = Pipeline(coder, max_len=max_len, ner_mode=ner_mode).batch(texts)
+    sentences = [_pretokenized(text) for text in texts]
+    assert [pipeline(text_sentences) for text_sentences in sentences] == expected
+    assert pipeline.batch(sentences) == expected
+    assert text_to_codes(sentences[1], coder, max_len=max_len) == text_to_codes(
+        texts[1], coder, max_len=max_len
+    )
+
+
+def test_pipeline_pretokenized_errors(coder):
+    with pytest.raises(TypeError):
+        Pipeline(coder, pretokenized=True)(TEXTS[0])
+    with pytest.raises(TypeError):
+        Pipeline(coder)(_pretokenized(TEXTS[0]))
+    with pytest.raises(ValueError):
+        Pipeline(coder, max_len=5, incremental=True, pretokenized=True)
+
+
+def test_pipeline_trigger_stats(coder):
+    trigger_stats = utils.TriggerStats()
+    pipeline = Pipeline(coder, trigger_stats=trigger_stats)
+    assert pipeline.batch(TEXTS) == Pipeline(coder).batch(TEXTS)
+    assert trigger_stats.checked["fix_covid"] == len(TEXTS)
+    assert trigger_stats.skip_rates()["fix_covid"] == 1.0
+
+
+def test_pipeline_hash_buckets():
+    coder = get_coder(
+        tests_dir / test_frequency_dictionary_file, max_lemmas=8, hash_buckets=16
+    )
+    pipeline = Pipeline(coder, exclude_unknown=False, hash_buckets=16)
+    codes = pipeline.batch(TEXTS)
+    assert codes == [
+        text_to_codes(text, coder, exclude_unknown=False, hash_buckets=16)
+        for text in TEXTS
+    ]
+    assert coder[UNKNOWN] not in {code for text_codes in codes for code in text_codes}
+    assert len({code for text_codes in codes for code in text_codes}) > 10
+
+
+def test_texts_to_codes_metrics_collectors(coder):
+    metrics = MetricsRegistry()
+    for _ in range(50):
+        list(texts_to_codes(TEXTS[:2], coder, metrics=metrics))
+    Pipeline(coder, metrics=metrics, lemma_cache=LemmaCache())
+    assert len(metrics._collectors) == 2
+    assert metrics.as_dict()["texts"] == 100
+
+
+def test_pipeline_metrics(coder):
+    metrics = MetricsRegistry()
+    lemma_cache = LemmaCache()
+    pipeline = Pipeline(coder, metrics=metrics, lemma_cache=lemma_cache)
+    codes = pipeline.batch(TEXTS)
+    assert codes == Pipeline(coder).batch(TEXTS)
+    assert pipeline(TEXTS[0]) == codes[0]
+    collected = metrics.as_dict()
+    assert collected["texts"] == len(TEXTS) + 1
+    assert collected["characters"] == sum(map(len, TEXTS)) + len(TEXTS[0])
+    assert collected["codes"] == sum(map(len, codes)) + len(codes[0])
+    assert collected["texts_in_progress"] == 0
+    for stage in ["unify", "simplify", "dates", "encode"]:
+        assert collected[f"{stage}_seconds"]["count"] == len(TEXTS) + 1
+    for stage in ["ner", "lemmatize"]:
+        assert collected[f"{stage}_seconds"]["count"] == 2
+    assert collected["lemma_cache_hits"] == lemma_cache.hits > 0
+    assert collected["lemma_cache_misses"] == lemma_cache.misses == len(lemma_cache)
+    assert "khl_lemma_cache_hits_total" in metrics.to_prometheus()
+
+
+@pytest.mark.parametrize("budget_ms", [None, 1e9])
+def test_pipeline_budget_enough(coder, budget_ms):
+    pipeline = Pipeline(coder, budget_ms=budget_ms)
+    assert list(pipeline.encode_map(TEXTS)) == [
+        EncodedText(codes, ()) for codes in Pipeline(coder).batch(TEXTS)
+    ]
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_pipeline_budget_exhausted(coder, incremental):
+    metrics = MetricsRegistry()
+    pipeline = Pipeline(
+        coder, max_len=10, incremental=incremental, metrics=metrics, budget_ms=0
+    )
+    expected_codes = Pipeline(
+        coder, max_len=10, replace_dates=False, ner_mode="gazetteer"
+    ).batch(TEXTS)
+    assert list(pipeline.encode_map(TEXTS)) == [
+        EncodedText(codes, ("skip_dates", "gazetteer_ners")) for codes in expected_codes
+    ]
+    assert pipeline(TEXTS[0]) == expected_codes[0]
+    assert metrics.counter("degraded_skip_dates").value == len(TEXTS) + 1
+    assert metrics.counter("degraded_gazetteer_ners").value == len(TEXTS) + 1
+
+
+def test_pipeline_budget_skip_dates_only(coder, monkeypatch):
+    monkeypatch.setattr(pipeline_module, "DATES_SECONDS_PER_CHAR", 1.0)
+    pipeline = Pipeline(coder, budget_ms=10_000)
+    expected_codes = Pipeline(coder, replace_dates=False).batch(TEXTS)
+    assert [pipeline.encode(text) for text in TEXTS] == [
+        EncodedText(codes, ("skip_dates",) if text else ())
+        for text, codes in zip(TEXTS, expected_codes)
+    ]
+
+
+def test_pipeline_budget_gazetteer_for_later_chunks(coder, monkeypatch):
+    monkeypatch.setattr(pipeline_module, "NER_SECONDS_PER_CHAR", 1.0)
+    monkeypatch.setattr(pipeline_module, "DATES_SECONDS_PER_CHAR", 0.0)
+    chunk = TEXTS[0] + "."
+    text = f"{chunk} {chunk}"
+    pipeline = Pipeline(
+        coder, replace_dates=False, max_text_len=len(chunk), budget_ms=len(chunk) * 1500
+    )
+    expected_codes = Pipeline(coder, replace_dates=False, max_text_len=len(chunk))(
+        f"{chunk} {utils.replace_ners_by_gazetteer(chunk)}"
+    )
+    expected = EncodedText(expected_codes, ("gazetteer_ners",))
+    assert pipeline.encode(text) == expected
+    assert list(pipeline.encode_map([text, text])) == [expected, expected]
+
+
+def test_pipeline_budget_per_text_in_batch(coder, monkeypatch):
+    # Оценка времени замены ner'ов в каждом тексте - около 0.1 с, а всех
+    # текстов батча вместе - в несколько раз больше budget_ms
+    texts = synthetic_corpus(32, min_size=500, max_size=1_000, seed=3)
+    monkeypatch.setattr(pipeline_module, "NER_SECONDS_PER_CHAR", 1e-4)
+    pipeline = Pipeline(coder, budget_ms=1_000)
+    expected = [pipeline.encode(text) for text in texts]
+    assert all(not encoded.degradations for encoded in expected)
+    assert list(pipeline.encode_map(texts)) == expected
+    assert list(StagedExecutor(pipeline).encode_map(texts)) == expected
+    assert list(texts_to_codes(texts, coder, budget_ms=1_000)) == [
+        encoded.codes for encoded in expected
+    ]
+
+
+@pytest.mark.parametrize("max_text_len", [None, 20])
+def test_pipeline_stages(coder, max_text_len):
+    metrics = MetricsRegistry()
+    pipeline = Pipeline(coder, max_len=10, max_text_len=max_text_len, metrics=metrics)
+    pipeline.texts_started(len(TEXTS))
+    assert metrics.as_dict()["texts_in_progress"] == len(TEXTS)
+    preludes = [pipeline.prelude_stage(text) for text in TEXTS]
+    encoded = pipeline.morph_stage(pipeline.ner_stage(preludes))
+    pipeline.texts_finished(TEXTS, encoded)
+    assert encoded == list(
+        Pipeline(coder, max_len=10, max_text_len=max_text_len).encode_map(TEXTS)
+    )
+    collected = metrics.as_dict()
+    assert collected["texts_in_progress"] == 0
+    assert collected["texts"] == len(TEXTS)
+    assert collected["codes"] == sum(len(text.codes) for text in encoded)
+
+
+def test_incremental_pipeline(coder):
+    text = " ".join(TEXTS * 10)
+    pipeline = Pipeline(coder, max_len=10, incremental=True)
+    expected = text_to_codes(text, coder, max_len=10)
+    assert pipeline(text) == expected
+    assert pipeline.batch([text, text]) == [expected, expected]
+
+
+@pytest.mark.parametrize("ner_mode", ["neural", "gazetteer"])
+def test_pipeline_threaded_stress(coder, ner_mode):
+    pipeline = Pipeline(coder, ner_mode=ner_mode)
+    expected = {text: text_to_codes(text, coder, ner_mode=ner_mode) for text in TEXTS}
+    texts = random.Random(0).choices(TEXTS, k=400)
+    with ThreadPoolExecutor(THREADS) as executor:
+        results = list(
+            executor.map(
+                pipeline,
+                texts,
+            )
+        )
+    assert results == [expected[text] for text in texts]
+    # Пакетная обработка из нескольких потоков одновременно
+    with ThreadPoolExecutor(THREADS) as executor:
+        batches = list(
+            executor.map(
+                lambda start: pipeline.batch(texts[start : start + 50]),
+                range(0, len(texts), 50),
+            )
+        )
+    assert [codes for batch in batches for codes in batch] == results
+
+
+def test_lemma_cache_threaded_stress():
+    tokens = _tokenize(" ".join(TEXTS))
+    expected = []
+    for token in tokens:
+        token.lemmatize(morph_vocab)
+        expected.append(fix_lemma(token.lemma))
+    lemma_cache = LemmaCache(max_size=10)
+    with ThreadPoolExecutor(THREADS) as executor:
+        results = list(
+            executor.map(lambda _: list(map(lemma_cache.lemmatize, tokens)), range(50))
+        )
+    assert all(lemmas == expected for lemmas in results)
+    assert len(lemma_cache) == 10
+
+
+def test_pipeline_with_steps_config(coder):
+    params = {
+        "disabled_steps": ["delete_parentheses_content", "replace_dates"],
+        "insert_after": {"fix_covid": [regex_step("шайбу", "гол")]},
+    }
+    pipeline = Pipeline(coder, **params)
+    for text in TEXTS:
+        assert pipeline(text) == preprocess.lemmatize_to_codes(
+            utils.simplify(utils.unify(text), **params), coder
+        )
+    assert pipeline.batch(TEXTS) == [pipeline(text) for text in TEXTS]
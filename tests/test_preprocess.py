@@ -1,13 +1,19 @@
 """Юнит-тесты для функций предобработки хоккейных новостей."""
 
+import json
 from pathlib import Path
 
+import numpy as np
 import pytest
+from natasha.morph.lemma import normal_word
+from razdel import sentenize, tokenize
 
 from khl import stop_words
+from khl.hockey_forms import hockey_forms
 from khl.preprocess import (
     PLACEHOLDER,
     UNKNOWN,
+    LemmasVocabulary,
     _merge_codes,
     _merge_dates,
     _merge_lemmas,
@@ -16,12 +22,23 @@ from khl.preprocess import (
     _merge_orgs,
     _merge_pens,
     _merge_pers,
+    _tokenize_batch,
+    _unambiguous_lemma,
+    bucket_lemma,
     codes_to_lemmas,
+    codes_to_lemmas_batch,
+    codes_to_texts_batch,
     fix_lemma,
+    form_lemmas,
     get_coder,
+    hash_bucket,
     lemmas_to_codes,
     lemmatize,
+    lemmatize_chunks_to_codes_batch,
+    lemmatize_to_codes,
+    lemmatize_to_codes_batch,
 )
+from khl.utils import morph_vocab
 
 tests_dir = Path(__file__).parent
 test_frequency_dictionary_file = "example_frequency_dictionary.json"
@@ -268,6 +285,89 @@ def test_lemmatize_with_default_params(source_text, expected_lemmas):
     assert lemmatize(source_text) == expected_lemmas
 
 
+@pytest.mark.parametrize(
+    "source_text",
+    [
+        "1 мая Морозов и Семин забили много голов от борта",
+        "per и per забили по голу. Матч прошел в loc!",
+        "",
+    ],
+)
+@pytest.mark.parametrize("stop_words_", [None, ["и", "много", "от", "."]])
+def test_lemmatize_pretokenized(source_text, stop_words_):
+    sentences = [
+        [token.text for token in tokenize(sentence.text)]
+        for sentence in sentenize(source_text)
+    ]
+    expected_lemmas = lemmatize(source_text, stop_words_)
+    assert lemmatize(sentences, stop_words_) == expected_lemmas
+    assert lemmatize([[]] + sentences + [[]], stop_words_) == expected_lemmas
+
+
+@pytest.mark.parametrize(
+    "word,expected_lemmas",
+    [
+        ("матч", {"матч"}),
+        ("Матчей", {"матч"}),
+        ("голов", {"гол"}),
+        ("голы", {"гол"}),
+        ("Втором", {"второй"}),
+        ("Следующей", {"следовать", "следующий"}),
+        ("ему", {"он", "оно"}),
+        ("подсели", {"подсесть", "подселить"}),
+        ("это", {"это", "этот"}),
+        ("per", {"per"}),
+        (".", {"."}),
+    ],
+)
+def test_form_lemmas(word, expected_lemmas):
+    assert form_lemmas(word) == expected_lemmas
+
+
+def test_hockey_forms_frequencies():
+    with open(tests_dir.parent / "data" / "frequency_dictionary.json") as fr:
+        frequencies = json.load(fr)
+    for form, lemma in hockey_forms.items():
+        other_lemmas = {
+            fix_lemma(normal_word(parse.normal)) for parse in morph_vocab(form)
+        } - {lemma}
+        assert other_lemmas
+        for other_lemma in other_lemmas:
+            assert frequencies.get(other_lemma, 0) * 100 < frequencies[lemma]
+
+
+@pytest.mark.parametrize(
+    "word,stop_words_,expected_lemma",
+    [
+        ("матч", None, "матч"),
+        ("подсели", None, None),
+        ("это", None, None),
+        ("это", ["это", "этот"], "это"),
+        ("это", ["это"], None),
+    ],
+)
+def test_unambiguous_lemma(word, stop_words_, expected_lemma):
+    assert _unambiguous_lemma(word, stop_words_) == expected_lemma
+
+
+def test_tokenize_batch_gated():
+    texts = ["Голы забили per и per.", "Команда подсели в конце."]
+    neural_tokens = _tokenize_batch(texts)
+    gated_tokens = _tokenize_batch(texts, morph_mode="gated")
+    assert [token.pos for token in gated_tokens[0]] == [None] * 6
+    assert [token.lemma for token in gated_tokens[0]] == [
+        "гол",
+        "забить",
+        "per",
+        "и",
+        "per",
+        ".",
+    ]
+    assert [token.pos for token in gated_tokens[1]] == [
+        token.pos for token in neural_tokens[1]
+    ]
+
+
 @pytest.mark.parametrize(
     "source_codes,expected_codes",
     [
@@ -315,6 +415,36 @@ def test_get_coder(file_path):
     }
 
 
+def test_get_coder_with_max_lemmas_and_hash_buckets():
+    coder = get_coder(
+        tests_dir / test_frequency_dictionary_file, max_lemmas=3, hash_buckets=2
+    )
+    assert coder == {
+        PLACEHOLDER: 0,
+        UNKNOWN: 1,
+        ".": 2,
+        "и": 3,
+        "в": 4,
+        "???0": 5,
+        "???1": 6,
+    }
+
+
+@pytest.mark.parametrize(
+    "lemma,hash_buckets,expected_bucket",
+    [
+        ("шайба", 8, 5),
+        ("буллит", 8, 2),
+        ("вратарь", 8, 0),
+        ("шайба", 1, 0),
+        ("", 8, 0),
+    ],
+)
+def test_hash_bucket(lemma, hash_buckets, expected_bucket):
+    assert hash_bucket(lemma, hash_buckets) == expected_bucket
+    assert bucket_lemma(expected_bucket) == f"???{expected_bucket}"
+
+
 class TestLemmasCodes:
     coder = {
         PLACEHOLDER: 0,
@@ -344,6 +474,73 @@ class TestLemmasCodes:
             == expected_codes
         )
 
+    @pytest.mark.parametrize(
+        "text",
+        [
+            "",
+            "Сегодня московская команда забила красивый гол.",
+            "per per и per забили гол гол в ворота org org org loc",
+            "Команда, команда и еще раз команда забила date date pen pen.",
+        ],
+    )
+    @pytest.mark.parametrize("stop_words_", [None, stop_words])
+    @pytest.mark.parametrize(
+        "exclude_unknown,max_len",
+        [(False, None), (False, 3), (True, None), (True, 2), (True, 20), (True, 0)],
+    )
+    def test_lemmatize_to_codes(self, text, stop_words_, exclude_unknown, max_len):
+        coder = {**self.coder, "per": 7, "pers": 8, "orgs": 9, "dates": 10}
+        assert lemmatize_to_codes(
+            text, coder, stop_words_, exclude_unknown, max_len
+        ) == lemmas_to_codes(
+            lemmatize(text, stop_words_), coder, exclude_unknown, max_len
+        )
+
+    @pytest.mark.parametrize("bucket_size", [1, 2, 256])
+    def test_lemmatize_to_codes_batch(self, bucket_size):
+        texts = [
+            "",
+            "Сегодня московская команда забила красивый гол. Гол!",
+            "per per и per забили гол гол в ворота org org org loc",
+            "Команда, команда и еще раз команда забила date date pen pen.",
+        ]
+        coder = {**self.coder, "per": 7, "pers": 8, "orgs": 9, "dates": 10}
+        assert lemmatize_to_codes_batch(
+            texts, coder, stop_words, True, 5, bucket_size
+        ) == [lemmatize_to_codes(text, coder, stop_words, True, 5) for text in texts]
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_lemmatize_chunks_to_codes_batch(self, workers):
+        texts_chunks = [
+            [""],
+            ["Сегодня московская команда забила гол.", "Гол!"],
+            ["per per и per.", "per забили гол.", "Гол в ворота org.", "org loc"],
+            ["Команда, команда.", "Команда забила date.", "date pen.", "pen."],
+        ]
+        coder = {**self.coder, "per": 7, "pers": 8, "orgs": 9, "dates": 10}
+        assert lemmatize_chunks_to_codes_batch(
+            texts_chunks, coder, stop_words, True, 5, workers=workers
+        ) == lemmatize_to_codes_batch(
+            [" ".join(text_chunks) for text_chunks in texts_chunks],
+            coder,
+            stop_words,
+            True,
+            5,
+        )
+
+    @pytest.mark.parametrize("stop_words_", [None, stop_words])
+    def test_lemmatize_chunks_to_codes_batch_gated(self, stop_words_):
+        texts_chunks = [
+            [""],
+            ["Сегодня московская команда забила гол.", "Гол!"],
+            ["per per и per.", "per забили гол.", "Гол в ворота org.", "org loc"],
+            ["Следующий матч команда проведет date.", "Голы забили per и per."],
+        ]
+        coder = {**self.coder, "per": 7, "pers": 8, "orgs": 9, "dates": 10}
+        assert lemmatize_chunks_to_codes_batch(
+            texts_chunks, coder, stop_words_, morph_mode="gated"
+        ) == lemmatize_chunks_to_codes_batch(texts_chunks, coder, stop_words_)
+
     def test_lemmas_to_codes_with_default_params(self):
         expected_codes = [6, 3, 4, 5, 2]
         assert lemmas_to_codes(self.lemmas, self.coder) == expected_codes
@@ -361,3 +558,78 @@ class TestLemmasCodes:
     )
     def test_codes_to_lemmas(self, codes, expected_lemmas):
         assert codes_to_lemmas(codes, self.coder) == expected_lemmas
+
+    @pytest.mark.parametrize(
+        "codes,offsets",
+        [
+            (np.array([[0, 0, 6, 3], [0, 0, 0, 0], [1, 4, 5, 2]]), None),
+            ([[0, 0, 6, 3], [0, 0, 0, 0], [1, 4, 5, 2]], None),
+            (np.array([0, 6, 3, 1, 4, 5, 2], dtype=np.uint16), [0, 3, 3, 7]),
+            ([6, 3, 1, 4, 5, 2], np.array([0, 2, 2, 6])),
+        ],
+    )
+    def test_codes_to_lemmas_batch(self, codes, offsets):
+        vocabulary = LemmasVocabulary(self.coder)
+        expected_lemmas = [
+            ["московский", "команда"],
+            [],
+            ["???", "забить", "гол", "."],
+        ]
+        assert codes_to_lemmas_batch(codes, vocabulary, offsets) == expected_lemmas
+        assert codes_to_texts_batch(codes, vocabulary, offsets) == [
+            "московский команда",
+            "",
+            "??? забить гол .",
+        ]
+        assert codes_to_texts_batch(codes, vocabulary, offsets, separator="") == [
+            "московскийкоманда",
+            "",
+            "???забитьгол.",
+        ]
+
+    def test_codes_to_lemmas_batch_matches_codes_to_lemmas(self):
+        codes = np.random.default_rng(0).integers(0, 7, size=(50, 9))
+        vocabulary = LemmasVocabulary(self.coder)
+        expected_lemmas = [
+            [
+                lemma
+                for lemma in codes_to_lemmas(row, self.coder)
+                if lemma != PLACEHOLDER
+            ]
+            for row in codes.tolist()
+        ]
+        assert codes_to_lemmas_batch(codes, vocabulary) == expected_lemmas
+        assert codes_to_texts_batch(codes, vocabulary, separator="|") == [
+            "|".join(lemmas) for lemmas in expected_lemmas
+        ]
+
+    @pytest.mark.parametrize(
+        "exclude_unknown,expected_codes",
+        [(True, [7, 10]), (False, [8, 7, 9, 10, 7])],
+    )
+    def test_lemmas_to_codes_with_hash_buckets(self, exclude_unknown, expected_codes):
+        coder = {**self.coder, "???0": 7, "???1": 8, "???2": 9, "???3": 10}
+        lemmas = ["шайба", "???0", "буллит", "???3", "вратарь"]
+        assert (
+            lemmas_to_codes(lemmas, coder, exclude_unknown, hash_buckets=4)
+            == expected_codes
+        )
+
+    def test_lemmatize_to_codes_with_hash_buckets(self):
+        coder = get_coder(
+            tests_dir / test_frequency_dictionary_file, max_lemmas=8, hash_buckets=4
+        )
+        text = "Вратарь отбил буллит, а шайба попала в штангу."
+        codes = lemmatize_to_codes(text, coder, None, False, 12, hash_buckets=4)
+        assert codes == lemmas_to_codes(
+            lemmatize(text, None), coder, False, 12, hash_buckets=4
+        )
+        assert set(codes_to_lemmas(codes, coder)) - {PLACEHOLDER, ".", "в"} <= {
+            "???0",
+            "???1",
+            "???2",
+            "???3",
+        }
+        assert lemmatize_to_codes_batch(
+            [text], coder, None, False, 12, hash_buckets=4
+        ) == [codes]
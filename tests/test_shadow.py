@@ -0,0 +1,123 @@
+"""Тесты теневой проверки быстрых путей обработки текстов."""
+
+import json
+import threading
+from functools import partial
+
+import pytest
+
+from khl import text_to_codes
+from khl.metrics import MetricsRegistry
+from khl.pipeline import Pipeline
+from khl.shadow import ShadowVerifier, _first_difference
+from khl.staged import StagedExecutor
+from tests.test_pipeline import TEXTS
+
+
+@pytest.mark.parametrize(
+    "codes,expected_codes,expected_position",
+    [
+        ([1, 2, 3], [1, 2, 4], 2),
+        ([1, 2, 3], [5, 2, 3], 0),
+        ([1, 2], [1, 2, 3], 2),
+        ([1, 2, 3], [1], 1),
+        ([], [1], 0),
+    ],
+)
+def test_first_difference(codes, expected_codes, expected_position):
+    assert _first_difference(codes, expected_codes) == expected_position
+
+
+def test_shadow_verifier():
+    metrics = MetricsRegistry()
+    reference = lambda text: [len(text)] if len(text) % 3 else [len(text), 0]
+    with ShadowVerifier(reference, 1.0, metrics, max_examples=2) as verifier:
+        for length in range(10):
+            verifier.submit("a" * length, [length])
+        verifier.join()
+        assert verifier.checked == 10
+        assert verifier.diverged == 4
+        assert verifier.divergence_rate == 0.4
+        assert [diff.text for diff in verifier.examples] == ["a" * 6, "a" * 9]
+        assert verifier.examples[-1].expected_codes == [9, 0]
+        assert verifier.examples[-1].position == 1
+    examples = verifier.examples
+    examples.clear()
+    assert len(verifier.examples) == 2
+    report = json.loads(json.dumps(verifier.report()))
+    assert report["checked"] == 10
+    assert report["divergence_rate"] == 0.4
+    assert report["examples"] == [
+        {"text": "a" * 6, "codes": [6], "expected_codes": [6, 0], "position": 1},
+        {"text": "a" * 9, "codes": [9], "expected_codes": [9, 0], "position": 1},
+    ]
+    values = metrics.as_dict()
+    assert values["shadow_checked"] == 10
+    assert values["shadow_diverged"] == 4
+    assert values["shadow_reference_seconds"]["count"] == 10
+    assert "khl_shadow_diverged_total 4" in metrics.to_prometheus()
+
+
+def test_shadow_verifier_sampling():
+    verifier = ShadowVerifier(lambda text: [], 0.25, seed=1)
+    for _ in range(400):
+        verifier.submit("текст", [])
+    verifier.close()
+    assert 60 < verifier.checked < 140
+    assert verifier.divergence_rate == 0.0
+    verifier = ShadowVerifier(lambda text: [], 0.0)
+    verifier.submit("текст", [])
+    assert verifier._thread is None
+    assert verifier.divergence_rate == 0.0
+
+
+def test_shadow_verifier_dropped_and_errors():
+    release = threading.Event()
+
+    def reference(text):
+        release.wait()
+        if text == "ошибка":
+            raise RuntimeError(text)
+        return []
+
+    verifier = ShadowVerifier(reference, 1.0, queue_size=1)
+    for text in ["ошибка", "текст", "текст", "текст"]:
+        verifier.submit(text, [])
+    release.set()
+    verifier.close()
+    report = verifier.report()
+    assert report["errors"] == 1
+    assert report["dropped"] >= 1
+    assert report["checked"] + report["errors"] + report["dropped"] == 4
+
+
+def test_pipeline_shadow(coder):
+    verifier = ShadowVerifier(partial(text_to_codes, coder=coder), 1.0)
+    pipeline = Pipeline(coder, shadow=verifier, chunk_size=4)
+    pipeline.batch(TEXTS)
+    pipeline(TEXTS[1])
+    list(StagedExecutor(pipeline).map(TEXTS))
+    verifier.close()
+    assert verifier.checked == 2 * len(TEXTS) + 1
+    assert verifier.diverged == 0
+
+
+def test_pipeline_shadow_divergence(coder):
+    # Фрагменты из нескольких слов меняют контекст нейронных моделей
+    verifier = ShadowVerifier(partial(text_to_codes, coder=coder), 1.0)
+    pipeline = Pipeline(coder, shadow=verifier, max_text_len=20)
+    codes = pipeline.batch(TEXTS)
+    verifier.close()
+    assert verifier.checked == len(TEXTS)
+    assert verifier.diverged > 0
+    for diff in verifier.examples:
+        assert diff.codes == codes[TEXTS.index(diff.text)]
+        assert diff.expected_codes == text_to_codes(diff.text, coder)
+        assert diff.codes[: diff.position] == diff.expected_codes[: diff.position]
+
+
+def test_pipeline_shadow_skips_degraded(coder):
+    verifier = ShadowVerifier(partial(text_to_codes, coder=coder), 1.0)
+    Pipeline(coder, shadow=verifier, budget_ms=0).batch(TEXTS)
+    verifier.close()
+    assert verifier.checked == 0
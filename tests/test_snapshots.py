@@ -0,0 +1,78 @@
+"""Тесты сохранения кэша лемм между перезапусками."""
+
+import json
+import zlib
+
+import pytest
+
+from khl import text_to_codes
+from khl.pipeline import Pipeline
+from khl.preprocess import LemmaCache
+from khl.snapshots import (
+    LemmaCacheSnapshots,
+    load_lemma_cache,
+    save_lemma_cache,
+    snapshot_versions,
+)
+from tests.test_pipeline import TEXTS
+
+
+@pytest.fixture(scope="module")
+def warm_cache(coder):
+    cache = LemmaCache()
+    list(Pipeline(coder, lemma_cache=cache).map(TEXTS))
+    return cache
+
+
+def test_snapshot_versions():
+    versions = snapshot_versions()
+    assert set(versions) == {"khl", "natasha", "pymorphy2", "wrong_lemmas"}
+    assert versions == snapshot_versions()
+
+
+def test_save_and_load_lemma_cache(tmp_path, warm_cache):
+    path = tmp_path / "lemmas.snapshot"
+    assert save_lemma_cache(path, warm_cache) == len(warm_cache) > 0
+    assert list(tmp_path.iterdir()) == [path]
+    cache = LemmaCache()
+    assert load_lemma_cache(path, cache) == len(warm_cache)
+    assert sorted(cache.items()) == sorted(warm_cache.items())
+    assert load_lemma_cache(path, cache) == 0
+    small_cache = LemmaCache(max_size=3)
+    assert load_lemma_cache(path, small_cache) == 3
+
+
+def test_loaded_cache_hits(tmp_path, coder, warm_cache):
+    path = tmp_path / "lemmas.snapshot"
+    save_lemma_cache(path, warm_cache)
+    cache = LemmaCache()
+    load_lemma_cache(path, cache)
+    pipeline = Pipeline(coder, lemma_cache=cache)
+    assert list(pipeline.map(TEXTS)) == [text_to_codes(text, coder) for text in TEXTS]
+    assert cache.misses == 0
+    assert cache.hits > 0
+
+
+def test_load_rejects_stale_or_broken_snapshot(tmp_path, warm_cache):
+    path = tmp_path / "lemmas.snapshot"
+    cache = LemmaCache()
+    assert load_lemma_cache(path, cache) == 0
+    save_lemma_cache(path, warm_cache)
+    snapshot = json.loads(zlib.decompress(path.read_bytes()))
+    snapshot["versions"]["wrong_lemmas"] = "00000000"
+    path.write_bytes(zlib.compress(json.dumps(snapshot).encode("utf-8")))
+    assert load_lemma_cache(path, cache) == 0
+    path.write_bytes(b"not a snapshot")
+    assert load_lemma_cache(path, cache) == 0
+    assert len(cache) == 0
+
+
+def test_lemma_cache_snapshots(tmp_path, warm_cache):
+    path = tmp_path / "lemmas.snapshot"
+    with LemmaCacheSnapshots(path, warm_cache) as snapshots:
+        assert snapshots.loaded == 0
+    cache = LemmaCache()
+    with LemmaCacheSnapshots(path, cache, interval=0.01) as snapshots:
+        assert snapshots.loaded == len(warm_cache)
+        assert len(cache) == len(warm_cache)
+    assert load_lemma_cache(path, LemmaCache()) == len(warm_cache)
@@ -0,0 +1,84 @@
+"""Тесты поэтапной обработки текстов."""
+
+import pytest
+from razdel import sentenize, tokenize
+
+from khl.metrics import MetricsRegistry
+from khl.pipeline import Pipeline
+from khl.staged import STAGES, StageConfig, StagedExecutor
+from khl.synthetic import synthetic_corpus
+
+TEXTS = synthetic_corpus(40, max_size=3_000, seed=1) + ["", "Уральская проверка"]
+
+
+@pytest.fixture(scope="module")
+def expected(coder):
+    return Pipeline(coder, max_text_len=1_000).batch(TEXTS)
+
+
+@pytest.mark.parametrize(
+    "prelude,ner,morph,queue_size",
+    [
+        (StageConfig(), StageConfig(), StageConfig(), 256),
+        (StageConfig(1, 1), StageConfig(1, 1), StageConfig(1, 1), 1),
+        (StageConfig(2, 3), StageConfig(3, 5), StageConfig(2, 7), 4),
+    ],
+)
+def test_staged_executor(coder, expected, prelude, ner, morph, queue_size):
+    metrics = MetricsRegistry()
+    pipeline = Pipeline(coder, max_text_len=1_000, metrics=metrics)
+    executor = StagedExecutor(pipeline, prelude, ner, morph, queue_size)
+    assert list(executor.map(TEXTS)) == expected
+    assert list(executor.map(iter(TEXTS[:3]))) == expected[:3]
+    assert list(executor.map([])) == []
+    for name in STAGES:
+        assert executor.stats[name].documents == len(TEXTS) + 3
+        assert executor.stats[name].batches >= -(
+            -(len(TEXTS) + 3) // executor.configs[name].batch_size
+        )
+    utilization = executor.utilization()
+    assert list(utilization) == list(STAGES)
+    assert all(0.0 < value <= 1.0 for value in utilization.values())
+    values = metrics.as_dict()
+    assert values["texts"] == len(TEXTS) + 3
+    assert values["texts_in_progress"] == 0
+
+
+def test_staged_executor_close(coder, expected):
+    executor = StagedExecutor(Pipeline(coder, max_text_len=1_000), queue_size=2)
+    results = executor.map(TEXTS)
+    assert next(results) == expected[0]
+    results.close()
+    assert executor.stats["prelude"].documents < len(TEXTS)
+
+
+def test_staged_executor_errors(coder):
+    def texts():
+        yield from TEXTS[:5]
+        raise RuntimeError("Ошибка чтения")
+
+    executor = StagedExecutor(Pipeline(coder))
+    with pytest.raises(RuntimeError, match="Ошибка чтения"):
+        list(executor.map(texts()))
+    with pytest.raises(TypeError):
+        list(executor.map([TEXTS[0], None]))
+
+
+def test_staged_executor_config_errors(coder):
+    with pytest.raises(ValueError):
+        StagedExecutor(Pipeline(coder, max_len=5, incremental=True))
+    with pytest.raises(ValueError):
+        StagedExecutor(Pipeline(coder), ner=StageConfig(workers=0))
+    assert StagedExecutor(Pipeline(coder)).utilization() == dict.fromkeys(STAGES, 0.0)
+
+
+def test_staged_executor_pretokenized(coder):
+    sentences = [
+        [token.text for token in tokenize(sentence.text)]
+        for sentence in sentenize(TEXTS[0])
+    ]
+    pipeline = Pipeline(coder, pretokenized=True)
+    assert list(StagedExecutor(pipeline).map([sentences, []])) == [
+        pipeline(sentences),
+        [],
+    ]
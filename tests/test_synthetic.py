@@ -0,0 +1,60 @@
+"""Юнит-тесты для генератора синтетических хоккейных новостей."""
+
+import re
+
+import pytest
+
+from khl import texts_to_codes
+from khl.preprocess import get_coder
+from khl.synthetic import MAX_HEADLINE_LEN, TEAMS, synthetic_corpus, synthetic_news
+from tests.test_khl import test_frequency_dictionary_file, tests_dir
+
+
+@pytest.mark.parametrize("size", [1, 50, MAX_HEADLINE_LEN])
+def test_synthetic_news_headline(size):
+    headline = synthetic_news(size)
+    assert "\n" not in headline
+    assert 0 < len(headline) <= 2 * MAX_HEADLINE_LEN
+
+
+@pytest.mark.parametrize("size", [MAX_HEADLINE_LEN + 1, 1_000, 10_000, 100_000])
+def test_synthetic_news_size(size):
+    news = synthetic_news(size)
+    assert size <= len(news) <= size + 3_000
+    assert news.count("\n") >= 1
+
+
+@pytest.mark.parametrize("seed", [0, 1, 42])
+def test_synthetic_news_deterministic(seed):
+    assert synthetic_news(5_000, seed) == synthetic_news(5_000, seed)
+    assert synthetic_corpus(20, seed=seed) == synthetic_corpus(20, seed=seed)
+    assert synthetic_corpus(20, seed=seed) != synthetic_corpus(20, seed=seed + 1)
+
+
+def test_synthetic_news_stable():
+    assert synthetic_news(50, seed=1) == "Олег Сидоров не сыграет против „Ак Барс”"
+
+
+def test_synthetic_corpus():
+    corpus = synthetic_corpus(200, min_size=30, max_size=3_000)
+    assert len(corpus) == 200
+    assert any(len(news) <= MAX_HEADLINE_LEN for news in corpus)
+    assert any(len(news) >= 2_000 for news in corpus)
+    text = "\n".join(corpus)
+    assert all(team in text for team in TEAMS)
+    for pattern in [
+        r"\d+\+\d+",  # удаления
+        r"\d+:\d+ \(\d+:\d+ \d+:\d+ \d+:\d+",  # строки счета
+        r"\d+ [а-я]+ \d{4} года|\d\d\.\d\d\.\d{4}",  # даты
+        r"«[^»]+» - сказал",  # цитаты
+        r"https?://|www\.|t\.me/",  # ссылки
+        r"^- .+\?$",  # интервью
+    ]:
+        assert re.search(pattern, text, re.MULTILINE), pattern
+
+
+def test_synthetic_corpus_to_codes():
+    coder = get_coder(tests_dir / test_frequency_dictionary_file)
+    codes = list(texts_to_codes(synthetic_corpus(10, max_size=1_000), coder))
+    assert len(codes) == 10
+    assert all(codes)
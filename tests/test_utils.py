@@ -1,9 +1,23 @@
 """Юнит-тесты для функций преобразования хоккейных новостей."""
 
+import random
+import time
 
 import pytest
+from natasha.span import Span
 
 from khl.utils import (
+    DIGITS,
+    LATIN,
+    OTHER_SPACES,
+    TextEdits,
+    TextSignature,
+    Trigger,
+    TriggerStats,
+    _replace_found_ners,
+    _simplify_steps,
+    apply_steps,
+    compile_simplify_steps,
     delete_age_category,
     delete_amplua,
     delete_beginning_ending_dashes_in_words,
@@ -46,17 +60,25 @@ from khl.utils import (
     lowercase_shaiba_word,
     merge_dashes,
     merge_spaces,
+    pretokenized_words,
+    regex_step,
     replace_concrete_orgs,
     replace_dash_between_ners,
     replace_dates,
     replace_exclamation_mark_with_dot,
     replace_ners,
+    replace_ners_batch,
+    replace_ners_by_gazetteer,
     replace_penalty,
     replace_sdk,
     replace_tak_kak,
     replace_to_est,
     replace_vs_with_dash,
     simplify,
+    simplify_batch,
+    simplify_rules,
+    simplify_triggers,
+    split_long_text,
     split_ners,
     surround_concrete_orgs_with_quotes,
     unify,
@@ -89,6 +111,9 @@ from khl.utils import (
             "abcdefghijklmnopqrstuvwxyz"
             "',.[]{}()/=+-%№#@!?;:0123456789",
         ),
+        ("\u0438\u0306\u0435\u0308 \u0306\u0308", "йё"),
+        ("Гол\xa0\t «Динамо» —\n\n… 😀 ½", "Гол 'Динамо' - ... 1/2"),
+        ("\t\xa0 \u200b\n", ""),
     ],
 )
 def test_unify(source_text, expected_text):
@@ -134,6 +159,98 @@ def test_replace_ners(source_text, expected_text):
     assert replace_ners(source_text) == expected_text
 
 
+def test_replace_ners_batch():
+    texts = [
+        "Андрей Педан не сыграет против 'Спартака'",
+        "",
+        "Уральская проверка",
+        "Сегодня в КХЛе пройдет матч 'Ак Барса' с 'Салаватом Юлаевым' в Уфе",
+    ]
+    assert replace_ners_batch(texts, bucket_size=2) == [
+        replace_ners(text) for text in texts
+    ]
+
+
+@pytest.mark.parametrize(
+    "text,expected_words",
+    [
+        ("", []),
+        ("'Спартак' забил гол.", ["'", "Спартак", "'", "забил", "гол", "."]),
+        ("«org» - per !", ["«", "org", "»", "-", "per", "!"]),
+        (
+            "Санкт-Петербург 12.01.2024 3,5 ...",
+            ["Санкт-Петербург", "12.01.2024", "3,5", "..."],
+        ),
+        ("Что?! 1:0", ["Что", "?!", "1", ":", "0"]),
+    ],
+)
+def test_pretokenized_words(text, expected_words):
+    assert pretokenized_words(text) == expected_words
+
+
+def test_text_edits():
+    text = "Иван Иванов забил гол Спартаку"
+    edits = TextEdits(text)
+    assert edits.result() is text
+    edits.replace(0, 11, "per")
+    edits.replace(22, 22, "в ворота ")
+    edits.replace(22, 30, "org")
+    assert edits.result() == "per забил гол в ворота org"
+    assert edits.result() == "per забил гол в ворота org"
+    with pytest.raises(ValueError):
+        edits.replace(10, 12, "")
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_replace_found_ners_equals_slicing(seed):
+    random_ = random.Random(seed)
+    words = ["Иван", "Иванов", "забил", "гол", "в", "ворота", "Спартака", "!"]
+    text = " ".join(random_.choices(words, k=random_.randint(0, 40)))
+    bounds = sorted(random_.sample(range(len(text) + 1), min(len(text) + 1, 10)))
+    spans = [
+        Span(start, stop, random_.choice(["PER", "LOC", "ORG"]))
+        for start, stop in zip(bounds[::2], bounds[1::2])
+    ]
+    expected = text
+    for span in reversed(spans):
+        expected = expected[: span.start] + span.type.lower() + expected[span.stop :]
+    assert _replace_found_ners(text, spans) == _replace_found_ners(expected, [])
+
+
+def test_replace_ners_batch_pretokenized():
+    texts = [
+        "Андрей Педан не сыграет против ' Спартака '",
+        "",
+        "Уральская проверка",
+        "Сегодня в КХЛе пройдет матч ' Ак Барса ' с ' Салаватом Юлаевым ' в Уфе",
+    ]
+    assert replace_ners_batch(texts, bucket_size=2, pretokenized=True) == [
+        "per не сыграет против ' org '",
+        "",
+        "Уральская проверка",
+        "Сегодня в org пройдет матч ' org ' с ' org ' в loc",
+    ]
+
+
+@pytest.mark.parametrize(
+    "source_text,expected_text",
+    [
+        ("", ""),
+        ("Сегодня Иван Иванов забил гол в Москве", "Сегодня per забил гол в loc"),
+        ("Артем Лукоянов и Дмитрий Воронков", "per и per"),
+        ("Голы забили: Иванов, Петров и Сидоров.", "Голы забили: per, per и per."),
+        ("Главный тренер Кудашов доволен.", "Главный тренер per доволен."),
+        ("Хозяева уступили в Санкт-Петербурге", "Хозяева уступили в loc"),
+        ("В Минске Динамо Минск обыграло Ак Барс", "В loc org обыграло org"),
+        ("Андрей Педан не сыграет против 'Спартака'", "per не сыграет против org"),
+        ("Победит 'Трактор' или 'Сибирь'", "Победит org или org"),
+        ("Шайбы забросили Мэйсек и Капризов", "Шайбы забросили per и per"),
+    ],
+)
+def test_replace_ners_by_gazetteer(source_text, expected_text):
+    assert replace_ners_by_gazetteer(source_text) == expected_text
+
+
 @pytest.mark.parametrize(
     "source_text,expected_text",
     [
@@ -165,6 +282,11 @@ def test_replace_dates(source_text, expected_text):
     assert replace_dates(source_text) == expected_text
 
 
+def test_replace_dates_long_number():
+    long_number = "1" * 10_000
+    assert replace_dates(f"{long_number} января") == f"{long_number} января"
+
+
 @pytest.mark.parametrize(
     "source_text,expected_text",
     [
@@ -306,6 +428,8 @@ def test_merge_spaces(source_text, expected_text):
         ("Текст...", "Текст."),
         ("Текст. .. Текст.", "Текст. Текст."),
         ("Текст-. .. Текст.", "Текст. Текст."),
+        ("Текст. - - .", "Текст.."),
+        ("Текст--.", "Текст."),
         (
             "Протокол матча: СКА - 'Динамо'Москва - .",
             "Протокол матча: СКА - 'Динамо'Москва.",
@@ -487,6 +611,7 @@ def test_generalize_top(source_text, expected_text):
             "Школа в 60-70-х действительно была отменная.",
             "Школа в  действительно была отменная.",
         ),
+        ("1-2-3-4-5-6-7-8-9-10-11-12 матч", "1-2-3-4-5-6-7-8-9-10-11-12 матч"),
     ],
 )
 def test_delete_serial_numbers(source_text, expected_text):
@@ -594,6 +719,7 @@ def test_latin_c_to_cirillic(source_text, expected_text):
         ("'Салават Юлаев'VS'Ак Барс'", "'Салават Юлаев' - 'Ак Барс'"),
         ("'Салават Юлаев'  vs- 'Ак Барс'", "'Салават Юлаев' - 'Ак Барс'"),
         ("'Салават Юлаев'   Vs   -'Ак Барс'", "'Салават Юлаев' - 'Ак Барс'"),
+        ("'Салават Юлаев'  -  vs  -  'Ак Барс'", "'Салават Юлаев' - 'Ак Барс'"),
     ],
 )
 def test_replace_vs_with_dash(source_text, expected_text):
@@ -845,6 +971,7 @@ def test_delete_age_category(source_text, expected_text):
         ("Принял команду 1958-59 г.р., она", "Принял команду , она"),
         ("Сборная Казани 2007 г. р. - победитель", "Сборная Казани  - победитель"),
         ("Среди юниоров 2003/04 гг.р. провели", "Среди юниоров  провели"),
+        ("Игроки 2003-г.р. провели", "Игроки  провели"),
         (
             "от 14.08.2020г. разрешено присутствие",
             "от 14.08.2020г. разрешено присутствие",
@@ -1666,3 +1793,261 @@ def test_simplify(
 )
 def test_simplify_with_default_params(source_text, expected_text):
     assert simplify(source_text) == expected_text
+
+
+@pytest.mark.parametrize(
+    "source_text,expected_text",
+    [
+        (
+            "21 января Шипачев и Зарипов в Москве забили много голов 'Спартаку'",
+            "date per per в loc забили много голов org",
+        ),
+        ("Артем Лукоянов с Данисом Зариповым сыграют", "per per сыграют"),
+        ("Дальше Казань или Москва", "Дальше loc или loc"),
+        ("Минск и Демков пришли к соглашению", "loc per пришли к соглашению"),
+        ("'Локомотив' или Москва?", "org или loc?"),
+    ],
+)
+def test_simplify_with_gazetteer_ner_mode(source_text, expected_text):
+    assert simplify(source_text, ner_mode="gazetteer") == expected_text
+
+
+@pytest.mark.parametrize("ner_mode", ["neural", "gazetteer"])
+@pytest.mark.parametrize("replace_ners_", [True, False])
+def test_simplify_batch(ner_mode, replace_ners_):
+    texts = [
+        "21 января Шипачев и Зарипов в Москве забили много голов 'Спартаку'",
+        "Пресс конференция тренеров",
+        "Минск и Демков пришли к соглашению (2+10)",
+    ]
+    assert simplify_batch(texts, replace_ners_, ner_mode=ner_mode) == [
+        simplify(text, replace_ners_, ner_mode=ner_mode) for text in texts
+    ]
+
+
+def test_compile_simplify_steps_with_default_params():
+    steps = compile_simplify_steps()
+    assert steps.replace_ners
+    assert steps.before_ners + [replace_ners] + steps.after_ners == list(
+        simplify_rules.values()
+    )
+
+
+@pytest.mark.parametrize(
+    "params,disabled_step",
+    [
+        ({"replace_ners_": False}, "replace_ners"),
+        ({"replace_dates_": False}, "replace_dates"),
+        ({"replace_penalties_": False}, "replace_penalty"),
+        ({"disabled_steps": ["replace_dates"]}, "replace_dates"),
+        ({"disabled_steps": ["delete_shutouts"]}, "delete_shutouts"),
+        ({"disabled_steps": ["fix_colons"]}, "fix_colons"),
+    ],
+)
+def test_compile_simplify_steps_disabled_step(params, disabled_step):
+    steps = compile_simplify_steps(**params)
+    assert steps.replace_ners == (disabled_step != "replace_ners")
+    assert steps.before_ners + steps.after_ners == [
+        step
+        for name, step in simplify_rules.items()
+        if name not in (disabled_step, "replace_ners")
+    ]
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"disabled_steps": ["delete_shootouts"]},
+        {"insert_before": {"simplify": []}},
+        {"insert_after": {"": []}},
+    ],
+)
+def test_compile_simplify_steps_unknown_step(params):
+    with pytest.raises(ValueError):
+        compile_simplify_steps(**params)
+
+
+def test_compile_simplify_steps_insert():
+    first, second, third = str.upper, str.lower, str.title
+    steps = compile_simplify_steps(
+        disabled_steps=["delete_shutouts", "replace_ners"],
+        insert_before={"delete_parentheses_content": [first], "replace_ners": [second]},
+        insert_after={"delete_shutouts": [third], "replace_ners": [first, second]},
+    )
+    assert not steps.replace_ners
+    assert steps.before_ners[0] is first
+    assert steps.before_ners[-1] is second
+    assert steps.before_ners[6:8] == [third, delete_overtime_mark]
+    assert steps.after_ners[:3] == [first, second, replace_dates]
+
+
+def test_simplify_steps_cached():
+    first = regex_step("ё", "е")
+    steps = _simplify_steps(
+        disabled_steps=["delete_shutouts"], insert_after={"fix_covid": [first]}
+    )
+    assert steps == compile_simplify_steps(
+        disabled_steps=["delete_shutouts"], insert_after={"fix_covid": [first]}
+    )
+    assert (
+        _simplify_steps(
+            disabled_steps=("delete_shutouts",), insert_after={"fix_covid": [first]}
+        )
+        is steps
+    )
+    assert _simplify_steps() is _simplify_steps()
+    assert _simplify_steps(replace_dates_=False) is not _simplify_steps()
+
+
+@pytest.mark.parametrize(
+    "pattern,repl,source_text,expected_text",
+    [
+        ("ё", "е", "Ёлки, щёлкнул", "Ёлки, щелкнул"),
+        (r"\bсухарь\b", "shutout", "Сухарь сухарь сухаря", "Сухарь shutout сухаря"),
+        (r"(\d+)-(\d+)", lambda match: match.group(2), "2-3 и 10-0", "3 и 0"),
+    ],
+)
+def test_regex_step(pattern, repl, source_text, expected_text):
+    assert regex_step(pattern, repl)(source_text) == expected_text
+
+
+@pytest.mark.parametrize(
+    "params,source_text,expected_text",
+    [
+        (
+            {"disabled_steps": ["delete_play_format"]},
+            "Игра 3 на 3 закончилась",
+            "Игра на закончилась",
+        ),
+        (
+            {"disabled_steps": ["delete_parentheses_content"]},
+            "Команды сыграли (победа)",
+            "Команды сыграли победа",
+        ),
+        (
+            {"insert_after": {"fix_covid": [regex_step("ё", "е")]}},
+            "Шайба прошёл в ворота",
+            "шайба прошел в ворота",
+        ),
+    ],
+)
+def test_simplify_with_steps_config(params, source_text, expected_text):
+    assert simplify(source_text, **params) == expected_text
+
+
+def test_simplify_batch_with_steps_config():
+    texts = ["Игра 3 на 3 закончилась (победа)", "Пресс конференция тренеров"]
+    params = {
+        "disabled_steps": ["delete_play_format", "fix_press_conference"],
+        "insert_before": {"replace_ners": [regex_step("тренеров", "наставников")]},
+    }
+    assert simplify_batch(texts, **params) == [
+        simplify(text, **params) for text in texts
+    ]
+
+
+@pytest.mark.parametrize(
+    "name",
+    [name for name in simplify_rules if name not in ("replace_ners", "replace_dates")],
+)
+@pytest.mark.parametrize(
+    "unit", [" ", " -", ".", " - .", "1-", "1", "vs ", "www.", "-Я"]
+)
+def test_simplify_rule_linear_time(name, unit):
+    text = "Я" + unit * (20_000 // len(unit)) + "1"
+    start = time.perf_counter()
+    simplify_rules[name](text)
+    assert time.perf_counter() - start < 1.0
+
+
+@pytest.mark.parametrize(
+    "text,max_text_len,expected_chunks",
+    [
+        ("", 10, [""]),
+        (
+            "Иванов забил гол. Петров ответил.",
+            None,
+            ["Иванов забил гол. Петров ответил."],
+        ),
+        (
+            "Иванов забил гол. Петров ответил.",
+            100,
+            ["Иванов забил гол. Петров ответил."],
+        ),
+        (
+            "Иванов забил гол. Петров ответил.",
+            20,
+            ["Иванов забил гол.", "Петров ответил."],
+        ),
+        (
+            "Иванов забил. Петров ответил. Матч окончен.",
+            30,
+            ["Иванов забил. Петров ответил.", "Матч окончен."],
+        ),
+        (
+            "Иванов забил гол. Петров ответил.",
+            10,
+            ["Иванов", "забил гол.", "Петров", "ответил."],
+        ),
+        ("Гоооооол!", 4, ["Гооо", "ооол", "!"]),
+    ],
+)
+def test_split_long_text(text, max_text_len, expected_chunks):
+    assert split_long_text(text, max_text_len) == expected_chunks
+
+
+@pytest.mark.parametrize(
+    "trigger,text,expected",
+    [
+        (Trigger(("vs",)), "Трактор vs Сибирь", True),
+        (Trigger(("vs",)), "Трактор VS Сибирь", False),
+        (Trigger(("vs",), ignore_case=True), "Трактор VS Сибирь", True),
+        (Trigger(characters="(+"), "Иванов (2+2)", True),
+        (Trigger(characters="(+"), "Иванов", False),
+        (Trigger(categories=DIGITS), "Счет 2:1", True),
+        (Trigger(categories=DIGITS | LATIN), "Счет", False),
+        (Trigger(categories=LATIN), "per забил", True),
+        (Trigger(("  ",), categories=OTHER_SPACES), "Гол\tзабит", True),
+        (Trigger(("  ",), categories=OTHER_SPACES), "Гол забит", False),
+        (Trigger(), "Гол забит", False),
+    ],
+)
+def test_trigger_matches(trigger, text, expected):
+    assert trigger.matches(TextSignature(text)) is expected
+
+
+PIECES = [
+    *"абвгзнрстУШcCсСaZ0123456789 .,:;!?-+'()\t\nİıſK",
+    *["т.к.", "т. е.", "б о льш", "SO", "бул.", "ОТ", "ot", "вр.", "Шайба", "vs"],
+    *["COVID-19", "ковид", "U-18", "г.р.", "Иванов-Петров-Сидоров", "-Иванов"],
+    *["СДК", "спортивно-дисциплинарный комитет", "пресс конференция", "ТОП-10"],
+    *["1 мая", "2+10", "5 + 20", "perorg", "www.site.ru", "'a'", "2:1", "5-й"],
+    *["3 на 3", "три на три", "!!", "org loc", "- -", "per и org", "-abc", "?.."],
+]
+
+
+@pytest.mark.parametrize("name", list(simplify_triggers))
+def test_simplify_trigger_is_sound(name):
+    random_ = random.Random(name)
+    texts = [
+        "".join(random_.choice(PIECES) for _ in range(random_.randint(0, 8)))
+        for _ in range(300)
+    ]
+    for text in texts:
+        if not simplify_triggers[name].matches(TextSignature(text)):
+            assert simplify_rules[name](text) == text
+
+
+def test_apply_steps_with_trigger_stats():
+    steps = [simplify_rules["fix_covid"], simplify_rules["delete_parentheses_content"]]
+    trigger_stats = TriggerStats()
+    texts = ["COVID-19 (коронавирус)", "Иванов (ЦСКА)", "Гол"]
+    assert [apply_steps(text, steps, trigger_stats) for text in texts] == [
+        "covid ",
+        "Иванов ",
+        "Гол",
+    ]
+    assert trigger_stats.skip_rates() == {
+        "fix_covid": 2 / 3,
+        "delete_parentheses_content": 1 / 3,
+    }